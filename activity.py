@@ -0,0 +1,291 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List, Optional
+
+from cache import LRUCache
+
+# Metrics kept per hour
+MESSAGES = 0
+VOICE = 1  # minutes
+METRICS = 2
+METRIC_NAMES = {'messages': MESSAGES, 'voice': VOICE}
+
+RING_HOURS = 30 * 24  # one month of hourly slots
+WEEK_HOURS = 7 * 24
+HEATMAP_HOURS = 28 * 24  # four whole weeks, so every weekday/hour cell covers the same time
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+# Users cannot get near 65,535 messages or minutes an hour; guilds can
+USER_TYPECODE = 'H'
+GUILD_TYPECODE = 'I'
+
+
+def epoch_hour(now: Optional[float] = None) -> int:
+    """Hours since 1970-01-01 00:00 UTC"""
+    return int((time.time() if now is None else now) // 3600)
+
+
+def heat_cell(hour: int) -> int:
+    """Weekday (Monday first) × hour-of-day cell for an epoch hour"""
+    return ((hour // 24 + 3) % 7) * 24 + hour % 24  # 1970-01-01 was a Thursday
+
+
+class ActivitySeries:
+    """Hourly activity counters for one user or guild in a fixed ring buffer
+
+    Slot ``hour % RING_HOURS`` holds the counters of that hour, one per
+    metric. Totals for the last week and month and a weekday × hour heatmap
+    of the last four weeks are updated as counts are added and as hours
+    roll out of each window, so no query has to add up the buffer.
+    """
+    __slots__ = ('hours', 'head', 'week', 'month', 'heat', 'limit')
+
+    def __init__(self, typecode: str = USER_TYPECODE, head: Optional[int] = None, data: Optional[bytes] = None):
+        self.hours = array(typecode)
+        if data:
+            self.hours.frombytes(data)
+        else:
+            self.hours.frombytes(bytes(self.hours.itemsize * RING_HOURS * METRICS))
+        self.limit = 2 ** (8 * self.hours.itemsize) - 1
+        self.head = epoch_hour() if head is None else head  # newest hour in the buffer
+        self.week = [0] * METRICS
+        self.month = [0] * METRICS
+        self.heat = array('I', bytes(4 * WEEK_HOURS * METRICS))
+        self._rebuild()
+
+    def _slot(self, hour: int) -> int:
+        return (hour % RING_HOURS) * METRICS
+
+    def _rebuild(self):
+        """Recompute the aggregates from the buffer (after loading)"""
+        for hour in range(self.head - RING_HOURS + 1, self.head + 1):
+            self._count(hour, 1)
+
+    def _count(self, hour: int, sign: int):
+        """Add (or with sign -1 remove) one hour's counters to every window it is in"""
+        age = self.head - hour
+        slot = self._slot(hour)
+        cell = heat_cell(hour) * METRICS
+        for metric in range(METRICS):
+            value = self.hours[slot + metric] * sign
+            if value:
+                self.month[metric] += value
+                if age < WEEK_HOURS:
+                    self.week[metric] += value
+                if age < HEATMAP_HOURS:
+                    self.heat[cell + metric] += value
+
+    def advance(self, hour: int):
+        """Move the newest slot forward to ``hour``, expiring what falls out of each window"""
+        if hour <= self.head:
+            return
+        if hour - self.head >= RING_HOURS:
+            self.hours = array(self.hours.typecode, bytes(self.hours.itemsize * RING_HOURS * METRICS))
+            self.week = [0] * METRICS
+            self.month = [0] * METRICS
+            self.heat = array('I', bytes(4 * WEEK_HOURS * METRICS))
+            self.head = hour
+            return
+        for head in range(self.head + 1, hour + 1):
+            leaving_week = self._slot(head - WEEK_HOURS)
+            leaving_heat = head - HEATMAP_HOURS
+            leaving_heat_slot = self._slot(leaving_heat)
+            cell = heat_cell(leaving_heat) * METRICS
+            overwritten = self._slot(head)
+            for metric in range(METRICS):
+                self.week[metric] -= self.hours[leaving_week + metric]
+                self.heat[cell + metric] -= self.hours[leaving_heat_slot + metric]
+                self.month[metric] -= self.hours[overwritten + metric]
+                self.hours[overwritten + metric] = 0
+        self.head = hour
+
+    def add(self, metric: int, amount: int = 1, hour: Optional[int] = None):
+        """Count activity in an hour (default the current one)"""
+        hour = epoch_hour() if hour is None else hour
+        self.advance(hour)
+        age = self.head - hour
+        if age >= RING_HOURS:
+            return
+        index = self._slot(hour) + metric
+        amount = min(amount, self.limit - self.hours[index])
+        self.hours[index] += amount
+        self.month[metric] += amount
+        if age < WEEK_HOURS:
+            self.week[metric] += amount
+        if age < HEATMAP_HOURS:
+            self.heat[heat_cell(hour) * METRICS + metric] += amount
+
+    def last_hours(self, metric: int, count: int) -> List[int]:
+        """Counters of the last ``count`` hours, oldest first"""
+        self.advance(epoch_hour())
+        return [self.hours[self._slot(hour) + metric] for hour in range(self.head - count + 1, self.head + 1)]
+
+    def last_days(self, metric: int, count: int) -> List[int]:
+        """Daily totals of the last ``count`` UTC days (today so far last), oldest first"""
+        self.advance(epoch_hour())
+        first_day = self.head // 24 - count + 1
+        days = [0] * count
+        for hour in range(max(first_day * 24, self.head - RING_HOURS + 1), self.head + 1):
+            days[hour // 24 - first_day] += self.hours[self._slot(hour) + metric]
+        return days
+
+    def totals(self) -> dict:
+        """Last-week and last-month totals per metric"""
+        self.advance(epoch_hour())
+        return {
+            name: {'week': self.week[metric], 'month': self.month[metric]}
+            for name, metric in METRIC_NAMES.items()
+        }
+
+    def heatmap(self, metric: int) -> List[List[int]]:
+        """7 × 24 grid (Monday first, UTC hours) of the last four weeks"""
+        self.advance(epoch_hour())
+        return [
+            [self.heat[(day * 24 + hour) * METRICS + metric] for hour in range(24)]
+            for day in range(7)
+        ]
+
+    def peak_hour(self, metric: int) -> Optional[int]:
+        """Busiest weekday/hour cell of the last four weeks, or None if idle"""
+        cells = [self.heat[cell * METRICS + metric] for cell in range(WEEK_HOURS)]
+        best = max(range(WEEK_HOURS), key=cells.__getitem__)
+        return best if cells[best] else None
+
+
+class ActivityStore:
+    """Per-user and per-guild activity series, cached in memory and flushed in batches
+
+    Series are loaded on first use and kept in an LRU cache; changed series
+    stay pinned in the cache until ``flush`` writes them all in one
+    transaction.
+    """
+
+    def __init__(self, path: str = 'activity.db', cache_size: int = 5000):
+        self.path = path
+        self.dirty = set()
+        self.cache = LRUCache(cache_size, is_pinned=lambda key: key in self.dirty)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Open the database and create the table if needed"""
+        if self._conn is not None:
+            return
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS activity "
+            "(key TEXT PRIMARY KEY, head INTEGER NOT NULL, typecode TEXT NOT NULL, data BLOB NOT NULL)"
+        )
+        conn.commit()
+        self._conn = conn
+
+    def close(self):
+        """Close the underlying connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def series(self, key: str, typecode: str = USER_TYPECODE) -> ActivitySeries:
+        """Series for a key, loaded or created on first use"""
+        series = self.cache.get(key)
+        if series is not None:
+            return series
+        with self._lock:
+            row = self._conn.execute("SELECT head, typecode, data FROM activity WHERE key = ?", (key,)).fetchone()
+        series = ActivitySeries(row[1], row[0], row[2]) if row else ActivitySeries(typecode)
+        self.cache.put(key, series)
+        return series
+
+    def user(self, user_id) -> ActivitySeries:
+        return self.series(f"user:{user_id}", USER_TYPECODE)
+
+    def guild(self, guild_id) -> ActivitySeries:
+        return self.series(f"guild:{guild_id}", GUILD_TYPECODE)
+
+    def record(self, metric: int, user_id, guild_id=None, amount: int = 1):
+        """Count activity for a user and, when given, their guild"""
+        if amount <= 0:
+            return
+        hour = epoch_hour()
+        keys = [f"user:{user_id}"]
+        self.user(user_id).add(metric, amount, hour)
+        if guild_id is not None:
+            keys.append(f"guild:{guild_id}")
+            self.guild(guild_id).add(metric, amount, hour)
+        self.dirty.update(keys)
+
+    def _write_rows(self, rows: List[tuple]):
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO activity (key, head, typecode, data) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+
+    async def flush(self) -> int:
+        """Write every changed series in one transaction; returns how many"""
+        if not self.dirty:
+            return 0
+        keys = list(self.dirty)
+        self.dirty.clear()
+        # Copy the buffers on the loop so later counts cannot tear the write
+        rows = []
+        for key in keys:
+            series = self.cache.peek(key)
+            if series is not None:
+                rows.append((key, series.head, series.hours.typecode, series.hours.tobytes()))
+        try:
+            await asyncio.to_thread(self._write_rows, rows)
+        except sqlite3.Error as e:
+            self.dirty.update(keys)
+            print(f"Error saving activity: {e}")
+            return 0
+        self.cache.shrink()
+        return len(rows)
+
+    async def reset(self, user_id=None):
+        """Forget one user's activity, or everything"""
+        with self._lock:
+            with self._conn:
+                if user_id is None:
+                    self._conn.execute("DELETE FROM activity")
+                else:
+                    self._conn.execute("DELETE FROM activity WHERE key = ?", (f"user:{user_id}",))
+        if user_id is None:
+            self.cache.clear()
+            self.dirty.clear()
+        else:
+            self.cache.pop(f"user:{user_id}")
+            self.dirty.discard(f"user:{user_id}")
+
+
+SPARK = "▁▂▃▄▅▆▇█"
+SHADES = " ░▒▓█"
+
+
+def sparkline(values: List[int]) -> str:
+    """One block character per value, scaled to the largest"""
+    top = max(values, default=0)
+    if not top:
+        return SPARK[0] * len(values)
+    return "".join(SPARK[min(len(SPARK) - 1, value * len(SPARK) // (top + 1))] for value in values)
+
+
+def render_heatmap(grid: List[List[int]]) -> str:
+    """Weekday × hour grid as shaded text for a code block"""
+    top = max((value for row in grid for value in row), default=0)
+    lines = ["    " + "".join(str(hour // 10) if hour % 6 == 0 else " " for hour in range(24)),
+             "    " + "".join(str(hour % 10) if hour % 6 == 0 else " " for hour in range(24))]
+    for day, row in zip(WEEKDAYS, grid):
+        if top:
+            cells = "".join(SHADES[0] if not value else SHADES[1 + min(3, value * 4 // (top + 1))] for value in row)
+        else:
+            cells = SHADES[0] * 24
+        lines.append(f"{day} {cells}")
+    return "\n".join(lines)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Compare member cache profiles on synthetic large guilds
+
+Each profile runs in its own process. It receives a GUILD_CREATE payload (channels,
+roles, voice states and the members in voice) and then, like the gateway,
+either every member in chunks of 1000 (full) or the members who joined
+in the first hours plus the authors of a stream of messages, kept by the
+recent members LRU (active). Reports startup time and RSS growth.
+
+Usage: python benchmarks/member_cache_benchmark.py [members] [guilds] [voice] [active] [authors]
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+from discord.guild import Guild
+from discord.member import Member
+
+from gateway import ACTIVE, FULL, PROFILES, RecentMembers, client_options
+
+CHUNK = 1000
+ROLES = 40
+RECENT = 5000  # gateway_settings.recent_members default
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), or the peak elsewhere"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def member_payload(guild_id: int, i: int) -> dict:
+    user_id = guild_id * 1000000 + i
+    return {
+        'user': {'id': str(user_id), 'username': f'user{i}', 'discriminator': '0', 'avatar': None, 'global_name': None},
+        'roles': [str(guild_id + 1 + r) for r in random.sample(range(ROLES), random.randint(0, 4))],
+        'joined_at': '2023-01-01T00:00:00+00:00',
+        'deaf': False,
+        'mute': False,
+        'flags': 0
+    }
+
+
+def guild_payload(guild_id: int, members: int, voice: int) -> dict:
+    channels = [{'id': str(guild_id + 100 + c), 'type': 0, 'name': f'text-{c}', 'position': c,
+                 'permission_overwrites': []} for c in range(20)]
+    channels += [{'id': str(guild_id + 200 + c), 'type': 2, 'name': f'voice-{c}', 'position': c,
+                  'permission_overwrites': [], 'bitrate': 64000, 'user_limit': 0} for c in range(10)]
+    in_voice = random.sample(range(members), min(voice, members))
+    return {
+        'id': str(guild_id),
+        'name': f'Guild {guild_id}',
+        'member_count': members,
+        'large': True,
+        'roles': [{'id': str(guild_id + (r + 1 if r else 0)), 'name': f'role-{r}', 'permissions': '0', 'position': r,
+                   'color': 0, 'hoist': False, 'managed': False, 'mentionable': False} for r in range(ROLES + 1)],
+        'channels': channels,
+        'members': [member_payload(guild_id, i) for i in in_voice],
+        'voice_states': [{'user_id': str(guild_id * 1000000 + i), 'channel_id': str(guild_id + 200 + i % 10),
+                          'session_id': 'x', 'deaf': False, 'mute': False, 'self_deaf': False, 'self_mute': False,
+                          'self_video': False, 'suppress': False, 'request_to_speak_timestamp': None}
+                         for i in in_voice]
+    }
+
+
+def run_profile(profile: str, members: int, guilds: int, voice: int, active: int, authors: int) -> dict:
+    options = client_options(profile)
+    client = discord.Client(intents=options['intents'], member_cache_flags=options['member_cache_flags'])
+    state = client._connection
+    random.seed(1)
+    baseline = rss_mb()
+    start = time.perf_counter()
+    kept = []
+    recent = RecentMembers(RECENT if profile == ACTIVE else 0)
+    for g in range(guilds):
+        guild_id = (g + 1) * 10 ** 9
+        guild = Guild(data=guild_payload(guild_id, members, voice), state=state)
+        kept.append(guild)
+        if profile == FULL:
+            # Startup chunking: every member arrives in chunks and is cached
+            for first in range(0, members, CHUNK):
+                for i in range(first, min(first + CHUNK, members)):
+                    guild._add_member(Member(data=member_payload(guild_id, i), guild=guild, state=state))
+        elif profile == ACTIVE:
+            # Members who joined since startup (GUILD_MEMBER_ADD carries the member)
+            for i in random.sample(range(members), min(active, members)):
+                if guild.get_member(guild_id * 1000000 + i) is None:
+                    guild._add_member(Member(data=member_payload(guild_id, i), guild=guild, state=state))
+            # Message authors (MESSAGE_CREATE carries the author's member data)
+            for i in random.choices(range(members), k=authors):
+                recent.remember(Member(data=member_payload(guild_id, i), guild=guild, state=state))
+    elapsed = time.perf_counter() - start
+    return {
+        'profile': profile,
+        'cached_members': sum(len(guild.members) for guild in kept) + len(recent),
+        'startup_seconds': elapsed,
+        'rss_mb': rss_mb() - baseline
+    }
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--profile':
+        print(json.dumps(run_profile(sys.argv[2], *map(int, sys.argv[3:8]))))
+        return
+
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    guilds = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    voice = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    active = int(sys.argv[4]) if len(sys.argv) > 4 else 2000
+    authors = int(sys.argv[5]) if len(sys.argv) > 5 else 20000
+    print(f"{guilds} guild(s) × {members:,} members, {voice} in voice, {active:,} joins, {authors:,} messages\n")
+    print(f"{'profile':<10}{'cached':>10}{'startup':>12}{'RSS':>10}")
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--profile', profile,
+             str(members), str(guilds), str(voice), str(active), str(authors)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{profile:<10}{result['cached_members']:>10,}{result['startup_seconds'] * 1000:>10.0f}ms"
+              f"{result['rss_mb']:>8.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
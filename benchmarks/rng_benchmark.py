@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Compare per-call and batched random draws used by the economy and games
+
+Usage: python benchmarks/rng_benchmark.py [draws] [seed]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rng import AliasTable, RNGService, numpy
+
+LOOT = {'common': 60, 'uncommon': 25, 'rare': 10, 'epic': 4, 'legendary': 1}
+
+def timed(func) -> tuple:
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def main():
+    draws = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 42
+    table = AliasTable(LOOT)
+    service = RNGService(seed)
+    reference = random.Random(seed)
+    outcomes, weights = list(LOOT), list(LOOT.values())
+
+    cases = [
+        ("random.choices per draw", lambda: [reference.choices(outcomes, weights)[0] for _ in range(draws)]),
+        ("alias table per draw", lambda: [service.weighted(table) for _ in range(draws)]),
+        ("alias table batch", lambda: service.weighted_many(table, draws)),
+        ("randint per die (d20)", lambda: [reference.randint(1, 20) for _ in range(draws)]),
+        ("rolls batch (d20)", lambda: service.rolls(20, draws))
+    ]
+
+    print(f"🎲 RNG benchmark ({draws:,} draws, seed {seed}, numpy {'on' if numpy is not None else 'off'})")
+    print(f"{'method':<26} {'ms':>10} {'draws/s':>14}")
+    for name, func in cases:
+        elapsed, _ = timed(func)
+        print(f"{name:<26} {elapsed * 1000:>10.1f} {draws / elapsed:>14,.0f}")
+
+    # The same seed must replay the same outcomes
+    first = RNGService(seed).weighted_many(table, 1000)
+    second = RNGService(seed).weighted_many(table, 1000)
+    print(f"\nDeterministic replay: {'✅ identical' if first == second else '❌ differs'}")
+    counts = {outcome: first.count(outcome) for outcome in LOOT}
+    print("Sample of 1,000: " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Compare persistence serializers on data shaped like user_data and economy_data
+
+Usage: python benchmarks/serialization_benchmark.py [users] [repeats]
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serialization import available_serializers
+
+def make_user_data(users: int) -> dict:
+    """Synthetic user_data records matching UserDatabase"""
+    now = datetime.utcnow()
+    data = {}
+    for i in range(users):
+        user_id = str(100000000000000000 + i * 7919)
+        xp = random.randint(0, 50000)
+        data[user_id] = {
+            'xp': xp,
+            'level': xp // 200 + 1,
+            'voice_time': random.randint(0, 10000),
+            'total_voice_time': random.randint(0, 100000),
+            'messages_sent': random.randint(0, 5000),
+            'voice_session': None if i % 3 else [int(now.timestamp()) - i % 36000, int(now.timestamp()) - i % 60]
+        }
+    return data
+
+def make_economy_data(users: int) -> dict:
+    """Synthetic economy_data records matching the Economy cog"""
+    today = int(time.time() // 86400)
+    items = ['role_color', 'xp_boost', 'lucky_charm', 'vip_badge', 'mystery_box']
+    data = {}
+    for i in range(users):
+        user_id = str(100000000000000000 + i * 7919)
+        data[user_id] = {
+            'balance': random.randint(0, 100000),
+            'inventory': {item: random.randint(1, 3) for item in random.sample(items, random.randint(0, 4))},
+            'effects': {} if i % 5 else {'xp_boost': int(time.time()) + 1800},
+            'quotas': {
+                'daily': [today - i % 2, 1],
+                'work': [today, random.randint(1, 5)],
+                'gamble': [today - i % 3, random.randint(1, 5)]
+            }
+        }
+    return data
+
+def bench(serializer, data: dict, repeats: int) -> tuple:
+    """Return (best encode seconds, best decode seconds, encoded size)"""
+    encode_times = []
+    decode_times = []
+    encoded = b''
+    for _ in range(repeats):
+        start = time.perf_counter()
+        encoded = serializer.dumps(data)
+        encode_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        serializer.loads(encoded)
+        decode_times.append(time.perf_counter() - start)
+    return min(encode_times), min(decode_times), len(encoded)
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    random.seed(42)
+
+    datasets = {
+        'user_data': make_user_data(users),
+        'economy_data': make_economy_data(users)
+    }
+    serializers = available_serializers()
+
+    print(f"📊 Serialization benchmark ({users} users, best of {repeats})")
+    for dataset_name, data in datasets.items():
+        print(f"\n{dataset_name}")
+        print(f"{'format':<12} {'encode ms':>10} {'decode ms':>10} {'size KiB':>10} {'vs pretty':>10}")
+        baseline = None
+        for name, serializer in serializers.items():
+            encode, decode, size = bench(serializer, data, repeats)
+            if baseline is None:
+                baseline = size
+            print(f"{name:<12} {encode * 1000:>10.1f} {decode * 1000:>10.1f} {size / 1024:>10.0f} {size / baseline:>9.0%}")
+
+    missing = {'orjson', 'msgpack'} - set(serializers)
+    if missing:
+        print(f"\n⚠️ Not installed: {', '.join(sorted(missing))}")
+
+if __name__ == "__main__":
+    main()
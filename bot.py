@@ -4,11 +4,27 @@ import json
 import asyncio
 from datetime import datetime, timedelta
 import os
+import time
 from dotenv import load_dotenv
 import threading
-from flask import Flask
+from typing import Optional
+from flask import Flask, jsonify
 
+from activity import MESSAGES, METRIC_NAMES, VOICE, WEEKDAYS, ActivityStore, render_heatmap, sparkline
 from database import UserDatabase
+from effects import XP_BOOST, effect_engine
+from gateway import ACTIVE, FULL, client_options, get_or_fetch_member, recent_members
+from guild_stats import guild_stats
+from leaderboards import SEASON, WINDOW_LABELS, XP, leaderboards
+from levels import level_curve
+from names import name_resolver
+from pagination import RankedBoard, page_cache, rank_footer, send_leaderboard
+from serialization import available_serializers, get_serializer
+from shutdown import shutdown
+from storage import write_snapshot
+from quotas import Cooldown, QuotaExceeded, quota_engine, refund_quota
+from rng import rng
+from voice import VoiceSessions
 from utils import create_embed, format_time, format_voice_time, get_level_progress, create_progress_bar
 
 # Import cogs
@@ -18,6 +34,8 @@ from giveaway import Giveaway
 from utility import Utility
 from economy import Economy
 
+COGS = (Games, Trivia, Giveaway, Utility, Economy)
+
 # Load environment variables
 load_dotenv()
 
@@ -42,7 +60,31 @@ def load_config():
                 'voice_xp_per_minute': 3,
                 'message_xp': 2,
                 'xp_cooldown_seconds': 60,
-                'level_multiplier': 200
+                'level_curve': {
+                    'type': 'linear',
+                    'xp_per_level': 200
+                }
+            },
+            'storage_settings': {
+                'user_cache_size': 5000,
+                'format': 'json',
+                'backup_generations': 3
+            },
+            'rng_settings': {
+                'seed': None
+            },
+            'trivia_settings': {
+                'question_bank': 'trivia_questions.jsonl',
+                'max_games': 100
+            },
+            'gateway_settings': {
+                'cache_profile': 'full',
+                'presences': False,
+                'recent_members': 5000
+            },
+            'shutdown_settings': {
+                'deadline_seconds': 25,
+                'drain_seconds': 5
             },
             'embed_colors': {
                 'join': '0x00ff00',
@@ -69,7 +111,31 @@ def load_config():
                     'voice_xp_per_minute': 3,
                     'message_xp': 2,
                     'xp_cooldown_seconds': 60,
-                    'level_multiplier': 200
+                    'level_curve': {
+                        'type': 'linear',
+                        'xp_per_level': 200
+                    }
+                },
+                'storage_settings': {
+                    'user_cache_size': 5000,
+                    'format': 'json',
+                    'backup_generations': 3
+                },
+                'rng_settings': {
+                    'seed': None
+                },
+                'trivia_settings': {
+                    'question_bank': 'trivia_questions.jsonl',
+                    'max_games': 100
+                },
+                'gateway_settings': {
+                    'cache_profile': 'full',
+                    'presences': False,
+                    'recent_members': 5000
+                },
+                'shutdown_settings': {
+                    'deadline_seconds': 25,
+                    'drain_seconds': 5
                 },
                 'embed_colors': {
                     'join': '0x00ff00',
@@ -83,23 +149,54 @@ def load_config():
 
 config = load_config()
 
-# Bot setup
-intents = discord.Intents.default()
-intents.message_content = True
-intents.members = True
-intents.guilds = True
-intents.voice_states = True
-
-bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)
+# Bot setup: how much of each guild's member list is kept in memory
+gateway_settings = config.get('gateway_settings', {})
+CACHE_PROFILE = gateway_settings.get('cache_profile', FULL)
+bot = commands.Bot(
+    command_prefix='!', help_command=None,
+    **client_options(CACHE_PROFILE, gateway_settings.get('presences', False))
+)
+if CACHE_PROFILE == ACTIVE:
+    recent_members.configure(gateway_settings.get('recent_members', 5000))
 
 # Set bot start time for uptime tracking
 bot.start_time = datetime.now()
+LAUNCHED = time.perf_counter()
+startup_timings = {}  # {phase: seconds}, filled once by setup_hook and the first on_ready
+
+# Expose configuration to cogs
+bot.config = config
 
 # Initialize database
-db = UserDatabase()
+storage_settings = config.get('storage_settings', {})
+db = UserDatabase(
+    cache_size=storage_settings.get('user_cache_size', 5000),
+    serializer=get_serializer(storage_settings.get('format', 'json'))
+)
+
+# Hourly message and voice activity per user and guild
+activity = ActivityStore(cache_size=storage_settings.get('user_cache_size', 5000))
+
+# Cooldowns and quotas shared with the cogs
+QUOTA_STATE_PATH = 'quota_state.json'
+quota_serializer = get_serializer(storage_settings.get('format', 'json'))
+quota_engine.register('message_xp', Cooldown(config['xp_settings']['xp_cooldown_seconds']))
+
+# XP needed per level (older configs only have level_multiplier)
+level_curve.configure_from(config['xp_settings'])
+
+# A fixed seed replays the same economy and dice outcomes (for testing)
+rng_seed = config.get('rng_settings', {}).get('seed')
+if rng_seed is not None:
+    rng.seed(rng_seed)
+    print(f"🎲 Deterministic RNG enabled (seed {rng_seed})")
 
-# Voice tracking - simplified
-voice_users = {}  # {user_id: join_time}
+# Open voice sessions, credited once a minute by voice_accrual_task
+voice_sessions = VoiceSessions()
+
+def boosted_xp(user_id, xp: int) -> int:
+    """Apply the XP Boost multiplier if the user has one running"""
+    return int(xp * effect_engine.multiplier(str(user_id), XP_BOOST))
 
 def get_channel_safely(channel_id):
     """Safely get a channel by ID with error handling"""
@@ -110,20 +207,59 @@ def get_channel_safely(channel_id):
     except (ValueError, TypeError):
         return None
 
+@bot.event
+async def setup_hook():
+    """One-time startup, before the gateway connects
+    
+    Storage and cogs load concurrently; reconnects never come back here,
+    so nothing is loaded twice and the tasks are started exactly once.
+    """
+    started = time.perf_counter()
+    await asyncio.gather(
+        timed('user store', open_user_store()),
+        timed('activity', asyncio.to_thread(activity.open)),
+        timed('leaderboards', asyncio.to_thread(leaderboards.open)),
+        timed('quotas', asyncio.to_thread(quota_engine.load, QUOTA_STATE_PATH)),
+        timed('cogs', load_cogs())
+    )
+    
+    # Start voice time tracking task
+    voice_accrual_task.start()
+    activity_flush_task.start()
+    quota_maintenance_task.start()
+    
+    # SIGTERM from the host (or Ctrl+C) flushes everything before exiting
+    shutdown.install(asyncio.get_running_loop(), begin_shutdown)
+    
+    startup_timings['setup'] = time.perf_counter() - started
+    print("⏱️ Startup: " + ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in startup_timings.items()))
+
+async def timed(phase, awaitable):
+    """Await a startup phase and record how long it took"""
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        startup_timings[phase] = time.perf_counter() - started
+
+async def open_user_store():
+    """Load user data and apply a changed level curve"""
+    await db.load_data()
+    relevelled = await db.apply_level_curve()
+    if relevelled:
+        print(f"📐 Level curve changed: {relevelled} user levels recalculated")
+
 @bot.event
 async def on_ready():
-    """Bot startup event"""
+    """Gateway ready (first connect and every reconnect that resumes a new session)"""
     print(f'🤖 {bot.user} is now online!')
     print(f'📊 Connected to {len(bot.guilds)} guild(s)')
+    if 'ready' not in startup_timings:
+        startup_timings['ready'] = time.perf_counter() - LAUNCHED
+        print(f"🚀 Ready {startup_timings['ready']:.2f}s after launch")
     
-    # Load user data
-    await db.load_data()
-    
-    # Load all cogs
-    await load_cogs()
-    
-    # Start online time tracking task
-    online_time_task.start()
+    # Cheap and safe to repeat: only reconciles who is in voice right now
+    await sync_voice_sessions()
     
     # Set bot status
     await bot.change_presence(activity=discord.Game(name="!help | Leveling System"))
@@ -132,6 +268,7 @@ async def on_ready():
 async def on_member_join(member):
     """Handle member join events"""
     guild = member.guild
+    name_resolver.remember(member)
     
     # Get notification channel
     notification_channel = get_channel_safely(config['notification_channel_id'])
@@ -185,9 +322,53 @@ async def on_member_join(member):
             print(f"Error sending join log: {e}")
 
 @bot.event
-async def on_member_remove(member):
-    """Handle member leave events"""
-    guild = member.guild
+async def on_guild_available(guild):
+    """Count the guild once its members are in (again, after an outage)"""
+    guild_stats.rebuild(guild, bot.intents.presences)
+
+@bot.event
+async def on_guild_remove(guild):
+    guild_stats.forget(guild.id)
+
+@bot.event
+async def on_presence_update(before, after):
+    guild_stats.presence_changed(before, after)
+
+@bot.event
+async def on_guild_channel_create(channel):
+    guild_stats.channel_changed(channel, 1)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    guild_stats.channel_changed(channel, -1)
+
+@bot.event
+async def on_guild_role_create(role):
+    guild_stats.role_changed(role, 1)
+
+@bot.event
+async def on_guild_role_delete(role):
+    guild_stats.role_changed(role, -1)
+
+@bot.event
+async def on_member_update(before, after):
+    """Keep leaderboard names current"""
+    if before.name != after.name:
+        name_resolver.remember(after)
+
+@bot.event
+async def on_user_update(before, after):
+    """Keep leaderboard names current"""
+    if before.name != after.name:
+        name_resolver.remember(after)
+
+@bot.event
+async def on_raw_member_remove(payload):
+    """Handle member leave events (also for members that were not cached)"""
+    member = payload.user  # a Member if it was cached, otherwise a User
+    guild = bot.get_guild(payload.guild_id)
+    guild_stats.member_left(payload.guild_id, member)
+    recent_members.forget(payload.guild_id, member.id)
     
     # Get notification channel
     notification_channel = get_channel_safely(config['notification_channel_id'])
@@ -195,7 +376,8 @@ async def on_member_remove(member):
         return
     
     # Calculate membership duration
-    membership_duration = datetime.utcnow() - member.joined_at if member.joined_at else None
+    joined_at = getattr(member, 'joined_at', None)
+    membership_duration = datetime.utcnow() - joined_at.replace(tzinfo=None) if joined_at else None
     duration_text = format_time(membership_duration) if membership_duration else "Unknown"
     
     # Create leave embed
@@ -206,7 +388,7 @@ async def on_member_remove(member):
         fields=[
             ("Member", f"{member.name}#{member.discriminator}", True),
             ("Membership Duration", duration_text, True),
-            ("Member Count", f"{guild.member_count}", True)
+            ("Member Count", f"{guild.member_count if guild else 'Unknown'}", True)
         ],
         thumbnail=member.display_avatar.url,
         footer=f"User ID: {member.id}"
@@ -214,7 +396,7 @@ async def on_member_remove(member):
     
     # Add moderator mention if configured
     content = ""
-    if config.get('moderator_role_id') and config['moderator_role_id'] != 'YOUR_MODERATOR_ROLE_ID_HERE':
+    if guild and config.get('moderator_role_id') and config['moderator_role_id'] != 'YOUR_MODERATOR_ROLE_ID_HERE':
         try:
             moderator_role = guild.get_role(int(config['moderator_role_id']))
             if moderator_role:
@@ -244,27 +426,122 @@ async def on_member_remove(member):
         except discord.HTTPException as e:
             print(f"Error sending leave log: {e}")
 
+def in_voice(state) -> bool:
+    """True when a voice state earns voice time (connected, not AFK)"""
+    return state is not None and state.channel is not None and not state.afk
+
 @bot.event
 async def on_voice_state_update(member, before, after):
     """Handle voice channel join/leave events"""
+    # The shutdown checkpoints open sessions itself; later changes are not counted
+    if shutdown.closing:
+        return
+    async with shutdown.working():
+        await handle_voice_state(member, before, after)
+
+async def handle_voice_state(member, before, after):
+    # Session accounting; moving into or out of the AFK channel pauses or resumes it
+    closed = None
+    if not member.bot:
+        if in_voice(after) and not in_voice(before):
+            name_resolver.remember(member)
+            voice_sessions.open(str(member.id), member.guild.id)
+        elif in_voice(before) and not in_voice(after):
+            closed = await end_voice_session(member)
+
     # Voice channel join
     if before.channel is None and after.channel is not None:
         await handle_voice_join(member, after.channel)
     
     # Voice channel leave
     elif before.channel is not None and after.channel is None:
-        await handle_voice_leave(member, before.channel)
+        await handle_voice_leave(member, before.channel, closed)
     
     # Voice channel move (user moved from one channel to another)
     elif before.channel is not None and after.channel is not None and before.channel != after.channel:
         await handle_voice_move(member, before.channel, after.channel)
 
+async def sync_voice_sessions():
+    """Match open sessions to who is in voice right now (startup and reconnects)
+
+    Members still in voice resume from the checkpoint saved with their
+    record, so time credited before a restart is not credited again.
+    """
+    present = set()
+    for guild in bot.guilds:
+        for channel in guild.voice_channels + guild.stage_channels:
+            for member in channel.members:
+                if member.bot or not in_voice(member.voice):
+                    continue
+                user_id = str(member.id)
+                present.add(user_id)
+                if user_id not in voice_sessions:
+                    user_data = await db.get_user(user_id, create=False)
+                    voice_sessions.open(user_id, guild.id, checkpoint=user_data.get('voice_session'))
+
+    # Sessions of members who left while we were disconnected
+    credits = {}
+    for user_id, _ in voice_sessions.items():
+        if user_id not in present:
+            session, minutes = voice_sessions.close(user_id)
+            credits[user_id] = (session, minutes, None)
+    await credit_voice_sessions(credits)
+    if len(voice_sessions):
+        print(f"🎤 Tracking {len(voice_sessions)} voice session(s)")
+
+async def credit_voice_sessions(credits):
+    """Credit {user_id: (session, minutes, checkpoint)} with one save and announce level-ups"""
+    if not credits:
+        return
+    rate = config['xp_settings']['voice_xp_per_minute']
+    rows = {}
+    for user_id, (session, minutes, checkpoint) in credits.items():
+        activity.record(VOICE, user_id, session.guild_id, minutes)
+        xp_gained = boosted_xp(user_id, minutes * rate)
+        session.xp += xp_gained
+        leaderboards.record(XP, user_id, xp_gained)
+        rows[user_id] = (minutes, xp_gained, checkpoint)
+    level_ups = await db.credit_voice(rows)
+
+    notification_channel = get_channel_safely(config['notification_channel_id'])
+    if not notification_channel:
+        return
+    for user_id, new_level in level_ups.items():
+        guild = bot.get_guild(credits[user_id][0].guild_id)
+        try:
+            # Members leave the cache with voice under the lighter cache profiles
+            member = await get_or_fetch_member(guild, int(user_id)) if guild else None
+        except discord.HTTPException:
+            member = None
+        if member is None:
+            continue
+        user_data = await db.get_user(user_id)
+        level_embed = create_embed(
+            title="🎉 Level Up!",
+            description=f"{member.mention} reached level **{new_level}**!",
+            color=int(config['embed_colors']['level_up'], 16),
+            fields=[
+                ("New Level", f"Level {new_level}", True),
+                ("Total XP", f"{user_data['xp']} XP", True)
+            ],
+            thumbnail=member.display_avatar.url
+        )
+        try:
+            await notification_channel.send(embed=level_embed)
+        except discord.HTTPException as e:
+            print(f"Error sending level up notification: {e}")
+
+async def end_voice_session(member):
+    """Close a member's session and credit the minutes not yet accrued"""
+    closed = voice_sessions.close(str(member.id))
+    if closed is None:
+        return None
+    session, minutes = closed
+    await credit_voice_sessions({str(member.id): (session, minutes, None)})
+    return session
+
 async def handle_voice_join(member, channel):
     """Handle voice channel join"""
-    # Set join time for tracking
-    voice_users[member.id] = datetime.utcnow()
-    await db.set_voice_join_time(str(member.id))
-    
     # Get notification channel
     notification_channel = get_channel_safely(config['notification_channel_id'])
     if not notification_channel:
@@ -288,58 +565,33 @@ async def handle_voice_join(member, channel):
     except discord.HTTPException as e:
         print(f"Error sending voice join notification: {e}")
 
-async def handle_voice_leave(member, channel):
+async def handle_voice_leave(member, channel, session=None):
     """Handle voice channel leave"""
-    # Calculate voice time and award XP
-    if member.id in voice_users:
-        join_time = voice_users.pop(member.id)
-        duration = datetime.utcnow() - join_time
-        duration_minutes = int(duration.total_seconds() / 60)
-        
-        if duration_minutes > 0:
-            # Award voice XP
-            xp_gained = duration_minutes * config['xp_settings']['voice_xp_per_minute']
-            leveled_up, new_level = await db.update_user_xp(str(member.id), xp_gained)
-            await db.update_voice_time(str(member.id), duration_minutes)
-            
-            # Get notification channel
-            notification_channel = get_channel_safely(config['notification_channel_id'])
-            if notification_channel:
-                # Create leave embed
-                embed = create_embed(
-                    title="🎤 Voice Channel Leave",
-                    description=f"{member.mention} left **{channel.name}**",
-                    color=int(config['embed_colors']['leave'], 16),
-                    fields=[
-                        ("Channel", channel.name, True),
-                        ("Duration", format_time(duration), True),
-                        ("XP Gained", f"+{xp_gained} XP", True)
-                    ],
-                    thumbnail=member.display_avatar.url
-                )
-                
-                try:
-                    await notification_channel.send(embed=embed)
-                except discord.HTTPException as e:
-                    print(f"Error sending voice leave notification: {e}")
-                
-                # Level up notification
-                if leveled_up:
-                    user_data = await db.get_user(str(member.id))
-                    level_embed = create_embed(
-                        title="🎉 Level Up!",
-                        description=f"{member.mention} reached level **{new_level}**!",
-                        color=int(config['embed_colors']['level_up'], 16),
-                        fields=[
-                            ("New Level", f"Level {new_level}", True),
-                            ("Total XP", f"{user_data['xp']} XP", True)
-                        ],
-                        thumbnail=member.display_avatar.url
-                    )
-                    try:
-                        await notification_channel.send(embed=level_embed)
-                    except discord.HTTPException as e:
-                        print(f"Error sending level up notification: {e}")
+    # XP was credited when the session closed; report the session total
+    if session is None or session.minutes == 0:
+        return
+
+    notification_channel = get_channel_safely(config['notification_channel_id'])
+    if not notification_channel:
+        return
+
+    # Create leave embed
+    embed = create_embed(
+        title="🎤 Voice Channel Leave",
+        description=f"{member.mention} left **{channel.name}**",
+        color=int(config['embed_colors']['leave'], 16),
+        fields=[
+            ("Channel", channel.name, True),
+            ("Duration", format_time(timedelta(seconds=session.seconds())), True),
+            ("XP Gained", f"+{session.xp} XP", True)
+        ],
+        thumbnail=member.display_avatar.url
+    )
+    
+    try:
+        await notification_channel.send(embed=embed)
+    except discord.HTTPException as e:
+        print(f"Error sending voice leave notification: {e}")
 
 async def handle_voice_move(member, from_channel, to_channel):
     """Handle voice channel move"""
@@ -369,15 +621,25 @@ async def handle_voice_move(member, from_channel, to_channel):
 @bot.event
 async def on_message(message):
     """Handle message events for XP system"""
-    if message.author.bot:
+    if message.author.bot or shutdown.closing:
         return
+    # Tracked so a shutdown waits for the XP update or command to finish
+    async with shutdown.working():
+        await handle_message(message)
+
+async def handle_message(message):
+    # Counted for every message; written by activity_flush_task
+    name_resolver.remember(message.author)
+    recent_members.remember(message.author)  # kept beside discord.py's member cache, not in it
+    await db.count_message(str(message.author.id))
+    activity.record(MESSAGES, message.author.id, message.guild.id if message.guild else None)
     
     # Check if user can gain XP from messages
-    if await db.can_gain_message_xp(str(message.author.id), config['xp_settings']['xp_cooldown_seconds']):
+    if quota_engine.hit('message_xp', message.author.id) == 0:
         # Award message XP
-        xp_gained = config['xp_settings']['message_xp']
+        xp_gained = boosted_xp(message.author.id, config['xp_settings']['message_xp'])
         leveled_up, new_level = await db.update_user_xp(str(message.author.id), xp_gained)
-        await db.update_message_time(str(message.author.id))
+        leaderboards.record(XP, message.author.id, xp_gained)
         
         # Level up notification
         if leveled_up:
@@ -401,35 +663,123 @@ async def on_message(message):
     await bot.process_commands(message)
 
 @tasks.loop(minutes=1)
-async def online_time_task():
-    """Award XP to users in voice channels every minute"""
-    for guild in bot.guilds:
-        for member in guild.members:
-            if member.voice and not member.voice.afk and not member.bot:
-                # Award voice XP for being online
-                xp_gained = config['xp_settings']['voice_xp_per_minute']
-                leveled_up, new_level = await db.update_user_xp(str(member.id), xp_gained)
-                await db.update_voice_time(str(member.id), 1)
-                
-                # Level up notification
-                if leveled_up:
-                    notification_channel = get_channel_safely(config['notification_channel_id'])
-                    if notification_channel:
-                        user_data = await db.get_user(str(member.id))
-                        level_embed = create_embed(
-                            title="🎉 Level Up!",
-                            description=f"{member.mention} reached level **{new_level}**!",
-                            color=int(config['embed_colors']['level_up'], 16),
-                            fields=[
-                                ("New Level", f"Level {new_level}", True),
-                                ("Total XP", f"{user_data['xp']} XP", True)
-                            ],
-                            thumbnail=member.display_avatar.url
-                        )
-                        try:
-                            await notification_channel.send(embed=level_embed)
-                        except discord.HTTPException as e:
-                            print(f"Error sending level up notification: {e}")
+async def voice_accrual_task():
+    """Credit every open voice session's new minutes in one batch"""
+    async with shutdown.working():
+        credits = {}
+        for user_id, session in voice_sessions.items():
+            # Catch leaves whose voice state event was missed
+            guild = bot.get_guild(session.guild_id)
+            member = guild.get_member(int(user_id)) if guild else None
+            if member is None or not in_voice(member.voice):
+                session, minutes = voice_sessions.close(user_id)
+                credits[user_id] = (session, minutes, None)
+
+        for user_id, minutes in voice_sessions.accrue().items():
+            session = voice_sessions.get(user_id)
+            credits[user_id] = (session, minutes, voice_sessions.checkpoint(session))
+        await credit_voice_sessions(credits)
+
+@tasks.loop(minutes=1)
+async def activity_flush_task():
+    """Write changed activity series, earnings buckets and message counts in batches"""
+    async with shutdown.working():
+        await activity.flush()
+        await leaderboards.flush()
+        await db.save_data()
+
+@tasks.loop(minutes=5)
+async def quota_maintenance_task():
+    """Drop expired cooldown/quota entries and persist the rest"""
+    async with shutdown.working():
+        await save_quota_state()
+
+async def save_quota_state() -> int:
+    """Sweep and write cooldown/quota state; returns how many entries were kept"""
+    quota_engine.sweep()
+    snapshot = quota_engine.snapshot()
+    data = quota_serializer.dumps(snapshot)
+    try:
+        await asyncio.to_thread(write_snapshot, QUOTA_STATE_PATH, data, 1)
+    except OSError as e:
+        print(f"Error saving quota state: {e}")
+    return sum(map(len, snapshot.values()))
+
+# Graceful shutdown: steps run in this order once work in progress has drained
+shutdown_settings = config.get('shutdown_settings', {})
+
+def begin_shutdown(reason):
+    if not shutdown.closing:
+        asyncio.create_task(graceful_shutdown(reason))
+
+async def graceful_shutdown(reason):
+    """Stop taking commands, flush everything and disconnect"""
+    deadline = shutdown_settings.get('deadline_seconds', 25)
+    print(f"🛑 {reason} received, shutting down (deadline {deadline}s)")
+    report = await shutdown.run(deadline, shutdown_settings.get('drain_seconds', 5))
+    for step, outcome in report.items():
+        print(f"   💾 {step}: {outcome}")
+    await bot.close()
+
+async def stop_background_tasks():
+    # Iterations in progress had the drain to finish; the steps below redo their work
+    for task in (voice_accrual_task, activity_flush_task, quota_maintenance_task):
+        task.cancel()
+
+async def stop_trivia_games():
+    trivia = bot.get_cog('Trivia')
+    return f"{await trivia.stop_all('the bot is restarting')} game(s)" if trivia else "not loaded"
+
+async def save_running_giveaways():
+    giveaway = bot.get_cog('Giveaway')
+    return f"{await giveaway.save_giveaways()} giveaway(s)" if giveaway else "not loaded"
+
+async def checkpoint_voice_sessions():
+    """Credit open sessions and store their checkpoints so they resume after the restart"""
+    minutes = voice_sessions.accrue()
+    credits = {user_id: (session, minutes.get(user_id, 0), voice_sessions.checkpoint(session))
+               for user_id, session in voice_sessions.items()}
+    await credit_voice_sessions(credits)
+    return f"{len(credits)} session(s)"
+
+async def persist_economy():
+    economy = bot.get_cog('Economy')
+    if economy is None:
+        return "not loaded"
+    await economy.persist()
+    return f"{len(economy.user_data)} account(s)"
+
+async def save_users():
+    pending = len(db.dirty)
+    await db.save_data()
+    return f"{pending} user(s)"
+
+async def flush_activity():
+    return f"{await activity.flush()} series"
+
+async def flush_leaderboards():
+    return f"{await leaderboards.flush()} bucket(s)"
+
+async def save_quotas():
+    return f"{await save_quota_state()} entries"
+
+async def close_storage():
+    for name in list(bot.cogs):
+        await bot.remove_cog(name)  # cancels cog tasks and closes their files
+    for store in (activity, leaderboards, db.store):
+        await asyncio.to_thread(store.close)
+
+# Tasks stop first, then games: stopping a game records results that are saved below
+shutdown.add_step('tasks', stop_background_tasks)
+shutdown.add_step('trivia', stop_trivia_games)
+shutdown.add_step('giveaways', save_running_giveaways)
+shutdown.add_step('voice', checkpoint_voice_sessions)
+shutdown.add_step('economy', persist_economy)
+shutdown.add_step('users', save_users)
+shutdown.add_step('activity', flush_activity)
+shutdown.add_step('leaderboards', flush_leaderboards)
+shutdown.add_step('quotas', save_quotas)
+shutdown.add_step('close', close_storage)
 
 # Commands
 @bot.command(name='help')
@@ -443,36 +793,36 @@ async def help_command(ctx):
     
     # Core Commands
     embed.add_field(
-        name="🎯 Core Commands (3)",
-        value="`!level` - Check your level and XP\n`!top` - Show top users by XP\n`!help` - Show this help message",
+        name="🎯 Core Commands (5)",
+        value="`!level` - Check your level and XP\n`!top [week|month|season] [page]` - Show top users by XP\n`!activity [user|server]` - Recent message and voice activity\n`!heatmap [user] [messages|voice]` - Busiest days and hours\n`!help` - Show this help message",
         inline=False
     )
     
     # Admin Commands
     embed.add_field(
-        name="⚙️ Admin Commands (5)",
-        value="`!setlevel <user> <level>` - Set user level\n`!addxp <user> <amount>` - Add XP to user\n`!resetuser <user>` - Reset specific user data\n`!resetall` - Reset all users data\n`!voicetime <user>` - Check user voice time",
+        name="⚙️ Admin Commands (6)",
+        value="`!setlevel <user> <level>` - Set user level\n`!addxp <user> <amount>` - Add XP to user\n`!resetuser <user>` - Reset specific user data\n`!resetall` - Reset all users data\n`!voicetime <user>` - Check user voice time\n`!migratestorage <format>` - Re-encode saved data",
         inline=False
     )
     
     # Economy Commands
     embed.add_field(
-        name="💰 Economy Commands (9)",
-        value="`!balance` - Check your coin balance\n`!daily` - Claim daily reward (once per day)\n`!work` - Work to earn coins (5 times per day)\n`!gamble <amount>` - Gamble your coins (5 times per day)\n`!shop` - View available items\n`!buy <item>` - Purchase items\n`!inventory` - View your items\n`!transfer <user> <amount>` - Transfer coins\n`!richest` - Show richest users",
+        name="💰 Economy Commands (11)",
+        value="`!balance` - Check your coin balance\n`!daily` - Claim daily reward (once per day)\n`!work` - Work to earn coins (5 times per day)\n`!gamble <amount>` - Gamble your coins (5 times per day)\n`!shop` - View available items\n`!buy <item>` - Purchase items\n`!inventory` - View your items\n`!transfer <user> <amount>` - Transfer coins\n`!richest [week|month|season] [page]` - Show richest users\n`!history` - Recent transactions\n`!earnings [period]` - Coins earned today/week/month",
         inline=False
     )
     
     # Games Commands
     embed.add_field(
-        name="🎮 Mini-Games (8)",
-        value="`!roll [dice]` - Roll dice (e.g., !roll 2d20)\n`!flip` - Flip a coin\n`!8ball <question>` - Ask the magic 8-ball\n`!random <min> <max>` - Get random number\n`!pick <option1> <option2> ...` - Pick randomly\n`!joke` - Get a random joke\n`!fortune` - Get your fortune\n`!rps <choice>` - Rock, Paper, Scissors",
+        name="🎮 Mini-Games (9)",
+        value="`!roll [dice]` - Roll dice (e.g., !roll 4d6kh3+2)\n`!dicestats <dice>` - Exact roll odds\n`!flip` - Flip a coin\n`!8ball <question>` - Ask the magic 8-ball\n`!random <min> <max>` - Get random number\n`!pick <option1> <option2> ...` - Pick randomly\n`!joke` - Get a random joke\n`!fortune` - Get your fortune\n`!rps <choice>` - Rock, Paper, Scissors",
         inline=False
     )
     
     # Trivia Commands
     embed.add_field(
-        name="🧠 Trivia System (3)",
-        value="`!trivia` - Start a trivia game\n`!triviascores` - Show trivia leaderboard\n`!triviareset` - Reset your trivia score",
+        name="🧠 Trivia System (6)",
+        value="`!trivia [category] [difficulty] [rounds]` - Start a trivia game\n`!triviacategories` - List categories\n`!triviascores` - Show trivia leaderboard\n`!triviastats [@user]` - Show trivia statistics\n`!triviastop` - Stop the game in this channel\n`!triviareset` - Reset your trivia score",
         inline=False
     )
     
@@ -499,9 +849,9 @@ async def level_command(ctx, member: discord.Member = None):
     if member is None:
         member = ctx.author
     
-    user_data = await db.get_user(str(member.id))
-    current_xp, xp_needed = get_level_progress(user_data['xp'], user_data['level'])
-    progress_bar = create_progress_bar(current_xp, 100)
+    user_data = await db.get_user(str(member.id), create=False)
+    current_xp, xp_needed, level_span = get_level_progress(user_data['xp'])
+    progress_bar = create_progress_bar(current_xp, level_span)
     
     embed = create_embed(
         title=f"📊 {member.name}'s Level",
@@ -509,7 +859,7 @@ async def level_command(ctx, member: discord.Member = None):
         color=int(config['embed_colors']['info'], 16),
         fields=[
             ("Total XP", f"{user_data['xp']} XP", True),
-            ("Current Level XP", f"{current_xp}/100", True),
+            ("Current Level XP", f"{current_xp}/{level_span}", True),
             ("XP to Next Level", f"{xp_needed} XP", True),
             ("Progress", progress_bar, False),
             ("Voice Time", format_voice_time(user_data['voice_time']), True),
@@ -525,40 +875,14 @@ async def profile_command(ctx, member: discord.Member = None):
     if member is None:
         member = ctx.author
     
-    user_data = await db.get_user(str(member.id))
-    current_xp, xp_needed = get_level_progress(user_data['xp'], user_data['level'])
-    progress_bar = create_progress_bar(current_xp, 100)
+    user_data = await db.get_user(str(member.id), create=False)
+    current_xp, xp_needed, level_span = get_level_progress(user_data['xp'])
+    progress_bar = create_progress_bar(current_xp, level_span)
 
     # --- Active Effects Section ---
-    effects = []
-    from datetime import datetime
-    now = datetime.utcnow()
-    # XP Boost
-    xp_boost_until = user_data.get('xp_boost_until')
-    if xp_boost_until:
-        try:
-            boost_end = datetime.fromisoformat(xp_boost_until)
-            if boost_end > now:
-                remaining = boost_end - now
-                mins, secs = divmod(remaining.seconds, 60)
-                hours, mins = divmod(mins, 60)
-                effects.append(f"⚡ **XP Boost**: {hours}h {mins}m left")
-        except Exception:
-            pass
-    # Lucky Charm
-    lucky_charm_until = user_data.get('lucky_charm_until')
-    if lucky_charm_until:
-        try:
-            charm_end = datetime.fromisoformat(lucky_charm_until)
-            if charm_end > now:
-                remaining = charm_end - now
-                mins, secs = divmod(remaining.seconds, 60)
-                hours, mins = divmod(mins, 60)
-                effects.append(f"🍀 **Lucky Charm**: {hours}h {mins}m left")
-        except Exception:
-            pass
-    # VIP Badge
-    if user_data.get('vip_badge', False):
+    effects = effect_engine.describe(str(member.id))
+    economy = bot.get_cog('Economy')
+    if economy and economy.peek_user_data(member.id).get('vip_badge', False):
         effects.append("👑 **VIP Badge**: Permanent")
 
     fields = []
@@ -582,27 +906,38 @@ async def profile_command(ctx, member: discord.Member = None):
     await ctx.send(embed=embed)
 
 @bot.command(name='top')
-async def leaderboard_command(ctx):
-    """Show top players"""
-    top_users = await db.get_top_users(10)
-    
-    if not top_users:
-        await ctx.send("No users found!")
-        return
-    
-    description = ""
-    for i, user_data in enumerate(top_users, 1):
-        member = ctx.guild.get_member(int(user_data['user_id']))
-        name = member.name if member else f"User {user_data['user_id']}"
-        description += f"**{i}.** {name} • Level {user_data['level']} • {user_data['xp']} XP\n"
-    
-    embed = create_embed(
-        title="🏆 Leaderboard",
-        description=description,
-        color=int(config['embed_colors']['info'], 16),
-        footer="Top 10 players by XP"
-    )
-    await ctx.send(embed=embed)
+async def leaderboard_command(ctx, window: str = None, page: int = 1):
+    """Show top players (all time, or XP earned this week, month or season), 10 per page"""
+    if window and window.isdigit():
+        window, page = None, int(window)
+    color = int(config['embed_colors']['info'], 16)
+    if window:
+        window = window.lower()
+        if window not in WINDOW_LABELS:
+            await ctx.send("❌ Choose `week`, `month` or `season` (or nothing for all time)!")
+            return
+        if not leaderboards.size(XP, window):
+            await ctx.send("No XP earned in that period yet!")
+            return
+        label = f"{WINDOW_LABELS[window]} ({leaderboards.season_name()})" if window == SEASON else WINDOW_LABELS[window]
+        board = RankedBoard(
+            (XP, window), f"🏆 Leaderboard • {label}", lambda: leaderboards.index(XP, window),
+            lambda rank, name, xp: f"**{rank}.** {name} • +{xp:,} XP",
+            lambda user_id: rank_footer("XP earned", leaderboards.rank(XP, window, user_id)),
+            color
+        )
+    else:
+        await db.save_data()  # the ranking reads the store
+        if not len(db.xp_ranking):
+            await ctx.send("No users found!")
+            return
+        board = RankedBoard(
+            (XP, None), "🏆 Leaderboard", lambda: db.xp_ranking,
+            lambda rank, name, xp: f"**{rank}.** {name} • Level {level_curve.level_for(xp)} • {xp:,} XP",
+            lambda user_id: rank_footer("Players by XP", db.xp_ranking.rank(str(user_id))),
+            color, refresh=db.save_data
+        )
+    await send_leaderboard(ctx, board, page)
 
 @bot.command(name='voicetime')
 async def voicetime_command(ctx, member: discord.Member = None):
@@ -610,7 +945,7 @@ async def voicetime_command(ctx, member: discord.Member = None):
     if member is None:
         member = ctx.author
     
-    user_data = await db.get_user(str(member.id))
+    user_data = await db.get_user(str(member.id), create=False)
     
     embed = create_embed(
         title=f"🎤 {member.name}'s Voice Time",
@@ -625,6 +960,59 @@ async def voicetime_command(ctx, member: discord.Member = None):
     )
     await ctx.send(embed=embed)
 
+@bot.command(name='activity')
+async def activity_command(ctx, member: Optional[discord.Member] = None, scope: str = None):
+    """Show message and voice activity for a user or the server"""
+    if member is None and scope and scope.lower() == 'server' and ctx.guild:
+        series = activity.guild(ctx.guild.id)
+        title = f"📈 {ctx.guild.name} Activity"
+        thumbnail = ctx.guild.icon.url if ctx.guild.icon else None
+    else:
+        member = member or ctx.author
+        series = activity.user(member.id)
+        title = f"📈 {member.name}'s Activity"
+        thumbnail = member.display_avatar.url
+
+    totals = series.totals()
+    week_days = series.last_days(MESSAGES, 7)
+    voice_days = series.last_days(VOICE, 7)
+    peak = series.peak_hour(MESSAGES)
+    embed = create_embed(
+        title=title,
+        description="Last 24 hours (UTC), oldest first:\n"
+                    f"💬 `{sparkline(series.last_hours(MESSAGES, 24))}`\n"
+                    f"🎤 `{sparkline(series.last_hours(VOICE, 24))}`",
+        color=int(config['embed_colors']['info'], 16),
+        fields=[
+            ("💬 Messages (7d / 30d)", f"{totals['messages']['week']:,} / {totals['messages']['month']:,}", True),
+            ("🎤 Voice (7d / 30d)", f"{format_voice_time(totals['voice']['week'])} / {format_voice_time(totals['voice']['month'])}", True),
+            ("📅 Daily Average (7d)", f"{totals['messages']['week'] / 7:.1f} messages • {format_voice_time(totals['voice']['week'] // 7)}", True),
+            ("Last 7 Days", f"💬 `{sparkline(week_days)}` {max(week_days):,} max/day\n🎤 `{sparkline(voice_days)}` {format_voice_time(max(voice_days))} max/day", False),
+            ("Busiest Hour", f"{WEEKDAYS[peak // 24]} {peak % 24:02d}:00 UTC" if peak is not None else "No activity yet", True)
+        ],
+        thumbnail=thumbnail
+    )
+    await ctx.send(embed=embed)
+
+@bot.command(name='heatmap')
+async def heatmap_command(ctx, member: Optional[discord.Member] = None, metric: str = 'messages'):
+    """Show a weekday × hour activity heatmap (last 4 weeks, UTC)"""
+    if metric.lower() not in METRIC_NAMES:
+        await ctx.send("❌ Choose `messages` or `voice`!")
+        return
+    if member is None and ctx.guild is None:
+        member = ctx.author
+    series = activity.user(member.id) if member else activity.guild(ctx.guild.id)
+    name = member.name if member else ctx.guild.name
+
+    embed = create_embed(
+        title=f"🗓️ {name} • {metric.lower().title()} Heatmap",
+        description=f"```\n{render_heatmap(series.heatmap(METRIC_NAMES[metric.lower()]))}\n```",
+        color=int(config['embed_colors']['info'], 16),
+        footer="Last 4 weeks • hours in UTC • darker is busier"
+    )
+    await ctx.send(embed=embed)
+
 # Admin commands
 @bot.command(name='setlevel')
 @commands.has_permissions(administrator=True)
@@ -635,9 +1023,10 @@ async def setlevel_command(ctx, member: discord.Member, level: int):
         return
     
     user_data = await db.get_user(str(member.id))
-    new_xp = (level - 1) * 100
+    new_xp = level_curve.xp_for(level)
     user_data['level'] = level
     user_data['xp'] = new_xp
+    db.mark_dirty(str(member.id))
     await db.save_data()
     
     embed = create_embed(
@@ -693,22 +1082,27 @@ async def reset_all_users_command(ctx):
     
     await ctx.send(embed=embed)
     
-    # Wait for confirmation
+    # Wait for confirmation (not something a shutdown should wait for)
     try:
-        await bot.wait_for(
-            'message',
-            timeout=30.0,
-            check=lambda m: m.author == ctx.author and m.channel == ctx.channel and m.content.lower() == '!confirmreset'
-        )
+        async with shutdown.paused():
+            await bot.wait_for(
+                'message',
+                timeout=30.0,
+                check=lambda m: m.author == ctx.author and m.channel == ctx.channel and m.content.lower() == '!confirmreset'
+            )
     except asyncio.TimeoutError:
         await ctx.send("❌ Reset cancelled - no confirmation received within 30 seconds.")
         return
+    if shutdown.closing:
+        await ctx.send("❌ Reset cancelled - the bot is restarting.")
+        return
     
     # Proceed with reset
     try:
         # Clear all user data
-        db.data = {}
-        await db.save_data()
+        await db.reset_all()
+        await activity.reset()
+        await leaderboards.reset(XP)
         
         success_embed = discord.Embed(
             title="✅ Reset Complete",
@@ -745,34 +1139,31 @@ async def reset_user_command(ctx, member: discord.Member):
     
     await ctx.send(embed=embed)
     
-    # Wait for confirmation
+    # Wait for confirmation (not something a shutdown should wait for)
     try:
-        await bot.wait_for(
-            'message',
-            timeout=30.0,
-            check=lambda m: m.author == ctx.author and m.channel == ctx.channel and m.content.lower() == '!confirmresetuser'
-        )
+        async with shutdown.paused():
+            await bot.wait_for(
+                'message',
+                timeout=30.0,
+                check=lambda m: m.author == ctx.author and m.channel == ctx.channel and m.content.lower() == '!confirmresetuser'
+            )
     except asyncio.TimeoutError:
         await ctx.send("❌ Reset cancelled - no confirmation received within 30 seconds.")
         return
+    if shutdown.closing:
+        await ctx.send("❌ Reset cancelled - the bot is restarting.")
+        return
     
     # Proceed with reset
     try:
         user_id = str(member.id)
         
         # Check if user exists in database
-        if user_id in db.data:
+        if await db.has_user(user_id):
             # Reset user data to default values
-            db.data[user_id] = {
-                'xp': 0,
-                'level': 1,
-                'voice_time': 0,
-                'total_voice_time': 0,
-                'messages_sent': 0,
-                'last_voice_join': None,
-                'last_message_time': None
-            }
-            await db.save_data()
+            await db.reset_user(user_id)
+            await activity.reset(user_id)
+            await leaderboards.reset(XP, user_id)
             
             success_embed = discord.Embed(
                 title="✅ User Reset Complete",
@@ -795,50 +1186,71 @@ async def reset_user_command(ctx, member: discord.Member):
         )
         await ctx.send(embed=error_embed)
 
+@bot.command(name='migratestorage')
+@commands.has_permissions(administrator=True)
+async def migrate_storage_command(ctx, format_name: str):
+    """Re-encode all persisted data in another format (Admin only)"""
+    serializers = available_serializers()
+    if format_name not in serializers:
+        await ctx.send(f"❌ Unknown or unavailable format! Available: {', '.join(serializers)}")
+        return
+
+    serializer = serializers[format_name]
+    started = time.perf_counter()
+    users_migrated = await db.migrate_format(serializer)
+
+    economy = bot.get_cog('Economy')
+    if economy:
+        economy.serializer = serializer
+        await economy.persist()  # under the save lock, written off the event loop
+    elapsed = time.perf_counter() - started
+
+    embed = create_embed(
+        title="📦 Storage Migrated",
+        description=f"All saved data is now written as **{format_name}**",
+        color=int(config['embed_colors']['info'], 16),
+        fields=[
+            ("Users Re-encoded", str(users_migrated), True),
+            ("Economy Data", "Re-encoded" if economy else "Not loaded", True),
+            ("Time Taken", f"{elapsed:.2f}s", True)
+        ],
+        footer="Set storage_settings.format in config to keep this format after a restart"
+    )
+    await ctx.send(embed=embed)
+
+@bot.after_invoke
+async def settle_quotas(ctx):
+    """Give back rate limit uses a command did not spend (it rejected its input)"""
+    refund_quota(ctx)
+
 # Error handling
 @bot.event
 async def on_command_error(ctx, error):
+    refund_quota(ctx)  # failed before or during the command: the use doesn't count
     if isinstance(error, commands.MissingPermissions):
         await ctx.send("❌ You don't have permission to use this command!")
     elif isinstance(error, commands.MissingRequiredArgument):
         await ctx.send("❌ Missing required argument! Use `!help <command>` for usage.")
     elif isinstance(error, commands.BadArgument):
         await ctx.send("❌ Invalid argument! Please check your input.")
+    elif isinstance(error, QuotaExceeded):
+        await ctx.send(f"⏳ Slow down! You can use this command again in {format_time(timedelta(seconds=error.retry_after + 1))}.")
     else:
         await ctx.send(f"❌ An error occurred: {error}")
 
 # Load all cogs
 async def load_cogs():
-    """Load all bot cogs"""
-    try:
-        await bot.add_cog(Games(bot))
-        print("✅ Games cog loaded")
-    except Exception as e:
-        print(f"❌ Failed to load Games cog: {e}")
-    
-    try:
-        await bot.add_cog(Trivia(bot))
-        print("✅ Trivia cog loaded")
-    except Exception as e:
-        print(f"❌ Failed to load Trivia cog: {e}")
-    
-    try:
-        await bot.add_cog(Giveaway(bot))
-        print("✅ Giveaway cog loaded")
-    except Exception as e:
-        print(f"❌ Failed to load Giveaway cog: {e}")
-    
-    try:
-        await bot.add_cog(Utility(bot))
-        print("✅ Utility cog loaded")
-    except Exception as e:
-        print(f"❌ Failed to load Utility cog: {e}")
-    
+    """Load all bot cogs concurrently (their files are opened in cog_load threads)"""
+    await asyncio.gather(*(load_cog(cog_class) for cog_class in COGS))
+
+async def load_cog(cog_class):
+    name = cog_class.__name__
+    started = time.perf_counter()
     try:
-        await bot.add_cog(Economy(bot))
-        print("✅ Economy cog loaded")
+        await bot.add_cog(cog_class(bot))
+        print(f"✅ {name} cog loaded ({(time.perf_counter() - started) * 1000:.0f}ms)")
     except Exception as e:
-        print(f"❌ Failed to load Economy cog: {e}")
+        print(f"❌ Failed to load {name} cog: {e}")
 
 # Create Flask app for Render
 app = Flask(__name__)
@@ -849,8 +1261,22 @@ def home():
 
 @app.route('/health')
 def health():
+    if shutdown.closing:
+        return "Shutting down", 503
     return "OK", 200
 
+@app.route('/metrics')
+def metrics():
+    trivia = bot.get_cog('Trivia')
+    return jsonify({
+        'trivia': trivia.metrics() if trivia else None,
+        'leaderboard_pages': page_cache.metrics(),
+        'names': name_resolver.metrics(),
+        'guilds': guild_stats.metrics(bot),
+        'startup_seconds': dict(startup_timings),
+        'shutdown': dict(shutdown.report) if shutdown.closing else None
+    })
+
 def run_flask():
     """Run Flask web server"""
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 8080)))
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterator, Optional
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entries"""
+
+    def __init__(self, capacity: int, is_pinned: Optional[Callable[[Hashable], bool]] = None):
+        if capacity < 1:
+            raise ValueError("LRU capacity must be at least 1")
+        self.capacity = capacity
+        self.is_pinned = is_pinned
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a cached value and mark it as recently used"""
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            return default
+        return self._entries[key]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return a cached value without touching its recency"""
+        return self._entries.get(key, default)
+
+    def put(self, key: Hashable, value: Any):
+        """Insert or refresh an entry, evicting old entries if over capacity"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self.shrink()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry and return its value"""
+        return self._entries.pop(key, default)
+
+    def clear(self):
+        """Drop every cached entry"""
+        self._entries.clear()
+
+    def items(self):
+        """Iterate over (key, value) pairs from least to most recently used"""
+        return self._entries.items()
+
+    def shrink(self):
+        """Evict unpinned entries, oldest first, until back within capacity"""
+        excess = len(self._entries) - self.capacity
+        if excess <= 0:
+            return
+
+        victims = []
+        for key in self._entries:
+            if self.is_pinned is None or not self.is_pinned(key):
+                victims.append(key)
+                if len(victims) == excess:
+                    break
+
+        for key in victims:
+            del self._entries[key]
+        self.evictions += len(victims)
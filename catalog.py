@@ -0,0 +1,163 @@
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Used when the item file is missing or unreadable
+DEFAULT_ITEMS = {
+    "role_color": {"name": "Custom Role Color", "price": 1000, "description": "Change your role color", "aliases": ["role color", "color"]},
+    "xp_boost": {"name": "XP Boost (1 hour)", "price": 500, "description": "2x XP for 1 hour", "aliases": ["xp boost", "boost"]},
+    "lucky_charm": {"name": "Lucky Charm", "price": 200, "description": "Better gambling odds", "aliases": ["charm"]},
+    "vip_badge": {"name": "VIP Badge", "price": 5000, "description": "Special VIP status", "aliases": ["vip"]},
+    "mystery_box": {"name": "Mystery Box", "price": 100, "description": "Random rewards", "aliases": ["box"]}
+}
+
+
+def normalize(name: str) -> str:
+    """Lowercase a name and collapse punctuation and whitespace to single spaces"""
+    return re.sub(r'[^a-z0-9]+', ' ', name.lower()).strip()
+
+
+class _TrieNode:
+    __slots__ = ('children', 'key', 'ids')
+
+    def __init__(self):
+        self.children = {}
+        self.key = None   # normalized name ending here
+        self.ids = set()  # every item id reachable below this node
+
+
+class Catalog:
+    """Shop items with a precomputed name index
+
+    Names, ids and aliases are normalized once at load time, so exact
+    lookups are a single dict access. A trie over the same keys answers
+    prefix queries in O(len(query)) and bounded edit-distance (typo)
+    queries without comparing against every name.
+    """
+
+    def __init__(self, items: Dict[str, dict]):
+        self.items = items
+        self.index = {}  # {normalized name: item_id}
+        self.root = _TrieNode()
+        for item_id, item in items.items():
+            for name in [item['name'], item_id, *item.get('aliases', [])]:
+                self._add(normalize(name), item_id)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.items
+
+    def _add(self, key: str, item_id: str):
+        if not key:
+            return
+        self.index.setdefault(key, item_id)
+        node = self.root
+        node.ids.add(item_id)
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+            node.ids.add(item_id)
+        node.key = key
+
+    def get(self, item_id: str) -> Optional[dict]:
+        return self.items.get(item_id)
+
+    def name(self, item_id: str) -> str:
+        item = self.items.get(item_id)
+        return item['name'] if item else item_id
+
+    def prefix(self, query: str) -> List[str]:
+        """Item ids with a name or alias starting with the query"""
+        node = self.root
+        for char in normalize(query):
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return sorted(node.ids)
+
+    def fuzzy(self, query: str, max_distance: int = 2) -> List[Tuple[int, str]]:
+        """(distance, item_id) pairs within max_distance edits of the query
+
+        Walks the trie carrying one Levenshtein row per node, and prunes any
+        branch whose row minimum already exceeds max_distance.
+        """
+        query = normalize(query)
+        best = {}
+        first_row = list(range(len(query) + 1))
+
+        def walk(node, char, previous_row):
+            row = [previous_row[0] + 1]
+            for i in range(1, len(query) + 1):
+                cost = 0 if query[i - 1] == char else 1
+                row.append(min(row[i - 1] + 1, previous_row[i] + 1, previous_row[i - 1] + cost))
+            if node.key is not None and row[-1] <= max_distance:
+                item_id = self.index[node.key]
+                best[item_id] = min(best.get(item_id, row[-1]), row[-1])
+            if min(row) <= max_distance:
+                for next_char, child in node.children.items():
+                    walk(child, next_char, row)
+
+        for char, child in self.root.children.items():
+            walk(child, char, first_row)
+        return sorted((distance, item_id) for item_id, distance in best.items())
+
+    def resolve(self, query: str) -> Optional[str]:
+        """Item id for an exact name, id or alias, or a unique prefix
+
+        Typos are never resolved, only offered by ``suggest``, so a purchase
+        cannot land on an item the user did not name.
+        """
+        key = normalize(query)
+        if key in self.index:
+            return self.index[key]
+        matches = self.prefix(key)
+        if len(matches) == 1:
+            return matches[0]
+        return None
+
+    def suggest(self, query: str, limit: int = 3) -> List[str]:
+        """Item ids the user probably meant, best first"""
+        suggestions = self.prefix(query)
+        for _, item_id in self.fuzzy(query):
+            if item_id not in suggestions:
+                suggestions.append(item_id)
+        return suggestions[:limit]
+
+
+def load_catalog(path: str = 'shop_items.json') -> Catalog:
+    """Load item definitions from a JSON file, falling back to the defaults"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+    except FileNotFoundError:
+        items = DEFAULT_ITEMS
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error loading shop items from {path}: {e}")
+        items = DEFAULT_ITEMS
+    return Catalog(items)
+
+
+def add_item(inventory: Dict[str, int], item_id: str, count: int = 1):
+    """Add items to an {item_id: count} inventory"""
+    inventory[item_id] = inventory.get(item_id, 0) + count
+
+
+def remove_item(inventory: Dict[str, int], item_id: str, count: int = 1) -> bool:
+    """Take items out of an inventory; returns False if there are not enough"""
+    held = inventory.get(item_id, 0)
+    if held < count:
+        return False
+    if held == count:
+        del inventory[item_id]
+    else:
+        inventory[item_id] = held - count
+    return True
+
+
+def inventory_from_list(items: list) -> Dict[str, int]:
+    """Convert a legacy list inventory into item counts"""
+    inventory = {}
+    for item_id in items:
+        add_item(inventory, item_id)
+    return inventory
@@ -1,111 +1,241 @@
-import json
 import asyncio
-import aiofiles
-from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
+
+from cache import LRUCache
+from levels import LevelCurve, level_curve
+from serialization import Serializer, get_serializer
+from storage import SnapshotError, SqliteRecordStore, read_snapshot, write_snapshot
+
+DEFAULT_USER = {
+    'xp': 0,
+    'level': 1,
+    'voice_time': 0,
+    'total_voice_time': 0,
+    'messages_sent': 0,
+    'voice_session': None  # [started, credited up to] epoch seconds while in voice
+}
+
+def default_user() -> dict:
+    """Fresh user record with default values"""
+    return dict(DEFAULT_USER)
+
+class StoreRanking:
+    """Users ranked by an indexed store column, read like a RankIndex
+
+    Nothing is kept in memory but the count: pages are keyset queries on the
+    column's index, so ranking millions of users costs no more RAM than ten.
+    ``version`` moves whenever rows are written, so rendered pages are
+    reused until then; save pending changes before reading (see ``refresh``).
+    """
+
+    def __init__(self, store: SqliteRecordStore, column: str):
+        self.store = store
+        self.column = column
+        self.version = 0
+        self._count = None
+
+    def touch(self):
+        """Rows were written: drop the cached count and outdate rendered pages"""
+        self.version += 1
+        self._count = None
+
+    def __len__(self) -> int:
+        if self._count is None:
+            self._count = self.store.count_ranked(self.column)
+        return self._count
+
+    def rank(self, user_id: str) -> Optional[int]:
+        return self.store.rank_of(self.column, user_id)
+
+    def page(self, offset: int = 0, limit: int = 10):
+        return self.store.ranked(self.column, limit, offset)
+
+    def after(self, cursor: Optional[tuple], limit: int = 10):
+        """Rows following a ``RankIndex.cursor`` (``(-score, user_id)``)"""
+        if cursor is None:
+            return self.page(0, limit)
+        return self.store.ranked(self.column, limit, after=(-cursor[0], cursor[1]))
 
 class UserDatabase:
-    def __init__(self):
-        self.data = {}
-        self.file_path = 'user_data.json'
+    def __init__(self, cache_size: int = 5000, db_path: str = 'user_data.db',
+                 serializer: Optional[Serializer] = None):
+        self.file_path = 'user_data.json'  # legacy snapshot, imported once into the store
+        self.curve_path = 'level_curve.json'  # curve the stored levels were computed with
+        self.store = SqliteRecordStore(db_path, table='users', indexed=('xp',), serializer=serializer)
+        self.dirty = set()
+        self.saving = set()  # being written by save_data
+        # Dirty records are pinned so they are never evicted before being written
+        self.cache = LRUCache(cache_size, is_pinned=lambda user_id: user_id in self.dirty or user_id in self.saving)
+        # All-time XP ranking, served from the store's xp index
+        self.xp_ranking = StoreRanking(self.store, 'xp')
 
     async def load_data(self):
-        """Load user data from JSON file"""
+        """Open the user store, importing the legacy JSON file on first run"""
+        await asyncio.to_thread(self.store.open)
+        if self.store.count() == 0:
+            await self.import_legacy()
+        self.xp_ranking.touch()
+
+    async def import_legacy(self):
         try:
-            async with aiofiles.open(self.file_path, 'r') as f:
-                content = await f.read()
-                self.data = json.loads(content) if content else {}
-        except FileNotFoundError:
-            self.data = {}
-        except json.JSONDecodeError:
-            print("Error: Invalid JSON in user_data.json")
-            self.data = {}
+            legacy, _ = await asyncio.to_thread(read_snapshot, self.file_path, 0)
+        except SnapshotError as e:
+            print(f"Error: Could not import {self.file_path}: {e}")
+            return
+
+        if legacy:
+            await asyncio.to_thread(self.store.put_many, legacy)
+            print(f"📦 Imported {len(legacy)} users from {self.file_path}")
 
     async def save_data(self):
-        """Save user data to JSON file"""
+        """Write every dirty user record to the store"""
+        if not self.dirty:
+            return
+        user_ids = list(self.dirty)
+        self.dirty.clear()
+        # Still pinned while written: a failed write marks them dirty again
+        self.saving.update(user_ids)
+        # Encode on the event loop so handlers cannot mutate records mid-write
+        rows = [
+            self.store.row_for(user_id, self.cache.peek(user_id))
+            for user_id in user_ids if user_id in self.cache
+        ]
         try:
-            async with aiofiles.open(self.file_path, 'w') as f:
-                await f.write(json.dumps(self.data, indent=2))
+            await asyncio.to_thread(self.store.write_rows, rows)
         except Exception as e:
+            self.dirty.update(user_ids)
             print(f"Error saving data: {e}")
+        else:
+            self.xp_ranking.touch()
+        finally:
+            self.saving.difference_update(user_ids)
+        self.cache.shrink()
+
+    async def apply_level_curve(self, curve: LevelCurve = level_curve) -> int:
+        """Recompute every stored level if the curve changed since the last run
+
+        Records are walked in batches and looked up against the curve in one
+        vectorized pass per batch; only users whose level moved are written.
+        Returns how many levels changed.
+        """
+        signature = curve.signature()
+        try:
+            applied, _ = await asyncio.to_thread(read_snapshot, self.curve_path, 0)
+        except SnapshotError as e:
+            print(f"Error reading {self.curve_path}: {e}")
+            applied = None
+        if applied == signature:
+            return 0
+
+        await self.save_data()
+        changed = await asyncio.to_thread(self._recompute_levels, curve)
+        for _, user in self.cache.items():
+            user['level'] = curve.level_for(user['xp'])
+        await asyncio.to_thread(write_snapshot, self.curve_path, get_serializer('json').dumps(signature), 0)
+        return changed
 
-    async def get_user(self, user_id: str):
-        """Get or create user data"""
-        if user_id not in self.data:
-            self.data[user_id] = {
-                'xp': 0,
-                'level': 1,
-                'voice_time': 0,
-                'total_voice_time': 0,
-                'messages_sent': 0,
-                'last_voice_join': None,
-                'last_message_time': None
+    def _recompute_levels(self, curve: LevelCurve) -> int:
+        changed = 0
+        for batch in self.store.batches():
+            levels = curve.levels_for([int(record.get('xp') or 0) for _, record in batch])
+            updates = {
+                key: {**record, 'level': level}
+                for (key, record), level in zip(batch, levels)
+                if record.get('level') != level
             }
-        return self.data[user_id]
+            if updates:
+                self.store.put_many(updates)
+                changed += len(updates)
+        return changed
+
+    async def migrate_format(self, serializer: Serializer) -> int:
+        """Re-encode every stored user with another serializer"""
+        await self.save_data()
+        return await asyncio.to_thread(self.store.reencode, serializer)
+
+    def mark_dirty(self, user_id: str):
+        """Flag a cached record as modified so the next save writes it"""
+        if user_id in self.cache:
+            self.dirty.add(user_id)
+
+    async def get_user(self, user_id: str, create: bool = True):
+        """Get user data, creating the record unless this is a read-only lookup
+
+        With ``create=False`` an unknown user gets a throwaway default record
+        that is neither cached nor persisted.
+        """
+        user = self.cache.get(user_id)
+        if user is not None:
+            return user
+
+        stored = self.store.get(user_id)
+        if stored is None:
+            if not create:
+                return default_user()
+            user = default_user()
+            self.dirty.add(user_id)
+        else:
+            stored.pop('last_message_time', None)  # old cooldown field, now kept by the quota engine
+            user = {**DEFAULT_USER, **stored}
+        self.cache.put(user_id, user)
+        return user
+
+    async def has_user(self, user_id: str) -> bool:
+        """Check if a user has a record without creating one"""
+        return user_id in self.cache or self.store.contains(user_id)
+
+    async def reset_user(self, user_id: str):
+        """Reset a single user to default values"""
+        self.cache.put(user_id, default_user())
+        self.mark_dirty(user_id)
+        await self.save_data()
+
+    async def reset_all(self):
+        """Delete every user record"""
+        self.cache.clear()
+        self.dirty.clear()
+        await asyncio.to_thread(self.store.clear)
+        self.xp_ranking.touch()
 
     async def update_user_xp(self, user_id: str, xp_gained: int):
         """Update user XP and check for level up"""
         user = await self.get_user(user_id)
+        leveled_up, new_level = self._add_xp(user, xp_gained)
+        self.mark_dirty(user_id)
+        await self.save_data()
+        return leveled_up, new_level
+
+    def _add_xp(self, user: dict, xp_gained: int) -> Tuple[bool, int]:
         user['xp'] += xp_gained
-        
-        # Calculate new level (200 XP per level)
-        new_level = (user['xp'] // 200) + 1
+        new_level = level_curve.level_for(user['xp'])
         leveled_up = new_level > user['level']
         user['level'] = new_level
-        
-        await self.save_data()
         return leveled_up, new_level
 
-    async def update_voice_time(self, user_id: str, minutes: int):
-        """Update user voice time"""
+    async def count_message(self, user_id: str):
+        """Count a sent message; written with the next save"""
         user = await self.get_user(user_id)
-        user['voice_time'] += minutes
-        user['total_voice_time'] += minutes
-        await self.save_data()
+        user['messages_sent'] += 1
+        self.mark_dirty(user_id)
 
-    async def set_voice_join_time(self, user_id: str):
-        """Set voice join time for tracking"""
-        user = await self.get_user(user_id)
-        user["last_voice_join"] = datetime.utcnow().isoformat()
-        await self.save_data()
+    async def credit_voice(self, credits: Dict[str, Tuple[int, int, Optional[list]]]) -> Dict[str, int]:
+        """Add voice minutes and XP for many users with a single save
 
-    async def clear_voice_join_time(self, user_id: str) -> Optional[timedelta]:
-        """Clear voice join time and return duration"""
-        user = await self.get_user(user_id)
-        if user["last_voice_join"]:
-            join_time = datetime.fromisoformat(user["last_voice_join"])
-            duration = datetime.utcnow() - join_time
-            user["last_voice_join"] = None
-            await self.save_data()
-            return duration
-        return None
-
-    async def can_gain_message_xp(self, user_id: str, cooldown_seconds: int):
-        """Check if user can gain XP from messages"""
-        user = await self.get_user(user_id)
-        last_time = user.get('last_message_time')
-        
-        if not last_time:
-            return True
-        
-        try:
-            last_time = datetime.fromisoformat(last_time)
-            time_diff = datetime.utcnow() - last_time
-            return time_diff.total_seconds() >= cooldown_seconds
-        except:
-            return True
-
-    async def update_message_time(self, user_id: str):
-        """Update last message time"""
-        user = await self.get_user(user_id)
-        user["last_message_time"] = datetime.utcnow().isoformat()
+        ``credits`` maps user ids to ``(minutes, xp, checkpoint)``; the session
+        checkpoint is written in the same row as the credit (None once the
+        session is over). Returns ``{user_id: new_level}`` for level-ups.
+        """
+        level_ups = {}
+        for user_id, (minutes, xp, checkpoint) in credits.items():
+            user = await self.get_user(user_id)
+            if not minutes and user.get('voice_session') == checkpoint:
+                continue
+            user['voice_time'] += minutes
+            user['total_voice_time'] += minutes
+            user['voice_session'] = checkpoint
+            leveled_up, new_level = self._add_xp(user, xp)
+            if leveled_up:
+                level_ups[user_id] = new_level
+            self.mark_dirty(user_id)
         await self.save_data()
-
-    async def get_top_users(self, limit: int = 10):
-        """Get top users by XP"""
-        sorted_users = sorted(
-            self.data.items(),
-            key=lambda x: x[1]['xp'],
-            reverse=True
-        )
-        return [{'user_id': user_id, **user_data} for user_id, user_data in sorted_users[:limit]] 
\ No newline at end of file
+        return level_ups
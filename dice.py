@@ -0,0 +1,374 @@
+import math
+import re
+from fractions import Fraction
+from typing import List, Optional, Tuple
+
+from cache import LRUCache
+from rng import numpy
+
+MAX_TERMS = 20
+MAX_DICE = 100000        # dice per expression, across all terms
+MAX_SIDES = 1000000
+EXPLODE_LIMIT = 10       # re-rolls per exploding die, also used by the statistics
+BATCH_THRESHOLD = 1000   # dice per term before switching to NumPy batches
+SHOW_ROLLS_LIMIT = 30    # dice per term listed individually in the result
+MAX_STATS_COST = 2000000  # rough count of big-integer operations for !dicestats
+
+TERM_RE = re.compile(r'([+-])?(?:(\d*)d(\d+|%)((?:k[hl]?\d+|d[hl]\d+|!)*)|(\d+))')
+MODIFIER_RE = re.compile(r'(k[hl]?|d[hl])(\d+)|!')
+
+
+class DiceError(ValueError):
+    """Raised for malformed or oversized dice expressions"""
+
+
+class Constant:
+    """A flat number such as the +2 in 1d20+2"""
+
+    def __init__(self, value: int):
+        self.value = value
+        self.count = 0
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+    def roll(self, rng) -> Tuple[int, Optional[str]]:
+        return self.value, None
+
+    def distribution(self):
+        return self.value, [1], 1
+
+    def stats_cost(self) -> int:
+        return 1
+
+
+class DiceTerm:
+    """NdS with optional keep/drop and exploding modifiers"""
+
+    def __init__(self, count: int, sides: int, keep: Optional[Tuple[str, int]] = None, explode: bool = False):
+        self.count = count
+        self.sides = sides
+        self.keep = keep  # ('h' | 'l', how many dice are kept)
+        self.explode = explode
+
+    def __str__(self) -> str:
+        text = f"{self.count}d{self.sides}"
+        if self.explode:
+            text += "!"
+        if self.keep and self.keep[1] != self.count:
+            text += f"k{self.keep[0]}{self.keep[1]}"
+        return text
+
+    def _kept(self, values):
+        """Indexes of the kept dice in a list of values"""
+        if not self.keep:
+            return range(len(values))
+        order = sorted(range(len(values)), key=values.__getitem__, reverse=self.keep[0] == 'h')
+        return sorted(order[:self.keep[1]])
+
+    def roll(self, rng) -> Tuple[int, Optional[str]]:
+        """Total of the term and a short listing of the dice (None if too many)"""
+        if numpy is not None and rng.np_random is not None and self.count >= BATCH_THRESHOLD:
+            return self._roll_batch(rng), None
+
+        values = rng.rolls(self.sides, self.count)
+        if self.explode:
+            exploding = [i for i, value in enumerate(values) if value == self.sides]
+            for _ in range(EXPLODE_LIMIT):
+                if not exploding:
+                    break
+                extra = rng.rolls(self.sides, len(exploding))
+                for i, value in zip(exploding, extra):
+                    values[i] += value
+                exploding = [i for i, value in zip(exploding, extra) if value == self.sides]
+
+        kept = set(self._kept(values))
+        total = sum(values[i] for i in kept)
+        if self.count > SHOW_ROLLS_LIMIT:
+            return total, None
+        listing = ", ".join(str(value) if i in kept else f"~~{value}~~" for i, value in enumerate(values))
+        return total, listing
+
+    def _roll_batch(self, rng) -> int:
+        values = rng.np_random.integers(1, self.sides + 1, size=self.count)
+        if self.explode:
+            exploding = numpy.flatnonzero(values == self.sides)
+            for _ in range(EXPLODE_LIMIT):
+                if not exploding.size:
+                    break
+                extra = rng.np_random.integers(1, self.sides + 1, size=exploding.size)
+                values[exploding] += extra
+                exploding = exploding[extra == self.sides]
+        if self.keep:
+            values = numpy.sort(values)
+            values = values[-self.keep[1]:] if self.keep[0] == 'h' else values[:self.keep[1]]
+        return int(values.sum())
+
+    def stats_cost(self) -> int:
+        """Rough number of operations ``distribution`` needs"""
+        span = self.sides * (EXPLODE_LIMIT + 1 if self.explode else 1)
+        if self.keep and self.keep[1] < self.count:
+            return span * span * (self.count + 1) ** 2 * self.keep[1] // 2
+        if not self.explode:
+            return self.count * self.count * span
+        return (self.count * span) ** 2
+
+    def _die(self):
+        """Distribution of one die as (offset, counts, denominator)"""
+        if not self.explode:
+            return 1, [1] * self.sides, self.sides
+        # A value m*S + r (r < S) needs m maximum rolls then r: S^-(m+1).
+        # After EXPLODE_LIMIT re-rolls the last roll no longer explodes.
+        sides, limit = self.sides, EXPLODE_LIMIT
+        counts = []
+        for m in range(limit + 1):
+            weight = sides ** (limit - m)
+            counts.extend([weight] * (sides - 1))
+            counts.append(0 if m < limit else weight)
+        return 1, counts, sides ** (limit + 1)
+
+    def distribution(self):
+        offset, die, denominator = self._die()
+        if self.keep and self.keep[1] < self.count:
+            return _keep_distribution(offset, die, denominator, self.count, self.keep)
+        if not self.explode:
+            return self.count, _uniform_sum(self.sides, self.count), denominator ** self.count
+        return _power(offset, die, denominator, self.count)
+
+
+class Expression:
+    """Sum of signed dice terms and constants"""
+
+    def __init__(self, terms: List[Tuple[int, object]]):
+        self.terms = terms
+        self._distribution = None
+
+    def __str__(self) -> str:
+        text = ""
+        for sign, term in self.terms:
+            text += ("-" if sign < 0 else "+" if text else "") + str(term)
+        return text
+
+    @property
+    def dice_count(self) -> int:
+        return sum(term.count for _, term in self.terms)
+
+    def roll(self, rng) -> Tuple[int, List[Tuple[str, int, Optional[str]]]]:
+        """Total and per-term (label, subtotal, listing) details"""
+        total = 0
+        details = []
+        for sign, term in self.terms:
+            subtotal, listing = term.roll(rng)
+            total += sign * subtotal
+            details.append((("-" if sign < 0 else "") + str(term), sign * subtotal, listing))
+        return total, details
+
+    def distribution(self):
+        """Exact distribution as (lowest total, counts, denominator), memoized"""
+        if self._distribution is None:
+            self._distribution = self._compute_distribution()
+        return self._distribution
+
+    def _compute_distribution(self):
+        cost = sum(term.stats_cost() for _, term in self.terms)
+        if cost > MAX_STATS_COST:
+            raise DiceError("Expression is too large for exact statistics")
+
+        result = (0, [1], 1)
+        for sign, term in self.terms:
+            offset, counts, denominator = term.distribution()
+            if sign < 0:
+                offset, counts = -(offset + len(counts) - 1), counts[::-1]
+            result = _convolve(result, (offset, counts, denominator))
+        return result
+
+
+def _convolve(a, b):
+    """Distribution of the sum of two independent distributions"""
+    offset_a, counts_a, den_a = a
+    offset_b, counts_b, den_b = b
+    if len(counts_a) < len(counts_b):
+        counts_a, counts_b = counts_b, counts_a
+    result = [0] * (len(counts_a) + len(counts_b) - 1)
+    for j, weight in enumerate(counts_b):
+        if weight:
+            for i, count in enumerate(counts_a):
+                result[i + j] += count * weight
+    return offset_a + offset_b, result, den_a * den_b
+
+
+def _power(offset, counts, denominator, n):
+    """Distribution of the sum of n independent copies, by repeated squaring"""
+    result = (0, [1], 1)
+    base = (offset, counts, denominator)
+    while n:
+        if n & 1:
+            result = _convolve(result, base)
+        n >>= 1
+        if n:
+            base = _convolve(base, base)
+    return result
+
+
+def _uniform_sum(sides: int, n: int) -> List[int]:
+    """Ways to roll each total of n dS (totals n..n*sides), one die at a time
+
+    Adding a die is a sliding window sum over the previous counts, so each
+    step is linear in the support instead of a full convolution.
+    """
+    counts = [1] * sides
+    for _ in range(n - 1):
+        prefix = [0]
+        for count in counts:
+            prefix.append(prefix[-1] + count)
+        size = len(counts) + sides - 1
+        counts = [prefix[min(i + 1, len(counts))] - prefix[max(0, i - sides + 1)] for i in range(size)]
+    return counts
+
+
+def _keep_distribution(offset, die, denominator, n, keep):
+    """Distribution of the sum of the k highest (or lowest) of n dice
+
+    Faces are visited from best to worst for the kept side. The state is
+    (dice placed so far, kept total); placing j dice on a face multiplies the
+    ways by C(remaining, j) * weight^j, and only the first k placed are kept.
+    """
+    mode, k = keep
+    faces = [(offset + i, weight) for i, weight in enumerate(die) if weight]
+    if mode == 'h':
+        faces.reverse()
+
+    states = {(0, 0): 1}
+    for value, weight in faces:
+        following = {}
+        for (placed, total), ways in states.items():
+            remaining = n - placed
+            power = 1
+            for j in range(remaining + 1):
+                kept = min(j, max(0, k - placed))
+                key = (placed + j, total + kept * value)
+                following[key] = following.get(key, 0) + ways * math.comb(remaining, j) * power
+                power *= weight
+        states = following
+
+    totals = {total: ways for (placed, total), ways in states.items() if placed == n}
+    low = min(totals)
+    counts = [0] * (max(totals) - low + 1)
+    for total, ways in totals.items():
+        counts[total - low] = ways
+    return low, counts, denominator ** n
+
+
+_parse_cache = LRUCache(512)
+
+
+def parse(expression: str) -> Expression:
+    """Parse a dice expression such as 4d6kh3+2 or 2d6!+1d8-1 (cached)"""
+    cache_key = re.sub(r'\s+', '', expression.lower())
+    cached = _parse_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    key = cache_key
+    if key.isdigit():
+        key = f"1d{key}"  # a bare number is a single die
+
+    terms = []
+    position = 0
+    while position < len(key):
+        match = TERM_RE.match(key, position)
+        if not match or match.end() == position or (terms and not match.group(1)):
+            raise DiceError(f"Can't read the expression near `{key[position:] or key}`")
+        position = match.end()
+        sign = -1 if match.group(1) == '-' else 1
+        if match.group(5) is not None:
+            terms.append((sign, Constant(int(match.group(5)))))
+        else:
+            terms.append((sign, _dice_term(match)))
+        if len(terms) > MAX_TERMS:
+            raise DiceError(f"Too many terms! Maximum is {MAX_TERMS}.")
+    if not terms:
+        raise DiceError("Empty dice expression")
+
+    parsed = Expression(terms)
+    if parsed.dice_count > MAX_DICE:
+        raise DiceError(f"Too many dice! Maximum is {MAX_DICE:,}.")
+    _parse_cache.put(cache_key, parsed)
+    return parsed
+
+
+def _dice_term(match) -> DiceTerm:
+    count = int(match.group(2)) if match.group(2) else 1
+    sides = 100 if match.group(3) == '%' else int(match.group(3))
+    if count < 1:
+        raise DiceError("Roll at least one die")
+    if not 1 <= sides <= MAX_SIDES:
+        raise DiceError(f"Dice need between 1 and {MAX_SIDES:,} sides")
+
+    keep = None
+    explode = False
+    for modifier in MODIFIER_RE.finditer(match.group(4)):
+        if modifier.group(0) == '!':
+            explode = True
+            continue
+        kind, amount = modifier.group(1), int(modifier.group(2))
+        if kind in ('k', 'kh'):
+            keep = ('h', amount)
+        elif kind == 'kl':
+            keep = ('l', amount)
+        elif kind == 'dh':
+            keep = ('l', count - amount)
+        else:
+            keep = ('h', count - amount)
+        if not 0 < keep[1] <= count:
+            raise DiceError(f"Can't keep {keep[1]} of {count} dice")
+    if explode and sides == 1:
+        raise DiceError("A one-sided die can't explode")
+    return DiceTerm(count, sides, keep, explode)
+
+
+class DiceStats:
+    """Summary of an exact distribution"""
+
+    def __init__(self, distribution):
+        self.low, self.counts, self.denominator = distribution
+        self.high = self.low + len(self.counts) - 1
+        mean = Fraction(sum((self.low + i) * c for i, c in enumerate(self.counts)), self.denominator)
+        square = Fraction(sum((self.low + i) ** 2 * c for i, c in enumerate(self.counts)), self.denominator)
+        self.mean = mean
+        self.stddev = math.sqrt(square - mean * mean)
+        mode_index = max(range(len(self.counts)), key=self.counts.__getitem__)
+        self.mode = self.low + mode_index
+        self.median = self.percentile(Fraction(1, 2))
+
+    def probability(self, total: int) -> Fraction:
+        if not self.low <= total <= self.high:
+            return Fraction(0)
+        return Fraction(self.counts[total - self.low], self.denominator)
+
+    def percentile(self, fraction: Fraction) -> int:
+        """Smallest total with P(X <= total) >= fraction"""
+        target = fraction * self.denominator
+        running = 0
+        for i, count in enumerate(self.counts):
+            running += count
+            if running >= target:
+                return self.low + i
+        return self.high
+
+    def buckets(self, rows: int = 12) -> List[Tuple[str, float]]:
+        """(label, probability) rows; long tails under 0.1% are trimmed"""
+        low = self.percentile(Fraction(1, 1000)) if len(self.counts) > rows * 4 else self.low
+        high = self.percentile(Fraction(999, 1000)) if len(self.counts) > rows * 4 else self.high
+        width = max(1, math.ceil((high - low + 1) / rows))
+        result = []
+        for start in range(low, high + 1, width):
+            end = min(start + width - 1, high)
+            weight = sum(self.counts[start - self.low:end - self.low + 1])
+            label = str(start) if start == end else f"{start}-{end}"
+            result.append((label, weight / self.denominator))
+        return result
+
+
+def stats(expression: str) -> DiceStats:
+    """Exact statistics for a dice expression"""
+    return DiceStats(parse(expression).distribution())
@@ -1,66 +1,240 @@
 import discord
 from discord.ext import commands, tasks
-import random
 import json
 import asyncio
-from datetime import datetime, timedelta
+import re
+import time
+from datetime import date, datetime, timedelta
+from contextlib import asynccontextmanager
 from typing import Dict, Optional
 
+import ledger
+from catalog import add_item, inventory_from_list, load_catalog, remove_item
+from effects import EFFECTS, LUCKY_CHARM, XP_BOOST, effect_engine
+from gateway import guild_members
+from leaderboards import COINS, SEASON, WINDOW_LABELS, RankIndex, leaderboards
+from ledger import EconomyLedger
+from pagination import RankedBoard, medal, rank_footer, send_leaderboard
+from quotas import FixedWindowQuota, epoch_day_of
+from rng import AliasTable, rng
+from serialization import get_serializer
+from storage import SnapshotError, quarantine_snapshot, read_snapshot, write_snapshot
+from transactions import KeyedLocks, Transaction
+
+DAILY_QUOTA = FixedWindowQuota('daily', limit=1)
+WORK_QUOTA = FixedWindowQuota('work', limit=5)
+GAMBLE_QUOTA = FixedWindowQuota('gamble', limit=5)
+EFFECT_DURATION = 3600
+MYSTERY_BOX_REWARDS = AliasTable({'coins': 1, 'xp': 1})
+
+# Lucky Charm scales gamble odds while it is active
+rng.add_modifier('luck', lambda user_id: effect_engine.multiplier(user_id, LUCKY_CHARM))
+
+def migrate_legacy_quotas(record: dict):
+    """Convert old date-string counters into (epoch_day, count) quota pairs"""
+    quotas = record.setdefault('quotas', {})
+    usage_date = record.pop('last_usage_date', None)
+    work_count = record.pop('work_count', 0)
+    gamble_count = record.pop('gamble_count', 0)
+    if usage_date:
+        day = epoch_day_of(date.fromisoformat(usage_date))
+        if work_count:
+            quotas.setdefault(WORK_QUOTA.name, [day, work_count])
+        if gamble_count:
+            quotas.setdefault(GAMBLE_QUOTA.name, [day, gamble_count])
+    last_daily = record.pop('last_daily', None)
+    if last_daily:
+        quotas.setdefault(DAILY_QUOTA.name, [epoch_day_of(datetime.fromisoformat(last_daily).date()), 1])
+
+def migrate_legacy_effects(record: dict):
+    """Convert old ISO "<effect>_until" fields into {effect: expires_epoch}"""
+    effects = record.setdefault('effects', {})
+    for effect in EFFECTS:
+        until = record.pop(f'{effect}_until', None)
+        if until:
+            expires = int((datetime.fromisoformat(until) - datetime(1970, 1, 1)).total_seconds())
+            if expires > time.time():
+                effects[effect] = expires
+
 class Economy(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.currency_name = "coins"
         self.currency_symbol = "🪙"
-        self.user_data = {}  # {user_id: {"balance": int, "last_daily": str, "inventory": []}}
-        self.shop_items = {
-            "role_color": {"name": "Custom Role Color", "price": 1000, "description": "Change your role color"},
-            "xp_boost": {"name": "XP Boost (1 hour)", "price": 500, "description": "2x XP for 1 hour"},
-            "lucky_charm": {"name": "Lucky Charm", "price": 200, "description": "Better gambling odds"},
-            "vip_badge": {"name": "VIP Badge", "price": 5000, "description": "Special VIP status"},
-            "mystery_box": {"name": "Mystery Box", "price": 100, "description": "Random rewards"}
-        }
+        self.user_data = {}  # {user_id: {"balance": int, "inventory": {item_id: count}, "effects": {name: expires_epoch}, "quotas": {...}}}
+        self.balances = RankIndex()  # kept in step with every committed transaction
+        self.catalog = load_catalog('shop_items.json')
+        storage_settings = getattr(bot, 'config', {}).get('storage_settings', {})
+        self.file_path = 'economy_data.json'
+        self.serializer = get_serializer(storage_settings.get('format', 'json'))
+        self.backup_generations = storage_settings.get('backup_generations', 3)
+        self.locks = KeyedLocks()
+        self.save_lock = asyncio.Lock()
+        self.dirty = False  # committed changes not in the snapshot yet
+        self.ledger = EconomyLedger('economy_ledger.db')
+        self.last_entry_id = 0
+
+    async def cog_load(self):
+        # Opening the ledger and replaying it can take a while; run it in a
+        # thread so the other cogs and the user store load meanwhile
+        await asyncio.to_thread(self.open_storage)
+        self.effect_expiry_task.start()
+        self.snapshot_task.start()
+
+    def open_storage(self):
+        self.ledger.open()
+        self.last_entry_id = self.ledger.last_id()
         self.load_economy_data()
 
+    def cog_unload(self):
+        self.effect_expiry_task.cancel()
+        self.snapshot_task.cancel()
+        self.ledger.close()
+
     def load_economy_data(self):
-        """Load economy data from file"""
+        """Load economy data from the newest valid generation on disk"""
         try:
-            with open('economy_data.json', 'r') as f:
-                self.user_data = json.load(f)
-        except FileNotFoundError:
-            self.user_data = {}
+            data, source = read_snapshot(self.file_path, self.backup_generations)
+        except SnapshotError as e:
+            moved_to = quarantine_snapshot(self.file_path)
+            print(f"Error: No valid economy data ({e}). Corrupt file kept at {moved_to}")
+            data, source = None, None
+
+        if source and source != self.file_path:
+            print(f"⚠️ {self.file_path} was unreadable, recovered economy data from {source}")
+        self.user_data = data if isinstance(data, dict) else {}
+        for record in self.user_data.values():
+            if 'quotas' not in record:
+                migrate_legacy_quotas(record)
+            if 'effects' not in record:
+                migrate_legacy_effects(record)
+            if isinstance(record.get('inventory'), list):
+                record['inventory'] = inventory_from_list(record['inventory'])
+
+        # The ledger is the durability log for balances: a clean snapshot only
+        # misses entries after its checkpoint, anything else is rebuilt fully
+        self.replay_ledger(self.ledger.get_checkpoint() if source == self.file_path else 0)
+
+        effect_engine.clear()
+        self.balances.clear()
+        for user_id, record in self.user_data.items():
+            effect_engine.sync_user(user_id, record.get('effects', {}))
+            self.balances.set(user_id, record.get('balance', 0))
+
+    def replay_ledger(self, after_id: int):
+        """Restore balances from ledger entries newer than after_id"""
+        balances = self.ledger.balances_after(after_id)
+        for user_id, balance in balances.items():
+            self.get_user_data(user_id)['balance'] = balance
+        if balances:
+            print(f"♻️ Restored {len(balances)} balance(s) from the economy ledger")
+            self.save_economy_data()
 
     def save_economy_data(self):
-        """Save economy data to file"""
-        with open('economy_data.json', 'w') as f:
-            json.dump(self.user_data, f, indent=2)
+        """Save economy data to file (atomic, keeps older generations)"""
+        checkpoint = self.last_entry_id
+        write_snapshot(self.file_path, self.serializer.dumps(self.user_data), self.backup_generations)
+        self.ledger.set_checkpoint(checkpoint)
+
+    def write_checkpointed_snapshot(self, data: bytes, checkpoint: int):
+        """Write an encoded snapshot and record the ledger entry it includes"""
+        write_snapshot(self.file_path, data, self.backup_generations)
+        self.ledger.set_checkpoint(checkpoint)
+
+    async def persist(self):
+        """Save economy data without blocking the event loop"""
+        async with self.save_lock:
+            # Encode on the loop so the snapshot reflects one consistent state
+            checkpoint = self.last_entry_id
+            data = self.serializer.dumps(self.user_data)
+            self.dirty = False
+            try:
+                await asyncio.to_thread(self.write_checkpointed_snapshot, data, checkpoint)
+            except Exception:
+                self.dirty = True
+                raise
+
+    async def append_ledger(self, rows: list):
+        """Write ledger rows (user_id, kind, amount, balance, counterparty, detail)"""
+        self.last_entry_id = await asyncio.to_thread(self.ledger.append, rows)
+
+    @asynccontextmanager
+    async def transaction(self, *user_ids: int):
+        """Lock users, stage changes to their records, then commit them
+
+        Use ``tx.record(user_id)`` for a working copy of a user's data and
+        ``tx.log(...)`` for its ledger entries. The changes are applied
+        together when the block exits normally and are discarded if it raises.
+        The ledger is written at once; the snapshot by ``snapshot_task``.
+        """
+        async with self.locks.acquire(*(str(user_id) for user_id in user_ids)):
+            tx = Transaction(lambda key: self.get_user_data(key))
+            yield tx
+            changed = tx.commit(self.user_data)
+            for key in changed:
+                effect_engine.sync_user(key, self.user_data[key].get('effects', {}))
+                self.balances.set(key, self.user_data[key].get('balance', 0))
+            if tx.entries:
+                await self.append_ledger([
+                    (key, kind, amount, self.user_data[key].get('balance', 0), counterparty, detail)
+                    for key, kind, amount, counterparty, detail in tx.entries
+                ])
+                for key, kind, amount, _, _ in tx.entries:
+                    if kind in ledger.EARNING_KINDS:
+                        leaderboards.record(COINS, key, amount)
+            if changed:
+                self.dirty = True
 
     def get_user_data(self, user_id: int) -> dict:
         """Get or create user data"""
         if str(user_id) not in self.user_data:
             self.user_data[str(user_id)] = {
                 "balance": 0,
-                "last_daily": None,
-                "inventory": [],
-                "xp_boost_until": None,
-                "work_count": 0,
-                "gamble_count": 0,
-                "last_usage_date": None
+                "inventory": {},
+                "effects": {},
+                "quotas": {}
             }
-        # Reset work/gamble counts if it's a new day
-        today = datetime.utcnow().date().isoformat()
-        if self.user_data[str(user_id)].get('last_usage_date') != today:
-            self.user_data[str(user_id)]['work_count'] = 0
-            self.user_data[str(user_id)]['gamble_count'] = 0
-            self.user_data[str(user_id)]['last_usage_date'] = today
         return self.user_data[str(user_id)]
 
+    def peek_user_data(self, user_id: int) -> dict:
+        """Read-only view of user data that never creates a record"""
+        return self.user_data.get(str(user_id)) or {"balance": 0, "inventory": {}, "effects": {}, "quotas": {}}
+
+    @tasks.loop(seconds=30)
+    async def snapshot_task(self):
+        """Write the snapshot once for all changes since the last one
+
+        A crash in between loses no balances: they are replayed from the
+        ledger entries after the snapshot's checkpoint.
+        """
+        if not self.dirty:
+            return
+        try:
+            await self.persist()
+        except Exception as e:
+            print(f"Error saving economy data: {e}")
+
+    @tasks.loop(minutes=1)
+    async def effect_expiry_task(self):
+        """Drop expired timed effects from the engine and the saved records"""
+        expired = effect_engine.purge()
+        if not expired:
+            return
+        now = time.time()
+        async with self.transaction(*{user_id for user_id, _ in expired}) as tx:
+            for user_id, effect in expired:
+                effects = tx.record(user_id).get('effects', {})
+                # Skip effects renewed while waiting for the lock
+                if effect in effects and effects[effect] <= now:
+                    del effects[effect]
+
     @commands.command(name='balance')
     async def check_balance(self, ctx, member: Optional[discord.Member] = None):
         """Check your or someone else's balance"""
         if member is None:
             member = ctx.author
         
-        user_data = self.get_user_data(member.id)
+        user_data = self.peek_user_data(member.id)
         
         embed = discord.Embed(
             title=f"{self.currency_symbol} Balance",
@@ -71,7 +245,7 @@ class Economy(commands.Cog):
         embed.add_field(name="Balance", value=f"{self.currency_symbol} {user_data['balance']:,}", inline=True)
         
         # Show inventory count
-        inventory_count = len(user_data.get('inventory', []))
+        inventory_count = sum(user_data.get('inventory', {}).values())
         embed.add_field(name="Inventory Items", value=str(inventory_count), inline=True)
         
         embed.set_thumbnail(url=member.display_avatar.url)
@@ -82,28 +256,20 @@ class Economy(commands.Cog):
     @commands.command(name='daily')
     async def daily_reward(self, ctx):
         """Claim daily reward"""
-        user_data = self.get_user_data(ctx.author.id)
-        
-        now = datetime.utcnow()
-        last_daily = user_data.get('last_daily')
-        
-        if last_daily:
-            last_daily = datetime.fromisoformat(last_daily)
-            time_diff = now - last_daily
-            
-            if time_diff.total_seconds() < 86400:  # 24 hours
-                remaining = timedelta(days=1) - time_diff
-                hours, remainder = divmod(remaining.seconds, 3600)
+        async with self.transaction(ctx.author.id) as tx:
+            user_data = tx.record(str(ctx.author.id))
+
+            if not DAILY_QUOTA.try_consume(user_data):
+                hours, remainder = divmod(DAILY_QUOTA.resets_in(), 3600)
                 minutes, _ = divmod(remainder, 60)
-                
+
                 await ctx.send(f"❌ You can claim daily reward again in {hours}h {minutes}m!")
                 return
-        
-        # Award daily reward
-        reward = random.randint(50, 200)
-        user_data['balance'] += reward
-        user_data['last_daily'] = now.isoformat()
-        self.save_economy_data()
+
+            # Award daily reward
+            reward = rng.randint(50, 200)
+            user_data['balance'] += reward
+            tx.log(str(ctx.author.id), ledger.DAILY, reward)
         
         embed = discord.Embed(
             title="🎁 Daily Reward Claimed!",
@@ -111,24 +277,25 @@ class Economy(commands.Cog):
             color=0x00ff00
         )
         embed.add_field(name="New Balance", value=f"{self.currency_symbol} {user_data['balance']:,}", inline=True)
-        embed.set_footer(text="Come back tomorrow for more rewards!")
+        embed.set_footer(text="Come back tomorrow (after 00:00 UTC) for more rewards!")
         
         await ctx.send(embed=embed)
 
     @commands.command(name='work')
     async def work(self, ctx):
         """Work to earn coins (5 times per day)"""
-        user_data = self.get_user_data(ctx.author.id)
-        if user_data['work_count'] >= 5:
-            await ctx.send("❌ You have reached your daily work limit (5 times per day). Come back tomorrow!")
-            return
-        amount = random.randint(20, 100)
-        user_data['balance'] += amount
-        user_data['work_count'] += 1
-        self.save_economy_data()
+        async with self.transaction(ctx.author.id) as tx:
+            user_data = tx.record(str(ctx.author.id))
+            if not WORK_QUOTA.try_consume(user_data):
+                await ctx.send("❌ You have reached your daily work limit (5 times per day). Come back tomorrow!")
+                return
+            amount = rng.randint(20, 100)
+            user_data['balance'] += amount
+            work_count = WORK_QUOTA.used(user_data)
+            tx.log(str(ctx.author.id), ledger.WORK, amount)
         embed = discord.Embed(
             title="💼 Work Complete!",
-            description=f"You earned {self.currency_symbol} **{amount:,}**! ({user_data['work_count']}/5 today)",
+            description=f"You earned {self.currency_symbol} **{amount:,}**! ({work_count}/{WORK_QUOTA.limit} today)",
             color=0x00ff00
         )
         embed.add_field(name="New Balance", value=f"{self.currency_symbol} {user_data['balance']:,}", inline=True)
@@ -137,32 +304,38 @@ class Economy(commands.Cog):
     @commands.command(name='gamble')
     async def gamble(self, ctx, amount: int):
         """Gamble coins (5 times per day)"""
-        user_data = self.get_user_data(ctx.author.id)
-        if user_data['gamble_count'] >= 5:
-            await ctx.send("❌ You have reached your daily gamble limit (5 times per day). Come back tomorrow!")
-            return
         if amount <= 0:
             await ctx.send("❌ Please enter a valid amount to gamble.")
             return
-        if user_data['balance'] < amount:
-            await ctx.send("❌ You don't have enough coins to gamble that amount.")
-            return
-        win = random.choice([True, False])
-        if win:
-            winnings = amount
-            user_data['balance'] += winnings
-            result = f"You won {self.currency_symbol} **{winnings:,}**!"
-        else:
-            user_data['balance'] -= amount
-            result = f"You lost {self.currency_symbol} **{amount:,}**. Better luck next time!"
-        user_data['gamble_count'] += 1
-        self.save_economy_data()
+        async with self.transaction(ctx.author.id) as tx:
+            user_data = tx.record(str(ctx.author.id))
+            if GAMBLE_QUOTA.remaining(user_data) <= 0:
+                await ctx.send("❌ You have reached your daily gamble limit (5 times per day). Come back tomorrow!")
+                return
+            if user_data['balance'] < amount:
+                await ctx.send("❌ You don't have enough coins to gamble that amount.")
+                return
+            GAMBLE_QUOTA.try_consume(user_data)
+            lucky = effect_engine.is_active(str(ctx.author.id), LUCKY_CHARM)
+            win = rng.chance(0.5, ctx.author.id, modifier='luck')
+            if win:
+                winnings = amount
+                user_data['balance'] += winnings
+                tx.log(str(ctx.author.id), ledger.GAMBLE_WIN, winnings)
+                result = f"You won {self.currency_symbol} **{winnings:,}**!"
+            else:
+                user_data['balance'] -= amount
+                tx.log(str(ctx.author.id), ledger.GAMBLE_LOSS, -amount)
+                result = f"You lost {self.currency_symbol} **{amount:,}**. Better luck next time!"
+            gamble_count = GAMBLE_QUOTA.used(user_data)
         embed = discord.Embed(
             title="🎲 Gamble Result",
-            description=f"{result} ({user_data['gamble_count']}/5 today)",
+            description=f"{result} ({gamble_count}/{GAMBLE_QUOTA.limit} today)",
             color=0x00ff00 if win else 0xff0000
         )
         embed.add_field(name="New Balance", value=f"{self.currency_symbol} {user_data['balance']:,}", inline=True)
+        if lucky:
+            embed.set_footer(text="🍀 Lucky Charm active")
         await ctx.send(embed=embed)
 
     @commands.command(name='shop')
@@ -174,7 +347,7 @@ class Economy(commands.Cog):
             color=0x00ff00
         )
         
-        for item_id, item in self.shop_items.items():
+        for item_id, item in self.catalog.items.items():
             embed.add_field(
                 name=f"{item['name']} - {self.currency_symbol} {item['price']:,}",
                 value=item['description'],
@@ -183,42 +356,39 @@ class Economy(commands.Cog):
         
         embed.add_field(
             name="How to buy",
-            value="Use `!buy <item_name>` to purchase items",
+            value="Use `!buy <item_name>` to purchase items (short names work, e.g. `!buy charm`)",
             inline=False
         )
         
         await ctx.send(embed=embed)
 
+    def item_not_found(self, item_name: str) -> str:
+        """Error message with the closest catalog matches"""
+        suggestions = self.catalog.suggest(item_name)
+        if suggestions:
+            names = ", ".join(f"**{self.catalog.name(item_id)}**" for item_id in suggestions)
+            return f"❌ Item not found! Did you mean: {names}?"
+        return "❌ Item not found! Use `!shop` to see available items."
+
     @commands.command(name='buy')
     async def buy_item(self, ctx, *, item_name: str):
         """Buy an item from the shop"""
-        user_data = self.get_user_data(ctx.author.id)
-        
-        # Find item
-        item = None
-        item_id = None
-        for iid, shop_item in self.shop_items.items():
-            if shop_item['name'].lower() == item_name.lower():
-                item = shop_item
-                item_id = iid
-                break
-        
-        if not item:
-            await ctx.send("❌ Item not found! Use `!shop` to see available items.")
-            return
-        
-        if user_data['balance'] < item['price']:
-            await ctx.send(f"❌ You don't have enough coins! You need {self.currency_symbol} {item['price']:,}")
+        item_id = self.catalog.resolve(item_name)
+        if item_id is None:
+            await ctx.send(self.item_not_found(item_name))
             return
+        item = self.catalog.get(item_id)
         
-        # Purchase item
-        user_data['balance'] -= item['price']
-        
-        if 'inventory' not in user_data:
-            user_data['inventory'] = []
-        
-        user_data['inventory'].append(item_id)
-        self.save_economy_data()
+        async with self.transaction(ctx.author.id) as tx:
+            user_data = tx.record(str(ctx.author.id))
+            if user_data['balance'] < item['price']:
+                await ctx.send(f"❌ You don't have enough coins! You need {self.currency_symbol} {item['price']:,}")
+                return
+
+            # Purchase item
+            user_data['balance'] -= item['price']
+            add_item(user_data.setdefault('inventory', {}), item_id)
+            tx.log(str(ctx.author.id), ledger.PURCHASE, -item['price'], detail=item_id)
         
         embed = discord.Embed(
             title="🛒 Purchase Successful!",
@@ -235,8 +405,11 @@ class Economy(commands.Cog):
         if member is None:
             member = ctx.author
         
-        user_data = self.get_user_data(member.id)
-        inventory = user_data.get('inventory', [])
+        user_data = self.peek_user_data(member.id)
+        inventory = user_data.get('inventory', {})
+        effects = effect_engine.describe(str(member.id))
+        if user_data.get('vip_badge', False):
+            effects.append("👑 **VIP Badge**: Permanent")
         
         if not inventory:
             embed = discord.Embed(
@@ -250,47 +423,12 @@ class Economy(commands.Cog):
                 description=f"**{member.name}**'s items:",
                 color=0x00ff00
             )
-            # --- Active Effects Section ---
-            effects = []
-            now = datetime.utcnow()
-            # XP Boost
-            xp_boost_until = user_data.get('xp_boost_until')
-            if xp_boost_until:
-                try:
-                    boost_end = datetime.fromisoformat(xp_boost_until)
-                    if boost_end > now:
-                        remaining = boost_end - now
-                        mins, secs = divmod(remaining.seconds, 60)
-                        hours, mins = divmod(mins, 60)
-                        effects.append(f"⚡ **XP Boost**: {hours}h {mins}m left")
-                except Exception:
-                    pass
-            # Lucky Charm
-            lucky_charm_until = user_data.get('lucky_charm_until')
-            if lucky_charm_until:
-                try:
-                    charm_end = datetime.fromisoformat(lucky_charm_until)
-                    if charm_end > now:
-                        remaining = charm_end - now
-                        mins, secs = divmod(remaining.seconds, 60)
-                        hours, mins = divmod(mins, 60)
-                        effects.append(f"🍀 **Lucky Charm**: {hours}h {mins}m left")
-                except Exception:
-                    pass
-            # VIP Badge
-            if user_data.get('vip_badge', False):
-                effects.append("👑 **VIP Badge**: Permanent")
-            if effects:
-                embed.add_field(name="Active Effects", value="\n".join(effects), inline=False)
             # --- Item List ---
-            # Count items
-            item_counts = {}
-            for item_id in inventory:
-                item_counts[item_id] = item_counts.get(item_id, 0) + 1
-            for item_id, count in item_counts.items():
-                if item_id in self.shop_items:
-                    item_name = self.shop_items[item_id]['name']
-                    embed.add_field(name=f"{item_name} x{count}", value="", inline=True)
+            for item_id, count in inventory.items():
+                if item_id in self.catalog:
+                    embed.add_field(name=f"{self.catalog.name(item_id)} x{count}", value="", inline=True)
+        if effects:
+            embed.add_field(name="Active Effects", value="\n".join(effects), inline=False)
         
         embed.set_thumbnail(url=member.display_avatar.url)
         embed.set_footer(text=f"Requested by {ctx.author.name}")
@@ -298,37 +436,42 @@ class Economy(commands.Cog):
         await ctx.send(embed=embed)
 
     @commands.command(name='richest')
-    async def economy_leaderboard(self, ctx):
-        """Show economy leaderboard"""
-        if not self.user_data:
+    async def economy_leaderboard(self, ctx, window: str = None, page: int = 1):
+        """Show economy leaderboard (balances, or coins earned this week, month or season)"""
+        if window and window.isdigit():
+            window, page = None, int(window)
+        if window:
+            await self.earnings_leaderboard(ctx, window.lower(), page)
+            return
+        if not len(self.balances):
             await ctx.send("No economy data yet!")
             return
-        
-        # Sort users by balance
-        sorted_users = sorted(
-            self.user_data.items(),
-            key=lambda x: x[1].get('balance', 0),
-            reverse=True
+
+        board = RankedBoard(
+            (COINS, None), f"🏆 {self.currency_symbol} Leaderboard", lambda: self.balances,
+            lambda rank, name, balance: f"{medal(rank)} **{rank}.** {name} • {self.currency_symbol} {balance:,}",
+            lambda user_id: rank_footer("Balances", self.balances.rank(str(user_id))),
+            0xffd700
         )
-        
-        embed = discord.Embed(
-            title=f"🏆 {self.currency_symbol} Leaderboard",
-            color=0xffd700
+        await send_leaderboard(ctx, board, page)
+
+    async def earnings_leaderboard(self, ctx, window: str, page: int = 1):
+        """Top earners over a rolling window or the current season"""
+        if window not in WINDOW_LABELS:
+            await ctx.send("❌ Choose `week`, `month` or `season` (or nothing for balances)!")
+            return
+        if not leaderboards.size(COINS, window):
+            await ctx.send("No coins earned in that period yet!")
+            return
+
+        label = f"{WINDOW_LABELS[window]} ({leaderboards.season_name()})" if window == SEASON else WINDOW_LABELS[window]
+        board = RankedBoard(
+            (COINS, window), f"🏆 {self.currency_symbol} Top Earners • {label}", lambda: leaderboards.index(COINS, window),
+            lambda rank, name, earned: f"{medal(rank)} **{rank}.** {name} • {self.currency_symbol} +{earned:,}",
+            lambda user_id: rank_footer("Daily, work, gamble wins and mystery boxes", leaderboards.rank(COINS, window, user_id)),
+            0xffd700
         )
-        
-        for i, (user_id, user_data) in enumerate(sorted_users[:10]):
-            user = self.bot.get_user(int(user_id))
-            name = user.name if user else f"User {user_id}"
-            balance = user_data.get('balance', 0)
-            
-            medal = "🥇" if i == 0 else "🥈" if i == 1 else "🥉" if i == 2 else "🏅"
-            embed.add_field(
-                name=f"{medal} {i+1}. {name}",
-                value=f"{self.currency_symbol} {balance:,}",
-                inline=False
-            )
-        
-        await ctx.send(embed=embed)
+        await send_leaderboard(ctx, board, page)
 
     @commands.command(name='transfer')
     async def transfer_coins(self, ctx, member: discord.Member, amount: int):
@@ -345,17 +488,19 @@ class Economy(commands.Cog):
             await ctx.send("❌ You can't transfer coins to yourself!")
             return
         
-        user_data = self.get_user_data(ctx.author.id)
-        target_data = self.get_user_data(member.id)
-        
-        if user_data['balance'] < amount:
-            await ctx.send("❌ You don't have enough coins!")
-            return
-        
-        # Transfer coins
-        user_data['balance'] -= amount
-        target_data['balance'] += amount
-        self.save_economy_data()
+        async with self.transaction(ctx.author.id, member.id) as tx:
+            user_data = tx.record(str(ctx.author.id))
+            target_data = tx.record(str(member.id))
+
+            if user_data['balance'] < amount:
+                await ctx.send("❌ You don't have enough coins!")
+                return
+
+            # Transfer coins
+            user_data['balance'] -= amount
+            target_data['balance'] += amount
+            tx.log(str(ctx.author.id), ledger.TRANSFER_OUT, -amount, counterparty=str(member.id))
+            tx.log(str(member.id), ledger.TRANSFER_IN, amount, counterparty=str(ctx.author.id))
         
         embed = discord.Embed(
             title="💸 Transfer Complete!",
@@ -371,62 +516,236 @@ class Economy(commands.Cog):
     @commands.has_permissions(administrator=True)
     async def reset_economy(self, ctx):
         """Reset all economy data (Admin only)"""
-        self.user_data = {}
-        self.save_economy_data()
+        # Waits for transactions in progress and holds new ones until done
+        async with self.locks.exclusive():
+            self.user_data = {}
+            self.balances.clear()
+            effect_engine.clear()
+            await leaderboards.reset(COINS)
+            await self.append_ledger([(ledger.ALL_USERS, ledger.RESET, 0, 0, str(ctx.author.id), None)])
+            await self.persist()
         await ctx.send("✅ All economy data has been reset!")
 
+    async def resolve_targets(self, ctx, targets) -> set:
+        """User ids for a mix of roles, "all"/"guild", mentions and raw ids"""
+        user_ids = set()
+        members = None  # fetched once, only if a role or everyone is targeted
+        for target in targets:
+            if target.lower() in ('all', 'guild', 'everyone'):
+                members = members or await guild_members(ctx.guild)
+                user_ids.update(str(m.id) for m in members if not m.bot)
+                continue
+            try:
+                role = await commands.RoleConverter().convert(ctx, target)
+                members = members or await guild_members(ctx.guild)
+                user_ids.update(str(m.id) for m in members if not m.bot and (role.is_default() or m.get_role(role.id)))
+                continue
+            except commands.BadArgument:
+                pass
+            match = re.fullmatch(r'<@!?(\d+)>|(\d{15,20})', target)
+            if not match:
+                raise commands.BadArgument(f"Unknown role or user: {target}")
+            user_ids.add(match.group(1) or match.group(2))
+        return user_ids
+
+    async def bulk_adjust(self, ctx, amount: int, targets, kind: str):
+        """Grant or deduct coins for many users in one transaction"""
+        if amount <= 0:
+            await ctx.send("❌ Please enter a positive amount!")
+            return
+        if not targets:
+            await ctx.send("❌ Give a role, `all`, or a list of users/IDs!")
+            return
+        try:
+            user_ids = await self.resolve_targets(ctx, targets)
+        except commands.BadArgument as e:
+            await ctx.send(f"❌ {e}")
+            return
+        if kind == ledger.ADMIN_DEDUCT:
+            # Nothing to take from users without an account
+            user_ids = {user_id for user_id in user_ids if user_id in self.user_data}
+        if not user_ids:
+            await ctx.send("❌ No users matched!")
+            return
+
+        start = time.perf_counter()
+        total = 0
+        affected = 0
+        partial = 0
+        async with self.transaction(*user_ids) as tx:
+            for user_id in user_ids:
+                record = tx.record(user_id)
+                change = amount if kind == ledger.ADMIN_GRANT else -min(amount, record['balance'])
+                if change == 0:
+                    continue
+                if abs(change) < amount:
+                    partial += 1
+                record['balance'] += change
+                total += change
+                affected += 1
+                tx.log(user_id, kind, change, counterparty=str(ctx.author.id))
+        elapsed = time.perf_counter() - start
+
+        embed = discord.Embed(
+            title="🛠️ Bulk Grant Complete" if kind == ledger.ADMIN_GRANT else "🛠️ Bulk Deduct Complete",
+            description=f"{self.currency_symbol} **{total:+,}** across **{affected:,}** user(s)",
+            color=0x00ff00 if kind == ledger.ADMIN_GRANT else 0xff9900
+        )
+        embed.add_field(name="Matched", value=f"{len(user_ids):,}", inline=True)
+        if partial:
+            embed.add_field(name="Deducted Partially", value=f"{partial:,} (balance too low)", inline=True)
+        embed.add_field(
+            name="Throughput",
+            value=f"{elapsed * 1000:.1f} ms ({len(user_ids) / elapsed if elapsed else 0:,.0f} users/s)",
+            inline=True
+        )
+        embed.set_footer(text=f"Ledger entries up to #{self.last_entry_id}")
+        await ctx.send(embed=embed)
+
+    @commands.command(name='grant')
+    @commands.guild_only()
+    @commands.has_permissions(administrator=True)
+    async def bulk_grant(self, ctx, amount: int, *targets: str):
+        """Give coins to a role, everyone (all) or listed users (Admin only)"""
+        await self.bulk_adjust(ctx, amount, targets, ledger.ADMIN_GRANT)
+
+    @commands.command(name='deduct')
+    @commands.guild_only()
+    @commands.has_permissions(administrator=True)
+    async def bulk_deduct(self, ctx, amount: int, *targets: str):
+        """Take coins from a role, everyone (all) or listed users (Admin only)"""
+        await self.bulk_adjust(ctx, amount, targets, ledger.ADMIN_DEDUCT)
+
+    def format_entry(self, entry, show_user: bool = False) -> str:
+        """One ledger entry as a single embed line"""
+        label = ledger.KIND_LABELS.get(entry.kind, entry.kind)
+        line = f"`#{entry.id}` <t:{entry.ts}:R> {label} **{entry.amount:+,}** → {self.currency_symbol} {entry.balance:,}"
+        if show_user:
+            line = f"<@{entry.user_id}> " + line if entry.user_id != ledger.ALL_USERS else "**everyone** " + line
+        if entry.counterparty and entry.kind in (ledger.TRANSFER_IN, ledger.TRANSFER_OUT):
+            line += f" (<@{entry.counterparty}>)"
+        return line
+
+    @commands.command(name='history')
+    async def show_history(self, ctx, member: Optional[discord.Member] = None):
+        """Show recent economy transactions"""
+        if member is None:
+            member = ctx.author
+
+        entries = self.ledger.history(str(member.id), limit=10)
+        embed = discord.Embed(
+            title="📜 Transaction History",
+            description="\n".join(self.format_entry(entry) for entry in entries) or "No transactions yet!",
+            color=0x0099ff
+        )
+        embed.set_author(name=member.name, icon_url=member.display_avatar.url)
+        embed.set_footer(text="Last 10 transactions")
+        await ctx.send(embed=embed)
+
+    @commands.command(name='earnings')
+    async def show_earnings(self, ctx, period: str = "today"):
+        """Show coins earned and spent (today, week, month or all)"""
+        now = datetime.utcnow()
+        periods = {
+            "today": datetime(now.year, now.month, now.day),
+            "week": now - timedelta(days=7),
+            "month": now - timedelta(days=30),
+            "all": datetime(1970, 1, 1)
+        }
+        period = period.lower()
+        if period not in periods:
+            await ctx.send("❌ Period must be one of: today, week, month, all")
+            return
+
+        since = int((periods[period] - datetime(1970, 1, 1)).total_seconds())
+        totals = self.ledger.totals_since(str(ctx.author.id), since)
+
+        embed = discord.Embed(
+            title=f"📈 Earnings ({period})",
+            color=0x00ff00
+        )
+        if not totals:
+            embed.description = "No transactions in this period."
+        else:
+            for kind, total in sorted(totals.items(), key=lambda x: x[1], reverse=True):
+                embed.add_field(name=ledger.KIND_LABELS.get(kind, kind), value=f"{self.currency_symbol} {total:+,}", inline=True)
+            embed.description = f"Net: {self.currency_symbol} **{sum(totals.values()):+,}**"
+        embed.set_footer(text=f"Requested by {ctx.author.name}")
+        await ctx.send(embed=embed)
+
+    @commands.command(name='audit')
+    @commands.has_permissions(administrator=True)
+    async def audit_ledger(self, ctx, member: Optional[discord.Member] = None, kind: Optional[str] = None):
+        """Show recent ledger entries, optionally for one user or kind (Admin only)"""
+        if kind and kind not in ledger.KIND_LABELS:
+            await ctx.send(f"❌ Unknown kind! Use one of: {', '.join(ledger.KIND_LABELS)}")
+            return
+
+        if member:
+            entries = self.ledger.history(str(member.id), limit=15)
+        else:
+            entries = self.ledger.recent(limit=15, kind=kind)
+
+        embed = discord.Embed(
+            title="🔍 Economy Audit Log",
+            description="\n".join(self.format_entry(entry, show_user=True) for entry in entries) or "No entries found.",
+            color=0xff9900
+        )
+        embed.set_footer(text=f"Latest entry: #{self.last_entry_id}")
+        await ctx.send(embed=embed)
+
+    def extend_effect(self, user_data: dict, effect: str) -> int:
+        """Start an effect, or add another hour to one still running"""
+        effects = user_data.setdefault('effects', {})
+        expires = max(effects.get(effect, 0), int(time.time())) + EFFECT_DURATION
+        effects[effect] = expires
+        return expires
+
     @commands.command(name='use')
     async def use_item(self, ctx, *, item_name: str):
         """Use an item from your inventory"""
-        user_data = self.get_user_data(ctx.author.id)
-        inventory = user_data.get('inventory', [])
-        item_id = None
-        item = None
-        for iid, shop_item in self.shop_items.items():
-            if shop_item['name'].lower() == item_name.lower():
-                item_id = iid
-                item = shop_item
-                break
-        if not item_id or item_id not in inventory:
-            await ctx.send(f"❌ You do not have '{item_name}' in your inventory.")
-            return
+        item_id = self.catalog.resolve(item_name)
+        async with self.transaction(ctx.author.id) as tx:
+            user_data = tx.record(str(ctx.author.id))
+            inventory = user_data.setdefault('inventory', {})
+            if not item_id or not inventory.get(item_id):
+                await ctx.send(f"❌ You do not have '{item_name}' in your inventory.")
+                return
 
-        # Handle item effects
-        if item_id == 'mystery_box':
-            reward_type = random.choice(['coins', 'xp'])
-            if reward_type == 'coins':
-                amount = random.randint(100, 500)
-                user_data['balance'] += amount
-                reward_msg = f"You opened a Mystery Box and received 🪙 **{amount} coins**!"
+            # Handle item effects
+            if item_id == 'mystery_box':
+                reward_type = rng.weighted(MYSTERY_BOX_REWARDS)
+                if reward_type == 'coins':
+                    amount = rng.randint(100, 500)
+                    user_data['balance'] += amount
+                    tx.log(str(ctx.author.id), ledger.MYSTERY_BOX, amount)
+                    reward_msg = f"You opened a Mystery Box and received 🪙 **{amount} coins**!"
+                else:
+                    amount = rng.randint(50, 200)
+                    if 'xp' not in user_data:
+                        user_data['xp'] = 0
+                    user_data['xp'] += amount
+                    reward_msg = f"You opened a Mystery Box and received ⭐ **{amount} XP**!"
+                remove_item(inventory, item_id)
+                embed = discord.Embed(title="🎁 Mystery Box Opened!", description=reward_msg, color=0x00ff00)
+            elif item_id == 'xp_boost':
+                expires = self.extend_effect(user_data, XP_BOOST)
+                remove_item(inventory, item_id)
+                embed = discord.Embed(title="⚡ XP Boost Activated!", description=f"You will earn double XP until <t:{expires}:t>!", color=0x00ff00)
+            elif item_id == 'lucky_charm':
+                expires = self.extend_effect(user_data, LUCKY_CHARM)
+                remove_item(inventory, item_id)
+                embed = discord.Embed(title="🍀 Lucky Charm Activated!", description=f"You have better gambling odds until <t:{expires}:t>!", color=0x00ff00)
+            elif item_id == 'vip_badge':
+                if user_data.get('vip_badge', False):
+                    embed = discord.Embed(title="👑 VIP Badge", description="You already have the VIP Badge!", color=0xffd700)
+                else:
+                    user_data['vip_badge'] = True
+                    embed = discord.Embed(title="👑 VIP Badge Activated!", description="You are now a VIP! Enjoy your special status.", color=0xffd700)
+            elif item_id == 'role_color':
+                embed = discord.Embed(title="🎨 Custom Role Color", description="Feature coming soon! Contact an admin to claim your color.", color=0x0099ff)
             else:
-                amount = random.randint(50, 200)
-                if 'xp' not in user_data:
-                    user_data['xp'] = 0
-                user_data['xp'] += amount
-                reward_msg = f"You opened a Mystery Box and received ⭐ **{amount} XP**!"
-            inventory.remove(item_id)
-            embed = discord.Embed(title="🎁 Mystery Box Opened!", description=reward_msg, color=0x00ff00)
-        elif item_id == 'xp_boost':
-            now = datetime.utcnow()
-            user_data['xp_boost_until'] = (now + timedelta(hours=1)).isoformat()
-            inventory.remove(item_id)
-            embed = discord.Embed(title="⚡ XP Boost Activated!", description="You will earn double XP for 1 hour!", color=0x00ff00)
-        elif item_id == 'lucky_charm':
-            now = datetime.utcnow()
-            user_data['lucky_charm_until'] = (now + timedelta(hours=1)).isoformat()
-            inventory.remove(item_id)
-            embed = discord.Embed(title="🍀 Lucky Charm Activated!", description="You have better gambling odds for 1 hour!", color=0x00ff00)
-        elif item_id == 'vip_badge':
-            if user_data.get('vip_badge', False):
-                embed = discord.Embed(title="👑 VIP Badge", description="You already have the VIP Badge!", color=0xffd700)
-            else:
-                user_data['vip_badge'] = True
-                embed = discord.Embed(title="👑 VIP Badge Activated!", description="You are now a VIP! Enjoy your special status.", color=0xffd700)
-        elif item_id == 'role_color':
-            embed = discord.Embed(title="🎨 Custom Role Color", description="Feature coming soon! Contact an admin to claim your color.", color=0x0099ff)
-        else:
-            embed = discord.Embed(title="❓ Unknown Item", description="This item cannot be used.", color=0xff0000)
-        self.save_economy_data()
+                embed = discord.Embed(title="❓ Unknown Item", description="This item cannot be used.", color=0xff0000)
         await ctx.send(embed=embed)
 
 async def setup(bot):
@@ -0,0 +1,100 @@
+import heapq
+import time
+from typing import Dict, List, Optional, Tuple
+
+XP_BOOST = 'xp_boost'
+LUCKY_CHARM = 'lucky_charm'
+
+EFFECTS = {
+    XP_BOOST: {"label": "⚡ **XP Boost**", "multiplier": 2.0},
+    LUCKY_CHARM: {"label": "🍀 **Lucky Charm**", "multiplier": 1.2}
+}
+
+
+class EffectEngine:
+    """Timed per-user effects with O(1) "is active" lookups
+
+    ``expiry`` maps user -> {effect: expires_epoch} for lookups, and a heap
+    of (expires_epoch, user, effect) lets ``purge`` find expired effects
+    without scanning every user. Heap entries superseded by an extension
+    are skipped lazily when they surface.
+    """
+
+    def __init__(self):
+        self.expiry = {}  # {user_id: {effect: expires_epoch}}
+        self._heap = []
+
+    def __len__(self) -> int:
+        return sum(len(effects) for effects in self.expiry.values())
+
+    def clear(self):
+        self.expiry.clear()
+        self._heap.clear()
+
+    def set(self, user_id: str, effect: str, expires: int):
+        """Record that an effect lasts until a unix timestamp"""
+        self.expiry.setdefault(user_id, {})[effect] = expires
+        heapq.heappush(self._heap, (expires, user_id, effect))
+
+    def sync_user(self, user_id: str, effects: Dict[str, int]):
+        """Replace a user's effects with the ones stored in their record"""
+        current = self.expiry.get(user_id, {})
+        for effect in list(current):
+            if effect not in effects:
+                del current[effect]
+        for effect, expires in effects.items():
+            if current.get(effect) != expires:
+                self.set(user_id, effect, expires)
+        if not self.expiry.get(user_id):
+            self.expiry.pop(user_id, None)
+
+    def expires_at(self, user_id: str, effect: str, now: Optional[float] = None) -> Optional[int]:
+        """Expiry timestamp of an active effect, or None"""
+        expires = self.expiry.get(user_id, {}).get(effect)
+        if expires is None or expires <= (time.time() if now is None else now):
+            return None
+        return expires
+
+    def is_active(self, user_id: str, effect: str, now: Optional[float] = None) -> bool:
+        return self.expires_at(user_id, effect, now) is not None
+
+    def remaining(self, user_id: str, effect: str, now: Optional[float] = None) -> int:
+        """Seconds left on an effect (0 when inactive)"""
+        now = time.time() if now is None else now
+        expires = self.expires_at(user_id, effect, now)
+        return int(expires - now) if expires else 0
+
+    def multiplier(self, user_id: str, effect: str, now: Optional[float] = None) -> float:
+        """The effect's multiplier while active, otherwise 1"""
+        if self.is_active(user_id, effect, now):
+            return EFFECTS[effect]["multiplier"]
+        return 1.0
+
+    def describe(self, user_id: str, now: Optional[float] = None) -> List[str]:
+        """Human readable list of a user's active effects"""
+        now = time.time() if now is None else now
+        lines = []
+        for effect, expires in self.expiry.get(user_id, {}).items():
+            if expires > now and effect in EFFECTS:
+                hours, remainder = divmod(int(expires - now), 3600)
+                lines.append(f"{EFFECTS[effect]['label']}: {hours}h {remainder // 60}m left")
+        return lines
+
+    def purge(self, now: Optional[float] = None) -> List[Tuple[str, str]]:
+        """Remove every expired effect and return the (user, effect) pairs"""
+        now = time.time() if now is None else now
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            expires, user_id, effect = heapq.heappop(self._heap)
+            effects = self.expiry.get(user_id)
+            if not effects or effects.get(effect) != expires:
+                continue  # superseded by a later extension or already removed
+            del effects[effect]
+            if not effects:
+                del self.expiry[user_id]
+            expired.append((user_id, effect))
+        return expired
+
+
+# Shared between the economy cog (which owns the data) and the XP paths
+effect_engine = EffectEngine()
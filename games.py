@@ -1,8 +1,13 @@
+import asyncio
 import random
 import discord
 from discord.ext import commands
 from typing import Optional
 
+from dice import EXPLODE_LIMIT, DiceError, DiceStats, DiceTerm, parse
+from quotas import TokenBucket, rate_limit, spend_quota
+from rng import rng
+
 class Games(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -43,60 +48,72 @@ class Games(commands.Cog):
         ]
 
     @commands.command(name='roll')
-    async def roll_dice(self, ctx, dice: str = "1d6"):
-        """Roll dice in NdN format (e.g., !roll 2d20)"""
+    @rate_limit('roll', TokenBucket(capacity=5, rate=1 / 3))
+    async def roll_dice(self, ctx, *, dice: str = "1d6"):
+        """Roll dice (e.g., !roll 2d20, !roll 4d6kh3+2, !roll 3d6!)"""
         try:
-            if 'd' not in dice.lower():
-                # Single number roll
-                sides = int(dice)
-                result = random.randint(1, sides)
-                embed = discord.Embed(
-                    title="🎲 Dice Roll",
-                    description=f"You rolled a **{result}** on a d{sides}!",
-                    color=0x00ff00
-                )
-                embed.set_footer(text=f"Requested by {ctx.author.name}")
-                await ctx.send(embed=embed)
-                return
-
-            # Parse NdN format
-            parts = dice.lower().split('d')
-            if len(parts) != 2:
-                await ctx.send("❌ Invalid format! Use NdN (e.g., 2d20) or just a number (e.g., 20)")
-                return
-
-            num_dice = int(parts[0])
-            sides = int(parts[1])
-
-            if num_dice > 100:
-                await ctx.send("❌ Too many dice! Maximum is 100.")
-                return
+            expression = parse(dice)
+        except DiceError as e:
+            await ctx.send(f"❌ {e} Try e.g. `2d20`, `4d6kh3+2` or `3d6!`")
+            return
+        spend_quota(ctx)
 
-            if sides > 1000:
-                await ctx.send("❌ Too many sides! Maximum is 1000.")
-                return
+        total, details = expression.roll(rng)
+        embed = discord.Embed(
+            title="🎲 Dice Roll",
+            description=f"You rolled **{expression}**!",
+            color=0x00ff00
+        )
+        if len(details) > 1 or expression.dice_count > 1:
+            # Per-term breakdown; dropped dice are struck through
+            for label, subtotal, listing in details[:24]:
+                value = f"{listing} → **{subtotal:,}**" if listing else f"**{subtotal:,}**"
+                embed.add_field(name=label, value=value, inline=False)
+        embed.add_field(name="Total", value=f"**{total:,}**", inline=True)
 
-            # Roll the dice
-            results = [random.randint(1, sides) for _ in range(num_dice)]
-            total = sum(results)
+        embed.set_footer(text=f"Requested by {ctx.author.name}")
+        await ctx.send(embed=embed)
 
-            embed = discord.Embed(
-                title="🎲 Dice Roll",
-                description=f"You rolled **{num_dice}d{sides}**!",
-                color=0x00ff00
-            )
-            
-            if num_dice == 1:
-                embed.add_field(name="Result", value=f"**{total}**", inline=True)
-            else:
-                embed.add_field(name="Individual Rolls", value=f"`{', '.join(map(str, results))}`", inline=False)
-                embed.add_field(name="Total", value=f"**{total}**", inline=True)
+    @commands.command(name='dicestats')
+    @rate_limit('dicestats', TokenBucket(capacity=3, rate=1 / 10))
+    async def dice_stats(self, ctx, *, dice: str):
+        """Exact probability distribution of a dice expression"""
+        try:
+            # Parsed on the loop (the parse cache is not thread-safe); only the
+            # math runs in the thread
+            expression = parse(dice)
+            result = await asyncio.to_thread(lambda: DiceStats(expression.distribution()))
+        except DiceError as e:
+            await ctx.send(f"❌ {e}")
+            return
+        spend_quota(ctx)
 
-            embed.set_footer(text=f"Requested by {ctx.author.name}")
-            await ctx.send(embed=embed)
+        embed = discord.Embed(
+            title="📊 Dice Statistics",
+            description=f"Exact distribution of **{expression}**",
+            color=0x0099ff
+        )
+        embed.add_field(name="Range", value=f"{result.low:,} – {result.high:,}", inline=True)
+        embed.add_field(name="Mean", value=f"{float(result.mean):,.2f}", inline=True)
+        embed.add_field(name="Std Dev", value=f"{result.stddev:,.2f}", inline=True)
+        embed.add_field(name="Median", value=f"{result.median:,}", inline=True)
+        embed.add_field(
+            name="Most Likely",
+            value=f"{result.mode:,} ({float(result.probability(result.mode)):.2%})",
+            inline=True
+        )
 
-        except ValueError:
-            await ctx.send("❌ Invalid format! Use NdN (e.g., 2d20) or just a number (e.g., 20)")
+        rows = result.buckets()
+        peak = max(probability for _, probability in rows) or 1
+        width = max(len(label) for label, _ in rows)
+        chart = "\n".join(
+            f"{label:>{width}} {'█' * round(probability / peak * 20):<20} {probability:6.2%}"
+            for label, probability in rows
+        )
+        embed.add_field(name="Distribution", value=f"```\n{chart}\n```", inline=False)
+        if any(term.explode for _, term in expression.terms if isinstance(term, DiceTerm)):
+            embed.set_footer(text=f"Exploding dice re-roll at most {EXPLODE_LIMIT} times")
+        await ctx.send(embed=embed)
 
     @commands.command(name='flip')
     async def coin_flip(self, ctx, flips: int = 1):
@@ -0,0 +1,94 @@
+from typing import List, Optional
+
+import discord
+
+from cache import LRUCache
+
+# Member cache profiles (gateway_settings.cache_profile)
+FULL = 'full'  # every member, chunked at startup
+ACTIVE = 'active'  # members in voice, who joined since startup or were recently active
+MINIMAL = 'minimal'  # members in voice only; everything else fetched on demand
+PROFILES = (FULL, ACTIVE, MINIMAL)
+
+
+def client_options(profile: str, presences: bool = False) -> dict:
+    """Intents and member cache settings for ``commands.Bot`` under a profile
+
+    Every profile keeps the members intent (join/leave events and member
+    queries need it) and caches members in voice, which voice tracking reads
+    every minute. Only ``full`` asks Discord for every member at startup.
+    ``presences`` adds the (privileged) presence intent for online counts.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown cache profile '{profile}' (choose {', '.join(PROFILES)})")
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.members = True
+    intents.guilds = True
+    intents.voice_states = True
+    intents.presences = presences
+    if profile == FULL:
+        flags = discord.MemberCacheFlags.all()
+    elif profile == ACTIVE:
+        flags = discord.MemberCacheFlags(voice=True, joined=True)
+    else:
+        flags = discord.MemberCacheFlags(voice=True, joined=False)
+    return {'intents': intents, 'member_cache_flags': flags, 'chunk_guilds_at_startup': profile == FULL}
+
+
+async def guild_members(guild: discord.Guild) -> List[discord.Member]:
+    """Every member of a guild, requested from Discord when the cache is partial
+
+    The requested list is returned without being cached, so a one-off bulk
+    command does not leave the whole guild in memory.
+    """
+    if guild.chunked:
+        return list(guild.members)
+    return await guild.chunk(cache=False)
+
+
+class RecentMembers:
+    """The most recently active members (message authors, fetched members)
+
+    Kept in a bounded LRU next to discord.py's member cache rather than in
+    it, so the ``active`` profile has active members at hand without caching
+    the whole guild. Authors are refreshed with every message; a capacity of
+    0 (the other profiles) keeps nothing.
+    """
+
+    def __init__(self, capacity: int = 0):
+        self.configure(capacity)
+
+    def configure(self, capacity: int):
+        self.cache = LRUCache(capacity) if capacity > 0 else None
+
+    def __len__(self) -> int:
+        return len(self.cache) if self.cache else 0
+
+    def remember(self, member):
+        if self.cache is not None and isinstance(member, discord.Member):
+            self.cache.put((member.guild.id, member.id), member)
+
+    def get(self, guild_id: int, user_id: int) -> Optional[discord.Member]:
+        return self.cache.get((guild_id, user_id)) if self.cache else None
+
+    def forget(self, guild_id: int, user_id: int):
+        if self.cache is not None:
+            self.cache.pop((guild_id, user_id))
+
+
+# Configured from gateway_settings in bot.py
+recent_members = RecentMembers()
+
+
+async def get_or_fetch_member(guild: discord.Guild, user_id: int):
+    """A member from the caches, or from Discord when not cached (None if gone)"""
+    member = guild.get_member(user_id) or recent_members.get(guild.id, user_id)
+    if member is not None:
+        return member
+    try:
+        member = await guild.fetch_member(user_id)
+    except discord.NotFound:
+        return None
+    recent_members.remember(member)
+    return member
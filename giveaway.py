@@ -5,15 +5,43 @@ import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
+from serialization import get_serializer
+from storage import SnapshotError, read_snapshot, write_snapshot
+
 class Giveaway(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.active_giveaways = {}  # {message_id: giveaway_data}
+        self.file_path = 'giveaways.json'
+        self.serializer = get_serializer('json')
+
+    async def cog_load(self):
+        # Giveaways still running when the bot stopped carry on after a restart
+        try:
+            data, _ = await asyncio.to_thread(read_snapshot, self.file_path, 1)
+        except SnapshotError as e:
+            print(f"Error loading giveaways: {e}")
+            data = None
+        for giveaway_data in data or []:
+            giveaway_data['end_time'] = datetime.fromisoformat(giveaway_data['end_time'])
+            self.active_giveaways[giveaway_data['message_id']] = giveaway_data
+        if self.active_giveaways:
+            print(f"🎉 Resumed {len(self.active_giveaways)} giveaway(s)")
         self.giveaway_checker.start()
 
     def cog_unload(self):
         self.giveaway_checker.cancel()
 
+    async def save_giveaways(self) -> int:
+        """Write the running giveaways (on start, end and shutdown); returns how many"""
+        giveaways = [{**giveaway_data, 'end_time': giveaway_data['end_time'].isoformat()}
+                     for giveaway_data in self.active_giveaways.values()]
+        try:
+            await asyncio.to_thread(write_snapshot, self.file_path, self.serializer.dumps(giveaways), 1)
+        except OSError as e:
+            print(f"Error saving giveaways: {e}")
+        return len(giveaways)
+
     @commands.command(name='giveaway')
     @commands.has_permissions(manage_messages=True)
     async def start_giveaway(self, ctx, time: str, *, prize: str):
@@ -56,6 +84,7 @@ class Giveaway(commands.Cog):
             "host_id": ctx.author.id,
             "message_id": message.id
         }
+        await self.save_giveaways()
 
         await ctx.send(f"✅ Giveaway started! Ends in {self.format_time(time_seconds)}")
 
@@ -118,7 +147,6 @@ class Giveaway(commands.Cog):
 
             if not reaction:
                 await channel.send(f"❌ No one entered the giveaway for **{giveaway_data['prize']}**!")
-                del self.active_giveaways[message_id]
                 return
 
             # Get users who reacted
@@ -129,7 +157,6 @@ class Giveaway(commands.Cog):
 
             if not participants:
                 await channel.send(f"❌ No valid participants for **{giveaway_data['prize']}**!")
-                del self.active_giveaways[message_id]
                 return
 
             # Select winner
@@ -157,9 +184,9 @@ class Giveaway(commands.Cog):
         except Exception as e:
             print(f"Error ending giveaway: {e}")
         finally:
-            # Clean up
-            if message_id in self.active_giveaways:
-                del self.active_giveaways[message_id]
+            # Clean up (the one place an ended giveaway is removed and saved)
+            if self.active_giveaways.pop(message_id, None) is not None:
+                await self.save_giveaways()
 
     @commands.command(name='giveawaylist')
     async def list_giveaways(self, ctx):
@@ -0,0 +1,136 @@
+import time
+from typing import Dict, Optional
+
+import discord
+
+ACTIVE_STATUSES = (discord.Status.online, discord.Status.idle, discord.Status.dnd)
+APPROXIMATE_TTL = 600  # seconds to reuse Discord's approximate counts
+
+
+class GuildCounters:
+    """Counts shown by !serverinfo for one guild, kept up to date by events"""
+    __slots__ = ('statuses', 'text_channels', 'voice_channels', 'roles',
+                 'presences', 'approximate', 'approximate_at')
+
+    def __init__(self):
+        self.statuses = dict.fromkeys(ACTIVE_STATUSES, 0)  # offline is the rest of member_count
+        self.text_channels = 0
+        self.voice_channels = 0
+        self.roles = 0
+        self.presences = False  # statuses are exact (presence intent and a full member cache)
+        self.approximate = None  # (members, online) from Discord when statuses are not tracked
+        self.approximate_at = 0.0
+
+    def online(self) -> int:
+        return sum(self.statuses.values())
+
+    def to_dict(self, member_count: Optional[int]) -> dict:
+        statuses = {str(status): count for status, count in self.statuses.items()}
+        if member_count is not None and self.presences:
+            statuses['offline'] = member_count - self.online()
+        return {
+            'members': member_count,
+            'statuses': statuses if self.presences else None,
+            'text_channels': self.text_channels,
+            'voice_channels': self.voice_channels,
+            'roles': self.roles
+        }
+
+
+def channel_kind(channel) -> Optional[str]:
+    if isinstance(channel, discord.TextChannel):
+        return 'text_channels'
+    if isinstance(channel, discord.VoiceChannel):
+        return 'voice_channels'
+    return None
+
+
+class GuildStats:
+    """Per-guild member status, channel and role counters
+
+    Each guild is counted once (when it becomes available, or on first
+    use); after that leaves, presence changes and channel and role events
+    adjust the counts, so reading them never scans the guild.
+    Statuses are only tracked when presences arrive for every member (the
+    presence intent with the full cache profile); otherwise Discord's
+    approximate online count is fetched and reused for a while.
+    """
+
+    def __init__(self):
+        self.guilds = {}  # {guild_id: GuildCounters}
+
+    def rebuild(self, guild: discord.Guild, presences: bool = False) -> GuildCounters:
+        counters = GuildCounters()
+        counters.presences = presences and guild.chunked
+        if counters.presences:
+            for member in guild.members:
+                if member.status in counters.statuses:
+                    counters.statuses[member.status] += 1
+        for channel in guild.channels:
+            kind = channel_kind(channel)
+            if kind:
+                setattr(counters, kind, getattr(counters, kind) + 1)
+        counters.roles = len(guild.roles)
+        self.guilds[guild.id] = counters
+        return counters
+
+    def get(self, guild: discord.Guild, presences: bool = False) -> GuildCounters:
+        counters = self.guilds.get(guild.id)
+        return counters if counters is not None else self.rebuild(guild, presences)
+
+    def forget(self, guild_id: int):
+        self.guilds.pop(guild_id, None)
+
+    def member_left(self, guild_id: int, user):
+        """``user`` is the cached Member when there was one, otherwise a User"""
+        counters = self.guilds.get(guild_id)
+        status = getattr(user, 'status', None)
+        if counters is not None and counters.presences and status in counters.statuses:
+            counters.statuses[status] = max(0, counters.statuses[status] - 1)
+
+    def presence_changed(self, before: discord.Member, after: discord.Member):
+        counters = self.guilds.get(after.guild.id)
+        if counters is None or not counters.presences or before.status == after.status:
+            return
+        if before.status in counters.statuses:
+            counters.statuses[before.status] = max(0, counters.statuses[before.status] - 1)
+        if after.status in counters.statuses:
+            counters.statuses[after.status] += 1
+
+    def channel_changed(self, channel, delta: int):
+        counters = self.guilds.get(channel.guild.id)
+        kind = channel_kind(channel)
+        if counters is not None and kind:
+            setattr(counters, kind, max(0, getattr(counters, kind) + delta))
+
+    def role_changed(self, role: discord.Role, delta: int):
+        counters = self.guilds.get(role.guild.id)
+        if counters is not None:
+            counters.roles = max(0, counters.roles + delta)
+
+    async def member_counts(self, client, guild: discord.Guild, presences: bool = False):
+        """(members, online) — exact from the counters, or Discord's approximation (None if unavailable)"""
+        counters = self.get(guild, presences)
+        if counters.presences:
+            return guild.member_count, counters.online()
+        now = time.monotonic()
+        if counters.approximate is None or now - counters.approximate_at > APPROXIMATE_TTL:
+            try:
+                fetched = await client.fetch_guild(guild.id, with_counts=True)
+            except discord.HTTPException as e:
+                print(f"Error fetching member counts: {e}")
+                return guild.member_count, None
+            counters.approximate = (fetched.approximate_member_count, fetched.approximate_presence_count)
+            counters.approximate_at = now
+        return guild.member_count or counters.approximate[0], counters.approximate[1]
+
+    def metrics(self, client) -> Dict[str, dict]:
+        result = {}
+        for guild_id, counters in list(self.guilds.items()):  # read from the web thread
+            guild = client.get_guild(guild_id)
+            result[str(guild_id)] = counters.to_dict(guild.member_count if guild else None)
+        return result
+
+
+# Fed by the gateway events in bot.py, read by !serverinfo and /metrics
+guild_stats = GuildStats()
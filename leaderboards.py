@@ -0,0 +1,350 @@
+import asyncio
+import itertools
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from quotas import EPOCH_ORDINAL, epoch_day, epoch_day_of
+
+# Boards
+XP = 'xp'
+COINS = 'coins'
+
+# Windows
+WEEK = 'week'
+MONTH = 'month'
+SEASON = 'season'
+WINDOW_DAYS = {WEEK: 7, MONTH: 30}
+WINDOW_LABELS = {WEEK: "Last 7 Days", MONTH: "Last 30 Days", SEASON: "This Season"}
+
+# Versions are unique across indexes, so a rebuilt index never repeats an old one
+_versions = itertools.count(1)
+
+
+def season_start(day: int) -> int:
+    """First epoch day of the calendar quarter containing ``day``"""
+    d = date.fromordinal(day + EPOCH_ORDINAL)
+    return epoch_day_of(date(d.year, 3 * ((d.month - 1) // 3) + 1, 1))
+
+
+def season_name(day: int) -> str:
+    d = date.fromordinal(day + EPOCH_ORDINAL)
+    return f"Q{(d.month - 1) // 3 + 1} {d.year}"
+
+
+class RankIndex:
+    """Order-statistic index of users by score, highest first
+
+    Keys are kept in short sorted chunks, so an update moves a few hundred
+    entries at most and ``rank`` only counts whole chunks before the one
+    holding the user. ``version`` changes with every update, so readers can
+    tell when what they rendered may be out of date.
+    """
+    CHUNK = 256
+
+    def __init__(self):
+        self.scores = {}  # {user_id: score}
+        self._chunks = []  # sorted lists of (-score, user_id)
+        self._maxes = []  # last key of each chunk
+        self.version = next(_versions)
+
+    @staticmethod
+    def cursor(user_id: str, score: int) -> tuple:
+        """Position just after an entry, to continue a page from"""
+        return (-score, user_id)
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def _insert(self, key: tuple):
+        if not self._chunks:
+            self._chunks.append([key])
+            self._maxes.append(key)
+            return
+        i = min(bisect_left(self._maxes, key), len(self._chunks) - 1)
+        chunk = self._chunks[i]
+        insort(chunk, key)
+        self._maxes[i] = chunk[-1]
+        if len(chunk) > 2 * self.CHUNK:
+            self._chunks[i:i + 1] = [chunk[:self.CHUNK], chunk[self.CHUNK:]]
+            self._maxes[i:i + 1] = [chunk[self.CHUNK - 1], chunk[-1]]
+
+    def _remove(self, key: tuple):
+        i = bisect_left(self._maxes, key)
+        chunk = self._chunks[i]
+        del chunk[bisect_left(chunk, key)]
+        if chunk:
+            self._maxes[i] = chunk[-1]
+        else:
+            del self._chunks[i]
+            del self._maxes[i]
+
+    def set(self, user_id: str, score: int):
+        """Move a user to a new score (0 or less removes them)"""
+        old = self.scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self._remove((-old, user_id))
+            del self.scores[user_id]
+        if score > 0:
+            self.scores[user_id] = score
+            self._insert((-score, user_id))
+        self.version = next(_versions)
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """1-based position, or None when the user has no score"""
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        key = (-score, user_id)
+        i = bisect_left(self._maxes, key)
+        return sum(len(chunk) for chunk in self._chunks[:i]) + bisect_left(self._chunks[i], key) + 1
+
+    def page(self, offset: int = 0, limit: int = 10) -> List[Tuple[str, int]]:
+        """(user_id, score) pairs starting at ``offset``"""
+        for i, chunk in enumerate(self._chunks):
+            if offset < len(chunk):
+                return self._collect(i, offset, limit)
+            offset -= len(chunk)
+        return []
+
+    def after(self, cursor: Optional[tuple], limit: int = 10) -> List[Tuple[str, int]]:
+        """(user_id, score) pairs following a ``cursor``, found by bisecting instead of counting"""
+        if cursor is None:
+            return self.page(0, limit)
+        i = bisect_right(self._maxes, cursor)
+        if i == len(self._chunks):
+            return []
+        return self._collect(i, bisect_right(self._chunks[i], cursor), limit)
+
+    def _collect(self, i: int, start: int, limit: int) -> List[Tuple[str, int]]:
+        result = []
+        for chunk in self._chunks[i:]:
+            for score, user_id in chunk[start:start + limit - len(result)]:
+                result.append((user_id, -score))
+            start = 0
+            if len(result) >= limit:
+                break
+        return result
+
+    def clear(self):
+        self.scores.clear()
+        self._chunks.clear()
+        self._maxes.clear()
+        self.version = next(_versions)
+
+
+class Window:
+    """Running per-user sums over a range of day buckets, ranked"""
+
+    def __init__(self):
+        self.sums = {}  # {user_id: amount}
+        self.index = RankIndex()
+
+    def add(self, user_id: str, amount: int):
+        total = self.sums.get(user_id, 0) + amount
+        if total > 0:
+            self.sums[user_id] = total
+        else:
+            self.sums.pop(user_id, None)
+        self.index.set(user_id, total)
+
+    def expire(self, bucket: Dict[str, int]):
+        """Take a day that left the window back out of the sums"""
+        for user_id, amount in bucket.items():
+            self.add(user_id, -amount)
+
+    def clear(self):
+        self.sums.clear()
+        self.index.clear()
+
+
+class RollingBoard:
+    """Earnings per user per day, with rolling 7/30-day and season windows
+
+    Every amount goes into today's bucket and into each window's running
+    sums. When the day changes, only the buckets that just left a window are
+    subtracted, so rolling forward costs as much as the users who earned on
+    those days rather than a recount of everything.
+    """
+
+    def __init__(self, today: Optional[int] = None):
+        self.buckets = {}  # {day: {user_id: amount}}
+        self.today = epoch_day() if today is None else today
+        self.season_start = season_start(self.today)
+        self.windows = {WEEK: Window(), MONTH: Window(), SEASON: Window()}
+
+    def _in_window(self, window: str, day: int) -> bool:
+        if window == SEASON:
+            return day >= self.season_start
+        return self.today - day < WINDOW_DAYS[window]
+
+    def roll(self, day: int):
+        """Advance to ``day``, expiring buckets that fell out of each window"""
+        if day <= self.today:
+            return
+        previous = self.today
+        self.today = day
+        for window, days in WINDOW_DAYS.items():
+            for bucket_day in sorted(self.buckets):
+                if previous - days < bucket_day <= day - days:
+                    self.windows[window].expire(self.buckets[bucket_day])
+        if season_start(day) != self.season_start:
+            self.season_start = season_start(day)
+            self.windows[SEASON].clear()
+        # Keep what the month window or the current season still needs
+        oldest = min(day - WINDOW_DAYS[MONTH] + 1, self.season_start)
+        for bucket_day in [d for d in self.buckets if d < oldest]:
+            del self.buckets[bucket_day]
+
+    def add(self, user_id: str, amount: int, day: Optional[int] = None):
+        day = self.today if day is None else day
+        self.roll(day)
+        if amount == 0 or day < min(self.today - WINDOW_DAYS[MONTH] + 1, self.season_start):
+            return
+        bucket = self.buckets.setdefault(day, {})
+        bucket[user_id] = bucket.get(user_id, 0) + amount
+        for name, window in self.windows.items():
+            if self._in_window(name, day):
+                window.add(user_id, amount)
+
+    def forget(self, user_id: str):
+        """Remove a user from every bucket and window"""
+        for bucket in self.buckets.values():
+            bucket.pop(user_id, None)
+        for window in self.windows.values():
+            window.add(user_id, -window.sums.get(user_id, 0))
+
+    def clear(self):
+        self.buckets.clear()
+        for window in self.windows.values():
+            window.clear()
+
+
+class RollingLeaderboards:
+    """XP and coin boards, persisted as day buckets in SQLite
+
+    Only changed (board, day, user) cells are written, in one transaction
+    per flush. Loading replays the kept buckets to rebuild the windows.
+    """
+
+    def __init__(self, path: str = 'leaderboards.db'):
+        self.path = path
+        self.boards = {XP: RollingBoard(), COINS: RollingBoard()}
+        self.dirty = set()  # {(board, day, user_id)}
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Open the database and rebuild the windows from the kept buckets"""
+        if self._conn is not None:
+            return
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS earnings (board TEXT NOT NULL, day INTEGER NOT NULL, "
+            "user_id TEXT NOT NULL, amount INTEGER NOT NULL, PRIMARY KEY (board, day, user_id))"
+        )
+        conn.commit()
+        self._conn = conn
+
+        today = epoch_day()
+        self.boards = {XP: RollingBoard(today), COINS: RollingBoard(today)}
+        oldest = min(today - WINDOW_DAYS[MONTH] + 1, season_start(today))
+        rows = conn.execute("SELECT board, day, user_id, amount FROM earnings WHERE day >= ?", (oldest,))
+        for board, day, user_id, amount in rows:
+            if board in self.boards and day <= today:
+                self.boards[board].add(user_id, amount, day)
+
+    def close(self):
+        """Close the underlying connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def record(self, board: str, user_id, amount: int):
+        """Count an amount earned today"""
+        if amount <= 0:
+            return
+        rolling = self.boards[board]
+        rolling.roll(epoch_day())
+        rolling.add(str(user_id), amount)
+        self.dirty.add((board, rolling.today, str(user_id)))
+
+    def top(self, board: str, window: str, limit: int = 10, offset: int = 0) -> List[Tuple[str, int]]:
+        """(user_id, amount) pairs for a window, highest first"""
+        rolling = self.boards[board]
+        rolling.roll(epoch_day())
+        return rolling.windows[window].index.page(offset, limit)
+
+    def index(self, board: str, window: str) -> RankIndex:
+        """Ranking of a window, rolled forward to today"""
+        rolling = self.boards[board]
+        rolling.roll(epoch_day())
+        return rolling.windows[window].index
+
+    def rank(self, board: str, window: str, user_id) -> Optional[int]:
+        rolling = self.boards[board]
+        rolling.roll(epoch_day())
+        return rolling.windows[window].index.rank(str(user_id))
+
+    def total(self, board: str, window: str, user_id) -> int:
+        return self.boards[board].windows[window].sums.get(str(user_id), 0)
+
+    def size(self, board: str, window: str) -> int:
+        return len(self.boards[board].windows[window].index)
+
+    def season_name(self) -> str:
+        return season_name(epoch_day())
+
+    def _write(self, rows: List[tuple], oldest: int):
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO earnings (board, day, user_id, amount) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute("DELETE FROM earnings WHERE day < ?", (oldest,))
+
+    async def flush(self) -> int:
+        """Write changed buckets in one transaction; returns how many cells"""
+        if not self.dirty:
+            return 0
+        cells = list(self.dirty)
+        self.dirty.clear()
+        rows = [
+            (board, day, user_id, self.boards[board].buckets.get(day, {}).get(user_id, 0))
+            for board, day, user_id in cells
+        ]
+        today = epoch_day()
+        try:
+            await asyncio.to_thread(self._write, rows, min(today - WINDOW_DAYS[MONTH] + 1, season_start(today)))
+        except sqlite3.Error as e:
+            self.dirty.update(cells)
+            print(f"Error saving leaderboards: {e}")
+            return 0
+        return len(rows)
+
+    async def reset(self, board: str, user_id=None):
+        """Forget a board's history, or one user's"""
+        with self._lock:
+            with self._conn:
+                if user_id is None:
+                    self._conn.execute("DELETE FROM earnings WHERE board = ?", (board,))
+                else:
+                    self._conn.execute("DELETE FROM earnings WHERE board = ? AND user_id = ?", (board, str(user_id)))
+        if user_id is None:
+            self.boards[board].clear()
+            self.dirty = {cell for cell in self.dirty if cell[0] != board}
+        else:
+            self.boards[board].forget(str(user_id))
+            self.dirty = {cell for cell in self.dirty if cell[0] != board or cell[2] != str(user_id)}
+
+
+# Shared by the leveling commands and the economy
+leaderboards = RollingLeaderboards()
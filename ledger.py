@@ -0,0 +1,191 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Entry kinds written by the economy
+DAILY = 'daily'
+WORK = 'work'
+GAMBLE_WIN = 'gamble_win'
+GAMBLE_LOSS = 'gamble_loss'
+TRANSFER_IN = 'transfer_in'
+TRANSFER_OUT = 'transfer_out'
+PURCHASE = 'purchase'
+MYSTERY_BOX = 'mystery_box'
+ADMIN_GRANT = 'admin_grant'
+ADMIN_DEDUCT = 'admin_deduct'
+RESET = 'reset'
+
+KIND_LABELS = {
+    DAILY: "🎁 Daily",
+    WORK: "💼 Work",
+    GAMBLE_WIN: "🎲 Gamble won",
+    GAMBLE_LOSS: "🎲 Gamble lost",
+    TRANSFER_IN: "💸 Transfer in",
+    TRANSFER_OUT: "💸 Transfer out",
+    PURCHASE: "🛒 Purchase",
+    MYSTERY_BOX: "🎁 Mystery box",
+    ADMIN_GRANT: "🛠️ Admin grant",
+    ADMIN_DEDUCT: "🛠️ Admin deduct",
+    RESET: "♻️ Reset"
+}
+
+# Income counted on the earnings leaderboards (not transfers or admin changes)
+EARNING_KINDS = (DAILY, WORK, GAMBLE_WIN, MYSTERY_BOX)
+
+ALL_USERS = '*'
+
+
+class LedgerEntry:
+    """One row of the economy ledger"""
+    __slots__ = ('id', 'ts', 'user_id', 'kind', 'amount', 'balance', 'counterparty', 'detail')
+
+    def __init__(self, id, ts, user_id, kind, amount, balance, counterparty=None, detail=None):
+        self.id = id
+        self.ts = ts
+        self.user_id = user_id
+        self.kind = kind
+        self.amount = amount
+        self.balance = balance
+        self.counterparty = counterparty
+        self.detail = detail
+
+
+class EconomyLedger:
+    """Append-only, indexed log of every balance change
+
+    Each entry stores the balance after the change, so replaying the newest
+    entry per user restores balances without re-adding amounts. A checkpoint
+    records the last entry already contained in the economy snapshot.
+    """
+
+    COLUMNS = "id, ts, user_id, kind, amount, balance, counterparty, detail"
+
+    def __init__(self, path: str = 'economy_ledger.db'):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Open the ledger and create tables and indexes if needed"""
+        if self._conn is not None:
+            return
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS ledger (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts INTEGER NOT NULL,
+                user_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                amount INTEGER NOT NULL,
+                balance INTEGER NOT NULL,
+                counterparty TEXT,
+                detail TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_ledger_user_id ON ledger (user_id, id);
+            CREATE INDEX IF NOT EXISTS idx_ledger_user_ts ON ledger (user_id, ts);
+            CREATE INDEX IF NOT EXISTS idx_ledger_kind_id ON ledger (kind, id);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        conn.commit()
+        self._conn = conn
+
+    def close(self):
+        """Close the underlying connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def append(self, entries: Iterable[tuple]) -> int:
+        """Append (user_id, kind, amount, balance, counterparty, detail) rows atomically
+
+        Returns the id of the last entry written.
+        """
+        now = int(time.time())
+        rows = [(now, *entry) for entry in entries]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO ledger (ts, user_id, kind, amount, balance, counterparty, detail) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            return self._last_id()
+
+    def _last_id(self) -> int:
+        row = self._conn.execute("SELECT MAX(id) FROM ledger").fetchone()
+        return row[0] or 0
+
+    def last_id(self) -> int:
+        """Id of the newest entry (0 for an empty ledger)"""
+        with self._lock:
+            return self._last_id()
+
+    def get_checkpoint(self) -> int:
+        """Last entry id already reflected in the economy snapshot"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'snapshot_id'").fetchone()
+        return row[0] if row else 0
+
+    def set_checkpoint(self, entry_id: int):
+        """Record that the snapshot contains every entry up to entry_id"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('snapshot_id', ?)",
+                    (entry_id,)
+                )
+
+    def history(self, user_id: str, limit: int = 10, before_id: Optional[int] = None) -> List[LedgerEntry]:
+        """Newest entries for one user, optionally paging backwards from an id"""
+        before_id = before_id if before_id is not None else 2 ** 63 - 1
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self.COLUMNS} FROM ledger WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (user_id, before_id, limit)
+            ).fetchall()
+        return [LedgerEntry(*row) for row in rows]
+
+    def recent(self, limit: int = 15, kind: Optional[str] = None) -> List[LedgerEntry]:
+        """Newest entries across all users, optionally of one kind"""
+        with self._lock:
+            if kind:
+                rows = self._conn.execute(
+                    f"SELECT {self.COLUMNS} FROM ledger WHERE kind = ? ORDER BY id DESC LIMIT ?",
+                    (kind, limit)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    f"SELECT {self.COLUMNS} FROM ledger ORDER BY id DESC LIMIT ?",
+                    (limit,)
+                ).fetchall()
+        return [LedgerEntry(*row) for row in rows]
+
+    def totals_since(self, user_id: str, since_ts: int) -> Dict[str, int]:
+        """Sum of amounts per kind for one user since a unix timestamp"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, SUM(amount) FROM ledger WHERE user_id = ? AND ts >= ? GROUP BY kind",
+                (user_id, since_ts)
+            ).fetchall()
+        return dict(rows)
+
+    def balances_after(self, entry_id: int) -> Dict[str, int]:
+        """Latest balance of every user with entries newer than entry_id
+
+        Entries before the most recent reset are ignored.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(id) FROM ledger WHERE kind = ?", (RESET,)
+            ).fetchone()
+            start = max(entry_id, row[0] or 0)
+            rows = self._conn.execute(
+                "SELECT user_id, balance FROM ledger WHERE id IN "
+                "(SELECT MAX(id) FROM ledger WHERE id > ? AND user_id != ? GROUP BY user_id)",
+                (start, ALL_USERS)
+            ).fetchall()
+        return dict(rows)
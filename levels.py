@@ -0,0 +1,142 @@
+from array import array
+from bisect import bisect_right
+from math import isqrt
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import numpy
+except ImportError:  # optional: only speeds up recomputing many levels
+    numpy = None
+
+LINEAR = 'linear'
+QUADRATIC = 'quadratic'
+TABLE = 'table'
+PRECOMPUTED_LEVELS = 1000  # thresholds kept in the array; higher levels are computed directly
+
+
+class LevelCurve:
+    """Total XP needed for every level, precomputed into a sorted array
+
+    ``thresholds[i]`` is the XP at which level ``i + 1`` starts, so a level
+    lookup is one bisect. Curves:
+
+    - ``linear``: every level costs ``xp_per_level``
+    - ``quadratic``: each level costs ``growth`` more than the one before,
+      starting at ``xp_per_level``
+    - ``table``: explicit totals for levels 2, 3, ...; past the end every
+      level costs the same as the last step of the table
+
+    The array covers the first 1000 levels (or the whole table). There is no
+    level cap: past the array, levels and totals are solved in closed form,
+    so even absurd XP values cost the same as any other lookup.
+    """
+
+    def __init__(self, kind: str = LINEAR, xp_per_level: int = 200, growth: int = 0,
+                 table: Optional[Sequence[int]] = None):
+        self.thresholds = array('q', [0])
+        self.configure(kind, xp_per_level, growth, table)
+
+    def configure(self, kind: str = LINEAR, xp_per_level: int = 200, growth: int = 0,
+                  table: Optional[Sequence[int]] = None):
+        """Replace the curve in place (everyone holding this object sees the change)"""
+        if kind not in (LINEAR, QUADRATIC, TABLE):
+            raise ValueError(f"Unknown level curve '{kind}'")
+        if kind == TABLE:
+            table = [int(xp) for xp in table or ()]
+            if not table or table[0] <= 0 or any(b <= a for a, b in zip(table, table[1:])):
+                raise ValueError("A level table needs increasing, positive XP totals")
+        elif xp_per_level <= 0 or growth < 0:
+            raise ValueError("xp_per_level must be positive and growth not negative")
+        self.kind = kind
+        self.xp_per_level = int(xp_per_level)
+        self.growth = int(growth) if kind == QUADRATIC else 0
+        self.table = table if kind == TABLE else None
+        thresholds = array('q', [0] + (self.table or []))
+        while len(thresholds) < PRECOMPUTED_LEVELS:
+            thresholds.append(thresholds[-1] + self._step(len(thresholds)))
+        self.thresholds = thresholds
+
+    def configure_from(self, xp_settings: dict):
+        """Configure from ``xp_settings`` (``level_curve``, or the old ``level_multiplier``)"""
+        settings = xp_settings.get('level_curve') or {}
+        self.configure(
+            settings.get('type', LINEAR),
+            settings.get('xp_per_level', xp_settings.get('level_multiplier', 200)),
+            settings.get('growth', 0),
+            settings.get('table')
+        )
+
+    def signature(self) -> dict:
+        """Everything that defines the curve, to detect a change between runs"""
+        return {'type': self.kind, 'xp_per_level': self.xp_per_level, 'growth': self.growth, 'table': self.table}
+
+    def _step(self, level: int) -> int:
+        """XP needed to go from ``level`` to ``level + 1``"""
+        if self.kind == TABLE:
+            if len(self.table) == 1:
+                return self.table[0]
+            return self.table[-1] - self.table[-2]
+        return self.xp_per_level + self.growth * (level - 1)
+
+    def _total(self, level: int) -> int:
+        """Total XP at which ``level`` starts, for levels past the array"""
+        if self.growth:
+            steps = level - 1
+            return steps * self.xp_per_level + self.growth * steps * (steps - 1) // 2
+        last = len(self.thresholds)
+        return self.thresholds[-1] + (level - last) * self._step(last)
+
+    def _solve(self, xp: int) -> int:
+        """Level reached with ``xp``, for XP past the array"""
+        last = len(self.thresholds)
+        if not self.growth:
+            return last + (xp - self.thresholds[-1]) // self._step(last)
+        # Largest level whose total is <= xp: the root of the quadratic, then
+        # nudged to correct for integer rounding
+        linear = 2 * self.xp_per_level - self.growth
+        level = (isqrt(linear * linear + 8 * self.growth * xp) - linear) // (2 * self.growth) + 1
+        while self._total(level + 1) <= xp:
+            level += 1
+        while self._total(level) > xp:
+            level -= 1
+        return level
+
+    def level_for(self, xp: int) -> int:
+        """Level reached with ``xp`` total XP"""
+        if xp >= self.thresholds[-1]:
+            return self._solve(xp)
+        return bisect_right(self.thresholds, xp)
+
+    def xp_for(self, level: int) -> int:
+        """Total XP at which ``level`` starts"""
+        if level < 1:
+            return 0
+        if level > len(self.thresholds):
+            return self._total(level)
+        return self.thresholds[level - 1]
+
+    def progress(self, xp: int) -> Tuple[int, int, int, int]:
+        """(level, XP into the level, XP the level spans, XP still needed)"""
+        level = self.level_for(xp)
+        start, end = self.xp_for(level), self.xp_for(level + 1)
+        return level, xp - start, end - start, end - xp
+
+    def levels_for(self, xps: Sequence[int]) -> List[int]:
+        """Levels for many XP totals at once (vectorized when numpy is available)"""
+        if not xps:
+            return []
+        if numpy is not None and max(xps) < self.thresholds[-1]:
+            thresholds = numpy.frombuffer(self.thresholds, dtype=numpy.int64)
+            return numpy.searchsorted(thresholds, numpy.asarray(xps, dtype=numpy.int64), side='right').tolist()
+        return [self.level_for(xp) for xp in xps]
+
+    def describe(self) -> str:
+        if self.kind == LINEAR:
+            return f"{self.xp_per_level:,} XP per level"
+        if self.kind == QUADRATIC:
+            return f"{self.xp_per_level:,} XP for level 2, +{self.growth:,} XP per level after"
+        return f"Custom table ({len(self.table)} levels)"
+
+
+# Shared by the database, utils and the leveling commands; configured from config.json at startup
+level_curve = LevelCurve()
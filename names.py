@@ -0,0 +1,139 @@
+import asyncio
+import time
+from typing import Dict, Iterable, Optional
+
+import discord
+
+from cache import LRUCache
+
+QUERY_LIMIT = 100  # user ids per gateway member query
+BATCH_DELAY = 0.05  # seconds to gather misses into one query
+UNKNOWN_TTL = 600  # seconds before asking again about someone not found
+
+
+def fallback_name(user_id) -> str:
+    return f"User {user_id}"
+
+
+class NameResolver:
+    """Usernames by user id for leaderboards and results
+
+    Names live in a bounded LRU kept warm by member and message events.
+    Misses are not fetched one by one: they are queued per guild for a
+    moment and resolved together with one gateway member query per 100 ids.
+    Callers asking for an id that is already being looked up wait on the
+    same future, so a burst of leaderboards costs one query. Ids that could
+    not be found are remembered for a while instead of being asked again.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.cache = LRUCache(capacity)
+        self.unknown = {}  # {user_id: retry after (monotonic)}
+        self.pending = {}  # {guild_id: {user_id: Future}}
+        self.guilds = {}  # {guild_id: guild} with a batch waiting to be sent
+        self.stats = {'hits': 0, 'misses': 0, 'queries': 0, 'resolved': 0, 'unresolved': 0}
+
+    def remember(self, user):
+        """Record a user's or member's current name"""
+        if user is not None and not getattr(user, 'bot', False):
+            self.cache.put(user.id, user.name)
+            self.unknown.pop(user.id, None)
+
+    def peek(self, user_id) -> Optional[str]:
+        return self.cache.peek(int(user_id))
+
+    def _known(self, client, guild, user_id: int) -> Optional[str]:
+        name = self.cache.get(user_id)
+        if name is not None:
+            return name
+        user = guild.get_member(user_id) if guild else None
+        if user is None and client is not None:
+            user = client.get_user(user_id)
+        if user is not None:
+            self.cache.put(user_id, user.name)
+            return user.name
+        return None
+
+    async def resolve(self, guild, user_ids: Iterable, client=None) -> Dict[str, str]:
+        """Names for many ids (keys as given), querying the guild once for all misses"""
+        names = {}
+        waiting = {}
+        now = time.monotonic()
+        for key in user_ids:
+            user_id = int(key)
+            name = self._known(client, guild, user_id)
+            if name is not None:
+                self.stats['hits'] += 1
+                names[key] = name
+            elif guild is None or self.unknown.get(user_id, 0) > now:
+                names[key] = fallback_name(key)
+            else:
+                self.stats['misses'] += 1
+                waiting[key] = self._request(guild, user_id)
+
+        if waiting:
+            # Shielded so one caller giving up does not cancel the lookup for the others
+            results = await asyncio.gather(*(asyncio.shield(future) for future in waiting.values()))
+            for key, name in zip(waiting, results):
+                names[key] = name or fallback_name(key)
+        return names
+
+    async def name(self, guild, user_id, client=None) -> str:
+        return (await self.resolve(guild, [user_id], client))[user_id]
+
+    def _request(self, guild, user_id: int) -> asyncio.Future:
+        pending = self.pending.setdefault(guild.id, {})
+        future = pending.get(user_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            pending[user_id] = future
+            if guild.id not in self.guilds:
+                self.guilds[guild.id] = guild
+                asyncio.create_task(self._flush(guild.id))
+        return future
+
+    async def _flush(self, guild_id: int):
+        """Send one member query per 100 queued ids of a guild"""
+        await asyncio.sleep(BATCH_DELAY)
+        guild = self.guilds.pop(guild_id)
+        pending = self.pending.pop(guild_id, {})
+        user_ids = list(pending)
+        try:
+            for start in range(0, len(user_ids), QUERY_LIMIT):
+                await self._query(guild, user_ids[start:start + QUERY_LIMIT], pending)
+        finally:
+            # Never leave a caller waiting, whatever happened to the query
+            for future in pending.values():
+                if not future.done():
+                    future.set_result(None)
+        if len(self.unknown) > self.cache.capacity:
+            now = time.monotonic()
+            self.unknown = {user_id: until for user_id, until in self.unknown.items() if until > now}
+
+    async def _query(self, guild, batch: list, pending: dict):
+        found = {}
+        try:
+            self.stats['queries'] += 1
+            members = await guild.query_members(user_ids=batch, limit=len(batch), cache=False)
+            for member in members:
+                found[member.id] = member.name
+                self.cache.put(member.id, member.name)
+        except (asyncio.TimeoutError, discord.ClientException, discord.HTTPException) as e:
+            print(f"Error resolving member names: {e}")
+        retry_after = time.monotonic() + UNKNOWN_TTL
+        for user_id in batch:
+            name = found.get(user_id)
+            if name is None:
+                self.unknown[user_id] = retry_after
+                self.stats['unresolved'] += 1
+            else:
+                self.stats['resolved'] += 1
+            if not pending[user_id].done():
+                pending[user_id].set_result(name)
+
+    def metrics(self) -> Dict[str, int]:
+        return {'cached_names': len(self.cache), 'pending': sum(map(len, self.pending.values())), **self.stats}
+
+
+# Shared by every command that lists users by id
+name_resolver = NameResolver()
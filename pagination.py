@@ -0,0 +1,193 @@
+import discord
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from cache import LRUCache
+from leaderboards import RankIndex
+from names import name_resolver
+
+PER_PAGE = 10
+MEDALS = ("🥇", "🥈", "🥉")
+TIMEOUT = 120  # seconds the page buttons stay active
+
+
+def medal(rank: int) -> str:
+    return MEDALS[rank - 1] if rank <= len(MEDALS) else "🏅"
+
+
+def rank_footer(label: str, rank: Optional[int]) -> str:
+    return f"{label} • Your rank: #{rank}" if rank else label
+
+
+class RankedBoard:
+    """A leaderboard to page through: its rank index and how to draw it
+
+    ``index`` is a callable so windows that roll over are looked up fresh on
+    every page. ``format_row(rank, name, score)`` draws one line and
+    ``footer(user_id)`` the per-viewer footer text. ``refresh``, if given, is
+    awaited before every page (e.g. to save changes a stored index reads).
+    """
+
+    def __init__(self, key: tuple, title: str, index: Callable[[], RankIndex],
+                 format_row: Callable[[int, str, int], str], footer: Callable[[int], str],
+                 color: int, empty: str = "Nobody is ranked yet!",
+                 refresh: Optional[Callable[[], Awaitable]] = None):
+        self.key = key
+        self.title = title
+        self.index = index
+        self.format_row = format_row
+        self.footer = footer
+        self.color = color
+        self.empty = empty
+        self.refresh = refresh
+
+    def pages(self) -> int:
+        return max(1, -(-len(self.index()) // PER_PAGE))
+
+
+class PageEntry:
+    __slots__ = ('version', 'rows', 'text')
+
+    def __init__(self, version: int, rows: list, text: str):
+        self.version = version
+        self.rows = rows
+        self.text = text
+
+
+class PageCache:
+    """Rendered leaderboard pages keyed by (guild, board, page, cursor)
+
+    An entry is reused as is while the board's rank index keeps the version
+    it was drawn at. Once the version moves, the page's rows are read again
+    (cheap: a bisect into the index) and the text is only redrawn when the
+    visible rows actually differ. A page continued from a cursor is kept
+    under that cursor, since its rows need not match the plain page's.
+    """
+
+    def __init__(self, capacity: int = 512):
+        self.cache = LRUCache(capacity)
+        self.hits = 0
+        self.renders = 0
+
+    def rows(self, board: RankedBoard, page: int, cursor: Optional[tuple] = None) -> List[Tuple[str, int]]:
+        index = board.index()
+        if cursor is not None:
+            return index.after(cursor, PER_PAGE)
+        return index.page(page * PER_PAGE, PER_PAGE)
+
+    async def text(self, client, guild, board: RankedBoard, page: int,
+             cursor: Optional[tuple] = None) -> Tuple[str, List[Tuple[str, int]]]:
+        """Description of a page (0-based) and the rows on it"""
+        if board.refresh is not None:
+            await board.refresh()
+        key = (guild.id if guild else None, board.key, page, cursor)
+        version = board.index().version
+        entry = self.cache.get(key)
+        if entry is not None and entry.version == version:
+            self.hits += 1
+            return entry.text, entry.rows
+
+        rows = self.rows(board, page, cursor)
+        if entry is not None and entry.rows == rows:
+            entry.version = version
+            self.hits += 1
+            return entry.text, rows
+
+        names = await name_resolver.resolve(guild, [user_id for user_id, _ in rows], client)
+        first = page * PER_PAGE + 1
+        text = "\n".join(
+            board.format_row(rank, names[user_id], score)
+            for rank, (user_id, score) in enumerate(rows, first)
+        )
+        self.cache.put(key, PageEntry(version, rows, text))
+        self.renders += 1
+        return text, rows
+
+    async def embed(self, client, guild, board: RankedBoard, page: int, viewer_id: int,
+              cursor: Optional[tuple] = None) -> Tuple[discord.Embed, List[Tuple[str, int]]]:
+        text, rows = await self.text(client, guild, board, page, cursor)
+        embed = discord.Embed(
+            title=board.title,
+            description=text or board.empty,
+            color=board.color,
+            timestamp=discord.utils.utcnow()
+        )
+        embed.set_footer(text=f"{board.footer(viewer_id)} • Page {page + 1}/{board.pages()}")
+        return embed, rows
+
+    def metrics(self) -> Dict[str, int]:
+        return {'cached_pages': len(self.cache), 'page_hits': self.hits, 'page_renders': self.renders}
+
+
+# Shared by every paginated leaderboard
+page_cache = PageCache()
+
+
+class LeaderboardView(discord.ui.View):
+    """Previous/next buttons for the viewer who asked for the leaderboard
+
+    Moving forward continues from a cursor just after the last row shown,
+    so the next page comes from a bisect into the rank index.
+    """
+
+    def __init__(self, board: RankedBoard, viewer_id: int, page: int, rows: List[Tuple[str, int]]):
+        super().__init__(timeout=TIMEOUT)
+        self.board = board
+        self.viewer_id = viewer_id
+        self.page = page
+        self.cursors = {}  # {page: cursor after the last row of the page before}
+        self.remember(rows)
+        self.message = None
+        self.update_buttons()
+
+    def remember(self, rows: List[Tuple[str, int]]):
+        if len(rows) == PER_PAGE:
+            self.cursors[self.page + 1] = RankIndex.cursor(*rows[-1])
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page + 1 >= self.board.pages()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.viewer_id:
+            await interaction.response.send_message("❌ Run the command yourself to browse the leaderboard!", ephemeral=True)
+            return False
+        return True
+
+    async def show(self, interaction: discord.Interaction, page: int):
+        # Acknowledge first: names missing from the cache may need a member query
+        await interaction.response.defer()
+        self.page = page
+        embed, rows = await page_cache.embed(
+            interaction.client, interaction.guild, self.board, page, self.viewer_id, self.cursors.get(page)
+        )
+        self.remember(rows)
+        self.update_buttons()
+        await interaction.edit_original_response(embed=embed, view=self)
+
+    @discord.ui.button(label="◀ Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, max(0, self.page - 1))
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, min(self.board.pages() - 1, self.page + 1))
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+
+async def send_leaderboard(ctx, board: RankedBoard, page: int = 1):
+    """Send a leaderboard page (1-based), with buttons when there is more than one"""
+    page = min(max(1, page), board.pages()) - 1
+    embed, rows = await page_cache.embed(ctx.bot, ctx.guild, board, page, ctx.author.id)
+    if board.pages() == 1:
+        await ctx.send(embed=embed)
+        return
+    view = LeaderboardView(board, ctx.author.id, page, rows)
+    view.message = await ctx.send(embed=embed, view=view)
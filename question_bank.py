@@ -0,0 +1,236 @@
+import json
+import mmap
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from typing import Dict, List, Optional
+
+from cache import LRUCache
+from serialization import get_serializer
+from storage import SnapshotError, read_snapshot, write_snapshot
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+
+class QuestionBank(ABC):
+    """Category/difficulty index over questions kept on disk
+
+    Only the index lives in memory: one compact array of question ids per
+    (category, difficulty) pair. Question text is read from the file when a
+    question is actually asked. Nothing is loaded until ``load_index``.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.loaded = False
+        self.index = {}  # {(category_key, difficulty): array of question ids}
+        self.category_names = {}  # {category_key: display name}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self.index.values())
+
+    def load_index(self):
+        """Build or load the index once (safe to call from a worker thread)"""
+        with self._lock:
+            if not self.loaded:
+                self._load_index()
+                self.loaded = True
+
+    @abstractmethod
+    def _load_index(self):
+        pass
+
+    def _add(self, question_id: int, category: str, difficulty: str):
+        key = category.strip().lower()
+        self.category_names.setdefault(key, category.strip())
+        difficulty = difficulty.lower() if difficulty and difficulty.lower() in DIFFICULTIES else 'medium'
+        self.index.setdefault((key, difficulty), array('I')).append(question_id)
+
+    def categories(self) -> Dict[str, int]:
+        """Question count per category display name"""
+        counts = {}
+        for (key, _), ids in self.index.items():
+            name = self.category_names[key]
+            counts[name] = counts.get(name, 0) + len(ids)
+        return counts
+
+    def find_category(self, text: str) -> Optional[str]:
+        """Category key for an exact or unique prefix match"""
+        text = text.strip().lower()
+        if text in self.category_names:
+            return text
+        matches = [key for key in self.category_names if key.startswith(text)]
+        return matches[0] if len(matches) == 1 else None
+
+    def matching(self, category: Optional[str] = None, difficulty: Optional[str] = None) -> array:
+        """Ids of every question in a category and/or difficulty"""
+        ids = array('I')
+        for (key, level), bucket in self.index.items():
+            if (category is None or key == category) and (difficulty is None or level == difficulty):
+                ids.extend(bucket)
+        return ids
+
+    @abstractmethod
+    def get(self, question_id: int) -> dict:
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonlQuestionBank(QuestionBank):
+    """Questions stored one JSON object per line, read through mmap
+
+    The index (byte offset, category and difficulty per line) is cached in
+    a checksummed sidecar file, so the bank is only parsed in full when the
+    file has changed since the index was written.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.index_path = f"{path}.idx"
+        self.offsets = array('q')
+        self._file = None
+        self._map = None
+
+    def _load_index(self):
+        stat = os.stat(self.path)
+        entries = None
+        try:
+            cached, _ = read_snapshot(self.index_path, 0)
+            if cached and cached.get('size') == stat.st_size and cached.get('mtime') == stat.st_mtime_ns:
+                entries = cached['entries']
+        except SnapshotError as e:
+            print(f"Rebuilding trivia index: {e}")
+
+        if entries is None:
+            entries = self._scan()
+            cache = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'entries': entries}
+            try:
+                write_snapshot(self.index_path, get_serializer('json').dumps(cache), 0)
+            except OSError as e:
+                print(f"Error saving trivia index: {e}")
+
+        for question_id, (offset, category, difficulty) in enumerate(entries):
+            self.offsets.append(offset)
+            self._add(question_id, category, difficulty)
+
+    def _scan(self) -> List[list]:
+        """Parse every line once to find offsets, categories and difficulties"""
+        entries = []
+        offset = 0
+        with open(self.path, 'rb') as f:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        question = json.loads(line)
+                        entries.append([offset, question.get('category', 'General'), question.get('difficulty', 'medium')])
+                    except ValueError as e:
+                        print(f"Skipping trivia question on line {number}: {e}")
+                offset += len(line)
+        return entries
+
+    def get(self, question_id: int) -> dict:
+        if self._map is None:
+            self._file = open(self.path, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        start = self.offsets[question_id]
+        end = self._map.find(b'\n', start)
+        return json.loads(self._map[start:end if end >= 0 else len(self._map)])
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+
+class SqliteQuestionBank(QuestionBank):
+    """Questions stored in a SQLite table
+
+    Expected schema: ``questions(id INTEGER PRIMARY KEY, category TEXT,
+    difficulty TEXT, question TEXT, options TEXT (JSON list), correct INTEGER)``.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._conn = None
+        self._row_ids = array('q')
+
+    def _load_index(self):
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        rows = self._conn.execute("SELECT id, category, difficulty FROM questions ORDER BY id")
+        for question_id, (row_id, category, difficulty) in enumerate(rows):
+            self._row_ids.append(row_id)
+            self._add(question_id, category or 'General', difficulty or 'medium')
+
+    def get(self, question_id: int) -> dict:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT question, options, correct, category, difficulty FROM questions WHERE id = ?",
+                (self._row_ids[question_id],)
+            ).fetchone()
+        question, options, correct, category, difficulty = row
+        return {
+            "question": question,
+            "options": json.loads(options),
+            "correct": correct,
+            "category": category,
+            "difficulty": difficulty
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def open_question_bank(path: str) -> QuestionBank:
+    """Question bank for a .jsonl or SQLite (.db/.sqlite) file, not yet loaded"""
+    if path.endswith(('.db', '.sqlite', '.sqlite3')):
+        return SqliteQuestionBank(path)
+    return JsonlQuestionBank(path)
+
+
+class QuestionDeck:
+    """Shuffled, no-repeat draw order over a set of question ids
+
+    The ids are shuffled once and read through a cursor; when every
+    question has been asked the deck reshuffles.
+    """
+
+    def __init__(self, ids: array, rng):
+        self.ids = array('I', ids)
+        self.rng = rng
+        self.cursor = len(self.ids)
+
+    def draw(self) -> int:
+        if self.cursor >= len(self.ids):
+            self.rng.random.shuffle(self.ids)
+            self.cursor = 0
+        question_id = self.ids[self.cursor]
+        self.cursor += 1
+        return question_id
+
+
+class DeckStore:
+    """Per-channel decks for each category/difficulty filter, bounded by LRU"""
+
+    def __init__(self, bank: QuestionBank, rng, capacity: int = 1000):
+        self.bank = bank
+        self.rng = rng
+        self.decks = LRUCache(capacity)
+
+    def deck(self, channel_id: int, category: Optional[str] = None, difficulty: Optional[str] = None) -> QuestionDeck:
+        key = (channel_id, category, difficulty)
+        deck = self.decks.get(key)
+        if deck is None:
+            deck = QuestionDeck(self.bank.matching(category, difficulty), self.rng)
+            self.decks.put(key, deck)
+        return deck
+
+    def clear(self):
+        self.decks.clear()
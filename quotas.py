@@ -0,0 +1,329 @@
+import time
+from abc import ABC, abstractmethod
+from array import array
+from datetime import date
+from typing import Dict, Hashable, List, Optional
+
+from discord.ext import commands
+
+from storage import SnapshotError, read_snapshot
+
+SECONDS_PER_DAY = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def epoch_day(now: Optional[float] = None) -> int:
+    """Days since 1970-01-01 (UTC) for a unix timestamp, default now"""
+    return int((time.time() if now is None else now) // SECONDS_PER_DAY)
+
+
+def epoch_day_of(day: date) -> int:
+    """Days since 1970-01-01 for a calendar date"""
+    return day.toordinal() - EPOCH_ORDINAL
+
+
+class QuotaPolicy(ABC):
+    """Rate limit rule evaluated against a small fixed-size numeric state
+
+    Policies hold no per-user data themselves; the state list is stored by
+    the caller (a user record or a QuotaEngine bucket), which keeps every
+    check O(1) and lets the same rule live in either place.
+    """
+    state_size = 1
+
+    def initial_state(self) -> List[float]:
+        return [0.0] * self.state_size
+
+    @abstractmethod
+    def hit(self, state: List[float], now: float, amount: int = 1) -> float:
+        """Consume ``amount`` if allowed; returns 0, or seconds until it would be"""
+
+    @abstractmethod
+    def refund(self, state: List[float], now: float, amount: int = 1):
+        """Give back ``amount`` consumed by an earlier ``hit``"""
+
+    @abstractmethod
+    def expired(self, state: List[float], now: float) -> bool:
+        """True when the state is equivalent to a fresh one and can be dropped"""
+
+
+class FixedWindowQuota(QuotaPolicy):
+    """At most ``limit`` uses per aligned window (a UTC day by default)
+
+    The state is a compact ``[window_index, count]`` pair. A pair from an
+    older window simply counts as zero, so nothing has to be reset when the
+    window rolls over. The ``record`` helpers keep the pair under
+    ``record['quotas'][name]`` so it can be committed with other changes.
+    """
+    state_size = 2
+
+    def __init__(self, name: str, limit: int, window: int = SECONDS_PER_DAY):
+        self.name = name
+        self.limit = limit
+        self.window = window
+
+    def window_index(self, now: Optional[float] = None) -> int:
+        return int((time.time() if now is None else now) // self.window)
+
+    def hit(self, state, now, amount=1):
+        index = self.window_index(now)
+        used = int(state[1]) if state[0] == index else 0
+        if used + amount > self.limit:
+            return self.resets_in(now)
+        state[0] = index
+        state[1] = used + amount
+        return 0.0
+
+    def refund(self, state, now, amount=1):
+        if state[0] == self.window_index(now):
+            state[1] = max(0, state[1] - amount)
+
+    def expired(self, state, now):
+        return state[0] < self.window_index(now)
+
+    def used(self, record: dict, now: Optional[float] = None) -> int:
+        """Uses counted in the current window"""
+        state = record.get('quotas', {}).get(self.name)
+        if state and state[0] == self.window_index(now):
+            return state[1]
+        return 0
+
+    def remaining(self, record: dict, now: Optional[float] = None) -> int:
+        return max(0, self.limit - self.used(record, now))
+
+    def try_consume(self, record: dict, amount: int = 1, now: Optional[float] = None) -> bool:
+        """Count a use if the limit allows it; returns False when exhausted"""
+        now = time.time() if now is None else now
+        quotas = record.setdefault('quotas', {})
+        state = list(quotas.get(self.name) or self.initial_state())
+        if self.hit(state, now, amount) > 0:
+            return False
+        quotas[self.name] = [int(state[0]), int(state[1])]
+        return True
+
+    def resets_in(self, now: Optional[float] = None) -> int:
+        """Seconds until the current window ends"""
+        now = time.time() if now is None else now
+        return int(self.window - now % self.window)
+
+
+class TokenBucket(QuotaPolicy):
+    """Bursts of up to ``capacity`` uses, refilled at ``rate`` tokens per second
+
+    The state is ``[tokens, last_update]``; a fresh state is a full bucket.
+    """
+    state_size = 2
+
+    def __init__(self, capacity: int, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+
+    def initial_state(self):
+        return [float(self.capacity), 0.0]
+
+    def hit(self, state, now, amount=1):
+        tokens = min(self.capacity, state[0] + (now - state[1]) * self.rate)
+        if tokens < amount:
+            return (amount - tokens) / self.rate
+        state[0] = tokens - amount
+        state[1] = now
+        return 0.0
+
+    def refund(self, state, now, amount=1):
+        state[0] = min(self.capacity, state[0] + amount)
+
+    def expired(self, state, now):
+        return state[0] + (now - state[1]) * self.rate >= self.capacity
+
+
+class Cooldown(QuotaPolicy):
+    """One use every ``seconds``; the state is the time of the next allowed use"""
+    state_size = 1
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def hit(self, state, now, amount=1):
+        if now < state[0]:
+            return state[0] - now
+        state[0] = now + self.seconds
+        return 0.0
+
+    def refund(self, state, now, amount=1):
+        state[0] -= self.seconds
+
+    def expired(self, state, now):
+        return now >= state[0]
+
+
+class _Bucket:
+    """Policy states for one bucket, packed into a flat array of doubles"""
+
+    def __init__(self, policy: QuotaPolicy):
+        self.policy = policy
+        self.slots = {}  # {key: slot}
+        self.values = array('d')
+        self.free = []
+
+    def state(self, key: str) -> Optional[List[float]]:
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+        size = self.policy.state_size
+        return self.values[slot * size:(slot + 1) * size].tolist()
+
+    def store(self, key: str, state: List[float]):
+        size = self.policy.state_size
+        slot = self.slots.get(key)
+        if slot is None:
+            if self.free:
+                slot = self.free.pop()
+            else:
+                slot = len(self.values) // size
+                self.values.extend(state)
+            self.slots[key] = slot
+        self.values[slot * size:(slot + 1) * size] = array('d', state)
+
+    def drop(self, key: str):
+        slot = self.slots.pop(key, None)
+        if slot is not None:
+            self.free.append(slot)
+
+
+class QuotaEngine:
+    """Cooldowns and quotas for every (key, bucket) pair in the bot
+
+    Each bucket is declared once with a policy. Checks are dict lookups
+    plus a few float operations; entries that have returned to their fresh
+    state are dropped by ``sweep`` so memory tracks only active users.
+    """
+
+    def __init__(self):
+        self.buckets = {}  # {name: _Bucket}
+
+    def __len__(self) -> int:
+        return sum(len(bucket.slots) for bucket in self.buckets.values())
+
+    def register(self, name: str, policy: QuotaPolicy):
+        """Declare (or re-declare) the policy for a bucket"""
+        bucket = self.buckets.get(name)
+        if bucket is None or bucket.policy.state_size != policy.state_size:
+            self.buckets[name] = _Bucket(policy)
+        else:
+            bucket.policy = policy
+
+    def hit(self, name: str, key: Hashable, amount: int = 1, now: Optional[float] = None) -> float:
+        """Consume from a bucket; returns 0, or seconds until allowed"""
+        bucket = self.buckets[name]
+        now = time.time() if now is None else now
+        key = str(key)
+        state = bucket.state(key) or bucket.policy.initial_state()
+        retry_after = bucket.policy.hit(state, now, amount)
+        if retry_after <= 0:
+            bucket.store(key, state)
+        return retry_after
+
+    def reset(self, name: str, key: Hashable):
+        """Forget a key's usage in a bucket"""
+        self.buckets[name].drop(str(key))
+
+    def refund(self, name: str, key: Hashable, amount: int = 1, now: Optional[float] = None):
+        """Give back uses taken by ``hit``, leaving other uses of the key counted"""
+        bucket = self.buckets[name]
+        key = str(key)
+        state = bucket.state(key)
+        if state is None:
+            return
+        bucket.policy.refund(state, time.time() if now is None else now, amount)
+        bucket.store(key, state)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop entries that are back to a fresh state; returns how many"""
+        now = time.time() if now is None else now
+        removed = 0
+        for bucket in self.buckets.values():
+            expired = [key for key in bucket.slots if bucket.policy.expired(bucket.state(key), now)]
+            for key in expired:
+                bucket.drop(key)
+            removed += len(expired)
+        return removed
+
+    def snapshot(self) -> Dict[str, Dict[str, List[float]]]:
+        """Serializable copy of every tracked state"""
+        return {
+            name: {key: bucket.state(key) for key in bucket.slots}
+            for name, bucket in self.buckets.items()
+        }
+
+    def restore(self, data: Dict[str, Dict[str, List[float]]]):
+        """Load states from a snapshot into already registered buckets"""
+        for name, states in data.items():
+            bucket = self.buckets.get(name)
+            if bucket is None:
+                continue
+            for key, state in states.items():
+                if len(state) == bucket.policy.state_size:
+                    bucket.store(key, [float(value) for value in state])
+
+    def load(self, path: str, generations: int = 1):
+        """Restore engine state saved by ``save``, if any"""
+        try:
+            data, _ = read_snapshot(path, generations)
+        except SnapshotError as e:
+            print(f"Error loading quota state: {e}")
+            return
+        if isinstance(data, dict):
+            self.restore(data)
+
+
+# Shared by every cog
+quota_engine = QuotaEngine()
+
+
+class QuotaExceeded(commands.CheckFailure):
+    """Raised by rate_limit when a command is used too often"""
+
+    def __init__(self, bucket: str, retry_after: float):
+        self.bucket = bucket
+        self.retry_after = retry_after
+        super().__init__(f"Rate limited on {bucket}, retry in {retry_after:.0f}s")
+
+
+def rate_limit(bucket: str, policy: QuotaPolicy, per: str = 'user'):
+    """Command decorator applying a quota per user, channel or guild
+
+    The check only reserves the use. The command calls ``spend_quota(ctx)``
+    once its input is valid; anything not spent is given back by
+    ``refund_quota`` when the invocation ends (see the hooks in bot.py), so
+    a typo or a rejected request does not lock the user out.
+    """
+    quota_engine.register(bucket, policy)
+
+    def key_for(ctx):
+        if per == 'channel':
+            return ctx.channel.id
+        if per == 'guild':
+            return ctx.guild.id if ctx.guild else ctx.channel.id
+        return ctx.author.id
+
+    async def predicate(ctx):
+        key = key_for(ctx)
+        retry_after = quota_engine.hit(bucket, key)
+        if retry_after > 0:
+            raise QuotaExceeded(bucket, retry_after)
+        ctx.quota_reserved = getattr(ctx, 'quota_reserved', []) + [(bucket, key)]
+        return True
+
+    return commands.check(predicate)
+
+
+def spend_quota(ctx):
+    """Keep the uses ``rate_limit`` reserved for this invocation"""
+    ctx.quota_reserved = []
+
+
+def refund_quota(ctx):
+    """Give back reserved uses the command did not spend"""
+    for bucket, key in getattr(ctx, 'quota_reserved', []):
+        quota_engine.refund(bucket, key)
+    ctx.quota_reserved = []
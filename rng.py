@@ -0,0 +1,118 @@
+import random
+from typing import Callable, Dict, Hashable, List, Optional, Sequence
+
+# Optional vectorized backend, used only when installed
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class AliasTable:
+    """Weighted outcomes prepared once for O(1) draws (Vose's alias method)
+
+    Each of the n slots holds a probability and an alias; a draw picks a
+    slot uniformly and keeps it or takes its alias with one comparison, no
+    matter how many outcomes or how skewed the weights are.
+    """
+
+    def __init__(self, weights: Dict[Hashable, float]):
+        if not weights or any(weight < 0 for weight in weights.values()):
+            raise ValueError("AliasTable needs at least one outcome and non-negative weights")
+        total = sum(weights.values())
+        if total <= 0:
+            raise ValueError("AliasTable weights must not all be zero")
+
+        self.outcomes = list(weights)
+        size = len(self.outcomes)
+        scaled = [weights[outcome] * size / total for outcome in self.outcomes]
+        self.prob = [1.0] * size
+        self.alias = list(range(size))
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] += scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Leftovers are 1.0 up to rounding error and keep their defaults
+
+        if numpy is not None:
+            self._np_prob = numpy.array(self.prob)
+            self._np_alias = numpy.array(self.alias)
+
+    def __len__(self) -> int:
+        return len(self.outcomes)
+
+    def draw(self, rand: random.Random):
+        slot = int(rand.random() * len(self.outcomes))
+        return self.outcomes[slot if rand.random() < self.prob[slot] else self.alias[slot]]
+
+
+class RNGService:
+    """Shared source of randomness for the economy and games
+
+    Call ``seed`` for a deterministic mode in which the same sequence of
+    calls replays the exact same outcomes (benchmarks, tests, debugging).
+    Named modifiers scale probabilities per user, e.g. the Lucky Charm.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.modifiers = {}  # {name: callable(user_id) -> factor}
+        self.seed(seed)
+
+    def seed(self, seed: Optional[int] = None):
+        """Reseed every backend; None means unpredictable (the default)"""
+        self.seed_value = seed
+        self.random = random.Random(seed)
+        self.np_random = numpy.random.default_rng(seed) if numpy is not None else None
+
+    @property
+    def deterministic(self) -> bool:
+        return self.seed_value is not None
+
+    def add_modifier(self, name: str, factor: Callable[[str], float]):
+        """Register a per-user probability multiplier"""
+        self.modifiers[name] = factor
+
+    def factor(self, user_id, modifier: Optional[str]) -> float:
+        if modifier is None or user_id is None or modifier not in self.modifiers:
+            return 1.0
+        return self.modifiers[modifier](str(user_id))
+
+    def randint(self, low: int, high: int) -> int:
+        """Uniform integer in [low, high]"""
+        return self.random.randint(low, high)
+
+    def choice(self, options: Sequence):
+        return self.random.choice(options)
+
+    def chance(self, probability: float, user_id=None, modifier: Optional[str] = None) -> bool:
+        """True with the given probability, scaled by the user's modifier"""
+        return self.random.random() < min(1.0, probability * self.factor(user_id, modifier))
+
+    def weighted(self, table: AliasTable):
+        """One outcome from an alias table"""
+        return table.draw(self.random)
+
+    def weighted_many(self, table: AliasTable, count: int) -> list:
+        """``count`` outcomes from an alias table in one batch"""
+        if self.np_random is not None:
+            slots = self.np_random.integers(0, len(table), size=count)
+            keep = self.np_random.random(count) < table._np_prob[slots]
+            picks = numpy.where(keep, slots, table._np_alias[slots])
+            return [table.outcomes[i] for i in picks.tolist()]
+        return [table.draw(self.random) for _ in range(count)]
+
+    def rolls(self, sides: int, count: int) -> List[int]:
+        """``count`` uniform rolls of a die with ``sides`` faces"""
+        if self.np_random is not None and count > 32:
+            return self.np_random.integers(1, sides + 1, size=count).tolist()
+        randint = self.random.randint
+        return [randint(1, sides) for _ in range(count)]
+
+
+# Shared by every cog
+rng = RNGService()
@@ -0,0 +1,113 @@
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict
+
+# Optional faster backends, used only when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class Serializer(ABC):
+    """Encode/decode persisted data to and from bytes"""
+    name = None
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> bytes:
+        pass
+
+    @abstractmethod
+    def loads(self, data: bytes) -> Any:
+        pass
+
+
+class PrettyJsonSerializer(Serializer):
+    """Indented stdlib JSON (the original on-disk format)"""
+    name = 'json-pretty'
+
+    def dumps(self, obj):
+        return json.dumps(obj, indent=2).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class CompactJsonSerializer(Serializer):
+    """Stdlib JSON without whitespace"""
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonSerializer(Serializer):
+    """Compact JSON through orjson"""
+    name = 'orjson'
+
+    def dumps(self, obj):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class MsgpackSerializer(Serializer):
+    """Binary MessagePack encoding"""
+    name = 'msgpack'
+
+    def dumps(self, obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data):
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+def available_serializers() -> Dict[str, Serializer]:
+    """All serializers usable with the installed packages, by name"""
+    serializers = {
+        PrettyJsonSerializer.name: PrettyJsonSerializer(),
+        CompactJsonSerializer.name: CompactJsonSerializer()
+    }
+    if orjson is not None:
+        serializers[OrjsonSerializer.name] = OrjsonSerializer()
+    if msgpack is not None:
+        serializers[MsgpackSerializer.name] = MsgpackSerializer()
+    return serializers
+
+
+def get_serializer(name: str = 'json') -> Serializer:
+    """Look up a serializer by name, falling back to compact JSON"""
+    serializers = available_serializers()
+    if name not in serializers:
+        print(f"⚠️ Serializer '{name}' is not available, using compact JSON")
+        return serializers['json']
+    return serializers[name]
+
+
+def detect_serializer(data: bytes) -> Serializer:
+    """Pick a serializer able to decode the given bytes"""
+    head = data.lstrip()[:1]
+    if head in (b'{', b'['):
+        # Any JSON flavour decodes the same; prefer the fastest decoder
+        return OrjsonSerializer() if orjson is not None else CompactJsonSerializer()
+    if msgpack is None:
+        raise ValueError("Data is not JSON and msgpack is not installed")
+    return MsgpackSerializer()
+
+
+def loads_auto(data) -> Any:
+    """Decode bytes (or legacy text) written by any supported serializer"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if not data.strip():
+        return {}
+    return detect_serializer(data).loads(data)
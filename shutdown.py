@@ -0,0 +1,104 @@
+import asyncio
+import signal
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict
+
+
+class ShutdownCoordinator:
+    """Stops new work, waits for work in progress, then flushes within a deadline
+
+    Message handling and background tasks run inside ``working()`` so a
+    shutdown waits for them instead of cutting a write off halfway. Once
+    ``closing`` is set nothing new starts; after the drain the registered
+    steps run in order, each with whatever is left of the deadline, and a
+    step that fails or runs out of time does not stop the ones after it.
+    """
+
+    def __init__(self):
+        self.closing = False
+        self.active = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.steps = []  # [(name, coroutine function)]
+        self.report = {}  # {step: outcome} of the last shutdown
+
+    def add_step(self, name: str, step: Callable[[], Awaitable]):
+        """Register a flush step; it may return a short description of what it saved"""
+        self.steps.append((name, step))
+
+    @asynccontextmanager
+    async def working(self):
+        self._enter()
+        try:
+            yield
+        finally:
+            self._leave()
+
+    @asynccontextmanager
+    async def paused(self):
+        """Don't count a wait for user input inside ``working()`` as work to drain
+
+        Check ``closing`` afterwards: the shutdown may have run meanwhile.
+        """
+        self._leave()
+        try:
+            yield
+        finally:
+            self._enter()
+
+    def _enter(self):
+        self.active += 1
+        self.idle.clear()
+
+    def _leave(self):
+        self.active -= 1
+        if not self.active:
+            self.idle.set()
+
+    async def run(self, deadline: float, drain: float) -> Dict[str, str]:
+        """Close, drain for at most ``drain`` seconds and run every step by ``deadline``"""
+        self.closing = True
+        started = time.monotonic()
+        end = started + deadline
+        self.report = {}
+
+        in_progress = self.active
+        try:
+            await asyncio.wait_for(self.idle.wait(), min(drain, deadline))
+            self.report['drain'] = f"{in_progress} in progress ({elapsed_ms(started)})"
+        except asyncio.TimeoutError:
+            self.report['drain'] = f"gave up with {self.active} still running ({elapsed_ms(started)})"
+
+        for name, step in self.steps:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                self.report[name] = "skipped (deadline passed)"
+                continue
+            step_started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(step(), remaining)
+                self.report[name] = f"{'done' if result is None else result} ({elapsed_ms(step_started)})"
+            except asyncio.TimeoutError:
+                self.report[name] = "timed out"
+            except Exception as e:
+                self.report[name] = f"failed: {e}"
+        self.report['total'] = elapsed_ms(started)
+        return self.report
+
+    def install(self, loop: asyncio.AbstractEventLoop, callback: Callable[[str], None]):
+        """Call ``callback(signal name)`` on the loop for SIGTERM and SIGINT"""
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, callback, sig.name)
+            except (NotImplementedError, RuntimeError):
+                # Windows has no loop signal handlers
+                signal.signal(sig, lambda signum, frame: loop.call_soon_threadsafe(callback, signal.Signals(signum).name))
+
+
+def elapsed_ms(since: float) -> str:
+    return f"{(time.monotonic() - since) * 1000:.0f}ms"
+
+
+# Used by bot.py, its background tasks and the web server
+shutdown = ShutdownCoordinator()
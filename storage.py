@@ -0,0 +1,302 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from serialization import Serializer, get_serializer, loads_auto
+
+SNAPSHOT_MAGIC = b'#sgz-sha256:'
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file (or every generation of it) is unreadable"""
+
+
+def _fsync_directory(path: str):
+    """Persist a rename by syncing the containing directory (POSIX only)"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_snapshot(path: str, data: bytes, generations: int = 3):
+    """Crash-safely replace a file with checksummed data
+
+    The data goes to a temp file that is fsynced and atomically renamed over
+    ``path``. The previous contents are rotated to ``path.1`` ... ``path.N``.
+    """
+    digest = hashlib.sha256(data).hexdigest().encode('ascii')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC + digest + b'\n')
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if generations > 0:
+        for i in range(generations - 1, 0, -1):
+            older = f"{path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{path}.{i + 1}")
+        if os.path.exists(path):
+            os.replace(path, f"{path}.1")
+
+    os.replace(tmp_path, path)
+    _fsync_directory(path)
+
+
+def read_snapshot_file(path: str) -> Any:
+    """Read and decode one snapshot file, verifying its checksum if present"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+
+    if raw.startswith(SNAPSHOT_MAGIC):
+        header, _, payload = raw.partition(b'\n')
+        expected = header[len(SNAPSHOT_MAGIC):]
+        if hashlib.sha256(payload).hexdigest().encode('ascii') != expected:
+            raise SnapshotError(f"Checksum mismatch in {path}")
+        raw = payload
+    elif not raw.strip():
+        # Files written before checksums: an empty one is a truncated write
+        raise SnapshotError(f"{path} is empty")
+
+    try:
+        return loads_auto(raw)
+    except ValueError as e:
+        raise SnapshotError(f"Cannot decode {path}: {e}")
+
+
+def read_snapshot(path: str, generations: int = 3) -> Tuple[Any, Optional[str]]:
+    """Load the newest valid generation of a snapshot
+
+    Returns ``(data, source_path)``, or ``(None, None)`` when no generation
+    exists. Raises SnapshotError if files exist but none of them is valid.
+    """
+    candidates = [path] + [f"{path}.{i}" for i in range(1, generations + 1)]
+    errors = []
+    for candidate in candidates:
+        if not os.path.exists(candidate):
+            continue
+        try:
+            return read_snapshot_file(candidate), candidate
+        except (SnapshotError, OSError) as e:
+            errors.append(str(e))
+
+    if errors:
+        raise SnapshotError("; ".join(errors))
+    return None, None
+
+
+def quarantine_snapshot(path: str) -> Optional[str]:
+    """Move an unreadable snapshot aside so it is never overwritten"""
+    if not os.path.exists(path):
+        return None
+    target = f"{path}.corrupt-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    os.replace(path, target)
+    return target
+
+
+class SqliteRecordStore:
+    """Key/value store for per-user records backed by a local SQLite table
+
+    Each record is kept as an encoded blob next to a few indexed integer
+    columns, so single records can be loaded on demand and ranked queries
+    never need the whole table in memory.
+    """
+
+    def __init__(self, path: str, table: str = 'records', indexed: Tuple[str, ...] = (),
+                 serializer: Optional[Serializer] = None):
+        self.path = path
+        self.table = table
+        self.indexed = tuple(indexed)
+        self.serializer = serializer or get_serializer('json')
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Open the database and create the table and indexes if needed"""
+        if self._conn is not None:
+            return
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        columns = "".join(f", {name} INTEGER NOT NULL DEFAULT 0" for name in self.indexed)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY{columns}, data BLOB NOT NULL)")
+        for name in self.indexed:
+            # Ties ordered by key, so ranked pages can continue from a (value, key) cursor
+            conn.execute(f"DROP INDEX IF EXISTS idx_{self.table}_{name}")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_{name}_key ON {self.table} ({name} DESC, key)")
+        conn.commit()
+        self._conn = conn
+
+    def close(self):
+        """Close the underlying connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def encode(self, record: dict) -> bytes:
+        """Serialize a record for storage"""
+        return self.serializer.dumps(record)
+
+    def decode(self, data) -> dict:
+        """Deserialize a stored record, whatever format it was written in"""
+        return loads_auto(data)
+
+    def row_for(self, key: str, record: dict) -> tuple:
+        """Build the row tuple written for a record"""
+        return (key, *(int(record.get(name) or 0) for name in self.indexed), self.encode(record))
+
+    def get(self, key: str) -> Optional[dict]:
+        """Load a single record, or None when it does not exist"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT data FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        return self.decode(row[0]) if row else None
+
+    def get_many(self, keys: List[str]) -> Dict[str, dict]:
+        """Load several records at once; missing keys are left out"""
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, data FROM {self.table} WHERE key IN ({', '.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                found.update(rows)
+        return {key: self.decode(data) for key, data in found.items()}
+
+    def contains(self, key: str) -> bool:
+        """Check whether a record exists without decoding it"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def count(self) -> int:
+        """Number of stored records"""
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def write_rows(self, rows: Iterable[tuple]):
+        """Upsert pre-encoded rows in a single transaction"""
+        placeholders = ", ".join("?" * (len(self.indexed) + 2))
+        columns = ", ".join(("key", *self.indexed, "data"))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} ({columns}) VALUES ({placeholders})",
+                    rows
+                )
+
+    def put_many(self, records: Dict[str, dict]):
+        """Upsert several records in a single transaction"""
+        self.write_rows([self.row_for(key, record) for key, record in records.items()])
+
+    def delete(self, key: str):
+        """Remove a record"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        """Remove every record"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute(f"DELETE FROM {self.table}")
+
+    def top(self, column: str, limit: int, offset: int = 0) -> List[Tuple[str, dict]]:
+        """Return records ordered by an indexed column, highest first"""
+        if column not in self.indexed:
+            raise ValueError(f"{column} is not an indexed column")
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, data FROM {self.table} ORDER BY {column} DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [(key, self.decode(data)) for key, data in rows]
+
+    def ranked(self, column: str, limit: int, offset: int = 0,
+               after: Optional[Tuple[int, str]] = None) -> List[Tuple[str, int]]:
+        """(key, value) of records with a positive value, highest first (ties by key)
+
+        ``after`` is the ``(value, key)`` of the last row already seen; the
+        page then continues from the index instead of skipping ``offset`` rows.
+        """
+        if column not in self.indexed:
+            raise ValueError(f"{column} is not an indexed column")
+        query = f"SELECT key, {column} FROM {self.table} WHERE {column} > 0"
+        params = []
+        if after is not None:
+            query += f" AND ({column} < ? OR ({column} = ? AND key > ?))"
+            params += [after[0], after[0], after[1]]
+        query += f" ORDER BY {column} DESC, key LIMIT ? OFFSET ?"
+        with self._lock:
+            return self._conn.execute(query, (*params, limit, offset)).fetchall()
+
+    def count_ranked(self, column: str) -> int:
+        """Number of records with a positive value in an indexed column"""
+        if column not in self.indexed:
+            raise ValueError(f"{column} is not an indexed column")
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table} WHERE {column} > 0").fetchone()[0]
+
+    def rank_of(self, column: str, key: str) -> Optional[int]:
+        """1-based position of a record in ``ranked`` order, or None when unranked"""
+        if column not in self.indexed:
+            raise ValueError(f"{column} is not an indexed column")
+        with self._lock:
+            row = self._conn.execute(f"SELECT {column} FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None or row[0] <= 0:
+                return None
+            ahead = self._conn.execute(
+                f"SELECT (SELECT COUNT(*) FROM {self.table} WHERE {column} > ?)"
+                f" + (SELECT COUNT(*) FROM {self.table} WHERE {column} = ? AND key < ?)",
+                (row[0], row[0], key)
+            ).fetchone()[0]
+        return ahead + 1
+
+    def batches(self, batch_size: int = 1000) -> Iterator[List[Tuple[str, dict]]]:
+        """Walk every record in key order, ``batch_size`` at a time"""
+        last_key = ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, data FROM {self.table} WHERE key > ? ORDER BY key LIMIT ?",
+                    (last_key, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield [(key, self.decode(data)) for key, data in rows]
+            last_key = rows[-1][0]
+
+    def reencode(self, serializer: Serializer, batch_size: int = 1000) -> int:
+        """Rewrite every record with a different serializer, returning the count"""
+        self.serializer = serializer
+        migrated = 0
+        last_key = ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, data FROM {self.table} WHERE key > ? ORDER BY key LIMIT ?",
+                    (last_key, batch_size)
+                ).fetchall()
+            if not rows:
+                return migrated
+            with self._lock:
+                with self._conn:
+                    self._conn.executemany(
+                        f"UPDATE {self.table} SET data = ? WHERE key = ?",
+                        [(self.encode(self.decode(data)), key) for key, data in rows]
+                    )
+            migrated += len(rows)
+            last_key = rows[-1][0]
@@ -0,0 +1,105 @@
+import asyncio
+import copy
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Hashable, List
+
+
+class KeyedLocks:
+    """Per-key asyncio locks, created on demand and dropped once idle
+
+    Several keys are always acquired in sorted order, so two tasks locking
+    the same pair of users (e.g. opposite transfers) cannot deadlock.
+    ``exclusive()`` holds every key at once, for changes to all records.
+    """
+
+    def __init__(self):
+        self._locks = {}  # {key: [asyncio.Lock, holders_and_waiters]}
+        self._open = asyncio.Event()  # cleared while exclusive() runs
+        self._open.set()
+        self._idle = asyncio.Event()  # set while no key is held or awaited
+        self._idle.set()
+        self._exclusive = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def locked(self, key: Hashable) -> bool:
+        entry = self._locks.get(key)
+        return entry is not None and entry[0].locked()
+
+    @asynccontextmanager
+    async def acquire(self, *keys: Hashable):
+        """Hold the locks for every given key"""
+        while not self._open.is_set():
+            await self._open.wait()
+        entries = []
+        self._idle.clear()
+        for key in sorted(set(keys)):
+            entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+            entry[1] += 1
+            entries.append((key, entry))
+
+        acquired = []
+        try:
+            for _, entry in entries:
+                await entry[0].acquire()
+                acquired.append(entry)
+            yield
+        finally:
+            for entry in reversed(acquired):
+                entry[0].release()
+            for key, entry in entries:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+            if not self._locks:
+                self._idle.set()
+
+    @asynccontextmanager
+    async def exclusive(self):
+        """Wait for every held key to be released and keep new ones out meanwhile"""
+        async with self._exclusive:
+            self._open.clear()
+            try:
+                await self._idle.wait()
+                yield
+            finally:
+                self._open.set()
+
+
+class Transaction:
+    """Stages changes to several records and applies them all at once
+
+    ``record(key)`` hands out a private working copy. Nothing is visible to
+    other commands until ``commit`` swaps the changed copies in; if the
+    block raises, the copies are simply dropped.
+    """
+
+    def __init__(self, loader: Callable[[str], dict]):
+        self.loader = loader
+        self.entries = []  # [(key, kind, amount, counterparty, detail)]
+        self._before = {}
+        self._staged = {}
+
+    def record(self, key: str) -> dict:
+        """Working copy of a record, loaded on first access"""
+        if key not in self._staged:
+            current = self.loader(key)
+            self._before[key] = copy.deepcopy(current)
+            self._staged[key] = copy.deepcopy(current)
+        return self._staged[key]
+
+    def log(self, key: str, kind: str, amount: int, counterparty: str = None, detail: str = None):
+        """Attach a ledger entry that is written only if the transaction commits"""
+        self.entries.append((key, kind, amount, counterparty, detail))
+
+    def changed_keys(self) -> List[str]:
+        """Keys whose working copy differs from the loaded record"""
+        return [key for key, staged in self._staged.items() if staged != self._before[key]]
+
+    def commit(self, records: Dict[str, dict]) -> List[str]:
+        """Write every changed record into ``records`` and return their keys"""
+        changed = self.changed_keys()
+        for key in changed:
+            records[key] = self._staged[key]
+        return changed
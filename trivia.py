@@ -1,164 +1,210 @@
 import discord
 from discord.ext import commands
-import random
 import asyncio
-import json
+import sqlite3
+import time
 from typing import Dict, List, Optional
 
+from names import name_resolver
+from question_bank import DIFFICULTIES, DeckStore, open_question_bank
+from quotas import Cooldown, rate_limit, spend_quota
+from rng import rng
+from serialization import get_serializer
+from shutdown import shutdown
+from trivia_stats import GameResults, TriviaStats, summarize
+
+# Game states; each game's task moves through them until FINISHED
+JOINING = 'joining'
+ASKING = 'asking'
+REVEALING = 'revealing'
+FINISHED = 'finished'
+
+JOIN_TIME = 10
+ANSWER_TIME = 30
+REVEAL_PAUSE = 3
+
+
+class TriviaGame:
+    """One channel's game; only its own task changes the state"""
+
+    def __init__(self, channel, host_id: int, rounds: int, deck):
+        self.channel = channel
+        self.host_id = host_id
+        self.rounds = rounds
+        self.deck = deck
+        self.state = JOINING
+        self.current_round = 1
+        self.scores = {}  # {user_id: points}
+        self.results = GameResults()
+        self.question = None
+        self.emojis = []
+        self.message_id = None
+        self.asked_at = 0.0
+        self.picks = {}  # {user_id: set of option indexes} for the current question
+        self.winner = None  # (user_id, name, latency) of the first correct answer
+        self.answered = asyncio.Event()
+        self.started_at = time.monotonic()
+        self.task = None
+        self.ended = False  # results recorded and announced (end_game runs once)
+        self.saving = None  # task recording the results, shielded from cancellation
+
+    def new_question(self, question: dict):
+        self.question = question
+        self.emojis = [f"{i+1}️⃣" for i in range(len(question["options"]))]
+        self.picks = {}
+        self.winner = None
+        self.answered.clear()
+
+    def pick(self, user_id: int, name: str, index: int):
+        """A player reacted with an option"""
+        self.picks.setdefault(user_id, set()).add(index)
+        if index == self.question["correct"] and self.winner is None:
+            self.winner = (user_id, name, time.monotonic() - self.asked_at)
+            self.answered.set()
+
+    def unpick(self, user_id: int, index: int):
+        """A player took a reaction back"""
+        if user_id in self.picks:
+            self.picks[user_id].discard(index)
+
+
 class Trivia(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.active_games = {}  # {channel_id: game_data}
-        self.scores = {}  # {user_id: score}
-        self.questions = [
-            {
-                "question": "What is the capital of France?",
-                "options": ["London", "Berlin", "Paris", "Madrid"],
-                "correct": 2,
-                "category": "Geography"
-            },
-            {
-                "question": "Which planet is known as the Red Planet?",
-                "options": ["Venus", "Mars", "Jupiter", "Saturn"],
-                "correct": 1,
-                "category": "Science"
-            },
-            {
-                "question": "What is the largest mammal in the world?",
-                "options": ["African Elephant", "Blue Whale", "Giraffe", "Hippopotamus"],
-                "correct": 1,
-                "category": "Science"
-            },
-            {
-                "question": "Who painted the Mona Lisa?",
-                "options": ["Vincent van Gogh", "Pablo Picasso", "Leonardo da Vinci", "Michelangelo"],
-                "correct": 2,
-                "category": "Art"
-            },
-            {
-                "question": "What is the chemical symbol for gold?",
-                "options": ["Ag", "Au", "Fe", "Cu"],
-                "correct": 1,
-                "category": "Science"
-            },
-            {
-                "question": "Which year did World War II end?",
-                "options": ["1943", "1944", "1945", "1946"],
-                "correct": 2,
-                "category": "History"
-            },
-            {
-                "question": "What is the main ingredient in guacamole?",
-                "options": ["Tomato", "Avocado", "Onion", "Lime"],
-                "correct": 1,
-                "category": "Food"
-            },
-            {
-                "question": "Which programming language was created by Guido van Rossum?",
-                "options": ["Java", "Python", "C++", "JavaScript"],
-                "correct": 1,
-                "category": "Technology"
-            },
-            {
-                "question": "What is the largest ocean on Earth?",
-                "options": ["Atlantic", "Indian", "Arctic", "Pacific"],
-                "correct": 3,
-                "category": "Geography"
-            },
-            {
-                "question": "Who wrote 'Romeo and Juliet'?",
-                "options": ["Charles Dickens", "William Shakespeare", "Jane Austen", "Mark Twain"],
-                "correct": 1,
-                "category": "Literature"
-            },
-            {
-                "question": "What is the smallest prime number?",
-                "options": ["0", "1", "2", "3"],
-                "correct": 2,
-                "category": "Math"
-            },
-            {
-                "question": "Which country is home to the kangaroo?",
-                "options": ["New Zealand", "South Africa", "Australia", "India"],
-                "correct": 2,
-                "category": "Geography"
-            },
-            {
-                "question": "What is the speed of light?",
-                "options": ["299,792 km/s", "199,792 km/s", "399,792 km/s", "499,792 km/s"],
-                "correct": 0,
-                "category": "Science"
-            },
-            {
-                "question": "Which element has the chemical symbol 'O'?",
-                "options": ["Osmium", "Oxygen", "Oganesson", "Osmium"],
-                "correct": 1,
-                "category": "Science"
-            },
-            {
-                "question": "What is the largest desert in the world?",
-                "options": ["Sahara", "Antarctic", "Arabian", "Gobi"],
-                "correct": 1,
-                "category": "Geography"
-            }
-        ]
+        self.active_games = {}  # {channel_id: TriviaGame}
+        self.by_message = {}  # {question message id: TriviaGame}
+        self.steps = {JOINING: self.step_join, ASKING: self.step_ask, REVEALING: self.step_reveal}
+        self.counters = {'started': 0, 'finished': 0, 'stopped': 0, 'failed': 0, 'rejected': 0, 'rounds': 0}
+        settings = getattr(bot, 'config', {}).get('trivia_settings', {})
+        self.max_games = settings.get('max_games', 100)
+        self.bank = open_question_bank(settings.get('question_bank', 'trivia_questions.jsonl'))
+        self.decks = DeckStore(self.bank, rng)
+        storage_settings = getattr(bot, 'config', {}).get('storage_settings', {})
+        self.stats = TriviaStats('trivia_stats.db', serializer=get_serializer(storage_settings.get('format', 'json')))
+
+    async def cog_load(self):
+        # Reading the top scores is file I/O; keep it off the event loop
+        await asyncio.to_thread(self.stats.open)
+
+    def cog_unload(self):
+        for game in self.active_games.values():
+            game.task.cancel()
+        self.bank.close()
+        self.stats.close()
+
+    async def ensure_bank(self, ctx) -> bool:
+        """Load the question index on first use; reports errors to the channel"""
+        if self.bank.loaded:
+            return True
+        try:
+            await asyncio.to_thread(self.bank.load_index)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error loading trivia questions from {self.bank.path}: {e}")
+            await ctx.send("❌ The trivia question bank is unavailable right now.")
+            return False
+        return True
 
     @commands.command(name='trivia')
-    async def start_trivia(self, ctx, rounds: int = 5):
-        """Start a trivia game"""
+    @rate_limit('trivia', Cooldown(60), per='channel')
+    async def start_trivia(self, ctx, *options: str):
+        """Start a trivia game (e.g., !trivia, !trivia science 10, !trivia history hard)"""
         if ctx.channel.id in self.active_games:
             await ctx.send("❌ A trivia game is already in progress in this channel!")
             return
 
+        rounds = 5
+        difficulty = None
+        words = []
+        for option in options:
+            if option.isdigit():
+                rounds = int(option)
+            elif option.lower() in DIFFICULTIES:
+                difficulty = option.lower()
+            else:
+                words.append(option)
+
         if rounds < 1 or rounds > 20:
             await ctx.send("❌ Please choose between 1-20 rounds!")
             return
 
-        # Initialize game
-        game_data = {
-            "rounds": rounds,
-            "current_round": 1,
-            "scores": {},
-            "question": None,
-            "correct_answer": None,
-            "time_left": 30
-        }
-        
-        self.active_games[ctx.channel.id] = game_data
+        if not await self.ensure_bank(ctx):
+            return
+
+        category = None
+        if words:
+            category = self.bank.find_category(" ".join(words))
+            if category is None:
+                await ctx.send("❌ Unknown category! Use `!triviacategories` to see them all.")
+                return
+        deck = self.decks.deck(ctx.channel.id, category, difficulty)
+        if not deck.ids:
+            await ctx.send("❌ No questions match that category and difficulty!")
+            return
+        # Another game may have started while the index was loading
+        if ctx.channel.id in self.active_games:
+            await ctx.send("❌ A trivia game is already in progress in this channel!")
+            return
+        if len(self.active_games) >= self.max_games:
+            self.counters['rejected'] += 1
+            await ctx.send("❌ Too many trivia games are running right now, try again in a few minutes!")
+            return
+
+        # The game runs in its own task; this command returns right away
+        spend_quota(ctx)
+        game = TriviaGame(ctx.channel, ctx.author.id, rounds, deck)
+        self.active_games[ctx.channel.id] = game
+        self.counters['started'] += 1
+        game.task = asyncio.create_task(self.run_game(game))
         
+        topic = self.bank.category_names[category] if category else "all categories"
         embed = discord.Embed(
             title="🎯 Trivia Game Starting!",
-            description=f"A {rounds}-round trivia game is about to begin!\nReact with ✅ to join!",
+            description=f"A {rounds}-round trivia game ({topic}{f', {difficulty}' if difficulty else ''}) is about to begin!\nReact with ✅ to join!",
             color=0x00ff00
         )
-        embed.add_field(name="Rules", value="• You have 30 seconds to answer\n• First correct answer gets points\n• Points: 10 for correct, 0 for wrong", inline=False)
+        embed.add_field(name="Rules", value=f"• You have {ANSWER_TIME} seconds to answer\n• First correct answer gets points\n• Points: 10 for correct, 0 for wrong", inline=False)
+        embed.set_footer(text="Use !triviastop to end the game early")
         
         message = await ctx.send(embed=embed)
         await message.add_reaction("✅")
-        
-        # Wait 10 seconds for players to join
-        await asyncio.sleep(10)
-        
-        # Start the game
-        await self.play_round(ctx)
 
-    async def play_round(self, ctx):
-        """Play a single round of trivia"""
-        game_data = self.active_games[ctx.channel.id]
-        
-        if game_data["current_round"] > game_data["rounds"]:
-            await self.end_game(ctx)
-            return
+    async def run_game(self, game):
+        """Step a game through its states until it finishes"""
+        try:
+            while game.state != FINISHED:
+                game.state = await self.steps[game.state](game)
+            await self.end_game(game)
+            self.counters['finished'] += 1
+        except discord.HTTPException as e:
+            print(f"Trivia game in #{game.channel} ended early: {e}")
+            self.counters['failed'] += 1
+        except Exception as e:
+            # e.g. a malformed question record; don't leave an unretrieved task error
+            print(f"Trivia game in #{game.channel} failed: {e!r}")
+            self.counters['failed'] += 1
+        finally:
+            self.forget(game)
+
+    def forget(self, game):
+        """Stop routing events to a game and free its channel"""
+        self.by_message.pop(game.message_id, None)
+        if self.active_games.get(game.channel.id) is game:
+            del self.active_games[game.channel.id]
+
+    async def step_join(self, game) -> str:
+        """Give players a moment to join"""
+        await asyncio.sleep(JOIN_TIME)
+        return ASKING
 
-        # Select random question
-        question_data = random.choice(self.questions)
-        game_data["question"] = question_data
-        game_data["correct_answer"] = question_data["correct"]
-        game_data["time_left"] = 30
+    async def step_ask(self, game) -> str:
+        """Post the next question and wait for the first correct answer"""
+        # Next question from this channel's shuffled deck (no repeats)
+        question_data = self.bank.get(game.deck.draw())
+        game.new_question(question_data)
 
         # Create question embed
         embed = discord.Embed(
-            title=f"🎯 Round {game_data['current_round']}/{game_data['rounds']}",
+            title=f"🎯 Round {game.current_round}/{game.rounds}",
             description=f"**{question_data['question']}**",
             color=0x0099ff
         )
@@ -169,52 +215,95 @@ class Trivia(commands.Cog):
         
         embed.add_field(name="Options", value=options_text, inline=False)
         embed.add_field(name="Category", value=question_data["category"], inline=True)
-        embed.add_field(name="Time", value="30 seconds", inline=True)
+        embed.add_field(name="Difficulty", value=question_data.get("difficulty", "medium").title(), inline=True)
+        embed.add_field(name="Time", value=f"{ANSWER_TIME} seconds", inline=True)
         
-        message = await ctx.send(embed=embed)
+        message = await game.channel.send(embed=embed)
+        game.asked_at = time.monotonic()
+        game.message_id = message.id
+        self.by_message[message.id] = game
         
         # Add number reactions
-        for i in range(len(question_data["options"])):
-            await message.add_reaction(f"{i+1}️⃣")
-
-        # Wait for answers
-        correct_answer = None
-        for _ in range(30):  # 30 seconds
-            await asyncio.sleep(1)
-            game_data["time_left"] -= 1
-            
-            # Check for correct answers
-            if message.reactions:
-                for reaction in message.reactions:
-                    if reaction.emoji == f"{game_data['correct_answer']+1}️⃣":
-                        async for user in reaction.users():
-                            if not user.bot and user not in [correct_answer] if correct_answer else []:
-                                correct_answer = user
-                                break
-                        if correct_answer:
-                            break
-                if correct_answer:
-                    break
-
-        # Show results
-        await self.show_round_results(ctx, message, correct_answer, game_data)
-
-    async def show_round_results(self, ctx, message, correct_answer, game_data):
+        for emoji in game.emojis:
+            await message.add_reaction(emoji)
+
+        # Answers arrive through on_raw_reaction_add; no polling
+        remaining = ANSWER_TIME - (time.monotonic() - game.asked_at)
+        try:
+            await asyncio.wait_for(game.answered.wait(), timeout=max(remaining, 0))
+        except asyncio.TimeoutError:
+            pass
+        return REVEALING
+
+    async def step_reveal(self, game) -> str:
+        """Close the question, score it and move to the next round"""
+        self.by_message.pop(game.message_id, None)
+        self.record_answers(game)
+        await self.show_round_results(game)
+        self.counters['rounds'] += 1
+
+        game.current_round += 1
+        if game.current_round > game.rounds:
+            return FINISHED
+        await asyncio.sleep(REVEAL_PAUSE)
+        return ASKING
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        if shutdown.closing:
+            return
+        game = self.by_message.get(payload.message_id)
+        if game is None or payload.user_id == self.bot.user.id or (payload.member and payload.member.bot):
+            return
+        emoji = str(payload.emoji)
+        if emoji in game.emojis:
+            name_resolver.remember(payload.member)
+            name = payload.member.name if payload.member else f"User {payload.user_id}"
+            game.pick(payload.user_id, name, game.emojis.index(emoji))
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        if shutdown.closing:
+            return
+        game = self.by_message.get(payload.message_id)
+        emoji = str(payload.emoji)
+        if game is not None and emoji in game.emojis:
+            game.unpick(payload.user_id, game.emojis.index(emoji))
+
+    def record_answers(self, game):
+        """Add every player's answer for this round to the game results"""
+        question_data = game.question
+        picks = game.picks
+        if game.winner:
+            picks.setdefault(game.winner[0], set()).add(question_data["correct"])
+
+        for user_id, chosen in picks.items():
+            if not chosen:
+                continue
+            first = game.winner is not None and user_id == game.winner[0]
+            game.results.answer(
+                user_id,
+                question_data["category"],
+                correct=chosen == {question_data["correct"]},  # several picks count as wrong
+                latency=game.winner[2] if first else None,
+                points=10 if first else 0
+            )
+
+    async def show_round_results(self, game):
         """Show the results of a round"""
-        question_data = game_data["question"]
+        question_data = game.question
         
         embed = discord.Embed(
-            title=f"🎯 Round {game_data['current_round']} Results",
-            color=0x00ff00 if correct_answer else 0xff0000
+            title=f"🎯 Round {game.current_round} Results",
+            color=0x00ff00 if game.winner else 0xff0000
         )
         
-        if correct_answer:
+        if game.winner:
             # Award points
-            if correct_answer.id not in game_data["scores"]:
-                game_data["scores"][correct_answer.id] = 0
-            game_data["scores"][correct_answer.id] += 10
+            user_id, name, latency = game.winner
+            game.scores[user_id] = game.scores.get(user_id, 0) + 10
             
-            embed.description = f"✅ **{correct_answer.name}** got it correct!"
+            embed.description = f"✅ **{name}** got it correct in {latency:.1f}s!"
             embed.add_field(name="Answer", value=f"**{question_data['options'][question_data['correct']]}**", inline=True)
             embed.add_field(name="Points", value=f"+10 points!", inline=True)
         else:
@@ -222,69 +311,115 @@ class Trivia(commands.Cog):
             embed.add_field(name="Correct Answer", value=f"**{question_data['options'][question_data['correct']]}**", inline=True)
         
         # Show current scores
-        if game_data["scores"]:
+        if game.scores:
             scores_text = ""
-            sorted_scores = sorted(game_data["scores"].items(), key=lambda x: x[1], reverse=True)
-            for i, (user_id, score) in enumerate(sorted_scores[:5]):
-                user = self.bot.get_user(user_id)
-                name = user.name if user else f"User {user_id}"
+            sorted_scores = sorted(game.scores.items(), key=lambda x: x[1], reverse=True)[:5]
+            names = await name_resolver.resolve(game.channel.guild, [user_id for user_id, _ in sorted_scores], self.bot)
+            for i, (user_id, score) in enumerate(sorted_scores):
+                name = names[user_id]
                 scores_text += f"**{i+1}.** {name}: {score} points\n"
             
             embed.add_field(name="Current Scores", value=scores_text, inline=False)
         
-        await ctx.send(embed=embed)
-        
-        # Move to next round
-        game_data["current_round"] += 1
-        
-        if game_data["current_round"] <= game_data["rounds"]:
-            await asyncio.sleep(3)
-            await self.play_round(ctx)
-        else:
-            await self.end_game(ctx)
+        await game.channel.send(embed=embed)
+
+    async def save_results(self, game):
+        """Save everyone's stats for this game with one write"""
+        try:
+            await self.stats.record_game(game.results)
+        except sqlite3.Error as e:
+            print(f"Error saving trivia stats: {e}")
+
+    async def end_game(self, game, title="🏆 Trivia Game Complete!"):
+        """Save the game and show final results (once, however the game ended)"""
+        if game.ended:
+            return
+        game.ended = True
+        # Shielded: stopping the game mid-save must not lose its stats
+        game.saving = asyncio.ensure_future(self.save_results(game))
+        await asyncio.shield(game.saving)
 
-    async def end_game(self, ctx):
-        """End the trivia game and show final results"""
-        game_data = self.active_games[ctx.channel.id]
-        
         embed = discord.Embed(
-            title="🏆 Trivia Game Complete!",
+            title=title,
             description="Final Results:",
             color=0xffd700
         )
-        
-        if game_data["scores"]:
-            sorted_scores = sorted(game_data["scores"].items(), key=lambda x: x[1], reverse=True)
-            
-            # Update global scores
-            for user_id, score in game_data["scores"].items():
-                if user_id not in self.scores:
-                    self.scores[user_id] = 0
-                self.scores[user_id] += score
+
+        if game.scores:
+            sorted_scores = sorted(game.scores.items(), key=lambda x: x[1], reverse=True)
+            names = await name_resolver.resolve(game.channel.guild, [user_id for user_id, _ in sorted_scores], self.bot)
             
             # Show final rankings
             for i, (user_id, score) in enumerate(sorted_scores):
-                user = self.bot.get_user(user_id)
-                name = user.name if user else f"User {user_id}"
                 medal = "🥇" if i == 0 else "🥈" if i == 1 else "🥉" if i == 2 else "🏅"
-                embed.add_field(name=f"{medal} {i+1}. {name}", value=f"{score} points", inline=False)
+                embed.add_field(name=f"{medal} {i+1}. {names[user_id]}", value=f"{score} points", inline=False)
             
-            winner_id = sorted_scores[0][0]
-            winner = self.bot.get_user(winner_id)
-            winner_name = winner.name if winner else f"User {winner_id}"
-            embed.set_footer(text=f"🏆 Winner: {winner_name}!")
+            embed.set_footer(text=f"🏆 Winner: {names[sorted_scores[0][0]]}!")
         else:
             embed.description = "No one participated in the game."
         
-        await ctx.send(embed=embed)
-        
-        # Clean up
-        del self.active_games[ctx.channel.id]
+        await game.channel.send(embed=embed)
+
+    @commands.command(name='triviastop')
+    async def stop_trivia(self, ctx):
+        """Stop the trivia game in this channel (host or moderators)"""
+        game = self.active_games.get(ctx.channel.id)
+        if game is None:
+            await ctx.send("❌ There's no trivia game running in this channel!")
+            return
+        if ctx.author.id != game.host_id and not ctx.channel.permissions_for(ctx.author).manage_messages:
+            await ctx.send("❌ Only the player who started the game or a moderator can stop it!")
+            return
+
+        await self.stop_game(game, f"🛑 Trivia Game Stopped (Round {game.current_round}/{game.rounds})")
+
+    async def stop_game(self, game, title: str):
+        game.task.cancel()
+        await asyncio.wait([game.task])
+        self.forget(game)  # a task cancelled before it ran never reaches its finally
+        if game.ended:
+            # The task was already recording the results when it was cancelled
+            if game.saving is not None:
+                await game.saving
+            return
+        self.counters['stopped'] += 1
+        # Answers given before the stop still count
+        await self.end_game(game, title=title)
+
+    async def stop_all(self, reason: str) -> int:
+        """Stop every running game, saving its results (used at shutdown)"""
+        games = list(self.active_games.values())
+        results = await asyncio.gather(
+            *(self.stop_game(game, f"🛑 Trivia Game Stopped: {reason} (Round {game.current_round}/{game.rounds})")
+              for game in games),
+            return_exceptions=True
+        )
+        for game, result in zip(games, results):
+            if isinstance(result, Exception):
+                print(f"Error stopping trivia game in #{game.channel}: {result}")
+        return len(games)
+
+    def metrics(self) -> dict:
+        """Active games and lifetime counters (read by the /metrics endpoint)"""
+        games = list(self.active_games.values())
+        states = {}
+        for game in games:
+            states[game.state] = states.get(game.state, 0) + 1
+        now = time.monotonic()
+        return {
+            "active_games": len(games),
+            "max_games": self.max_games,
+            "states": states,
+            "awaiting_answers": len(self.by_message),
+            "oldest_game_seconds": round(max((now - game.started_at for game in games), default=0), 1),
+            **{f"games_{name}": count for name, count in self.counters.items()}
+        }
 
     @commands.command(name='triviascores')
     async def show_trivia_scores(self, ctx):
         """Show global trivia scores"""
-        if not self.scores:
+        leaderboard = self.stats.leaderboard(10)
+        if not leaderboard:
             await ctx.send("No trivia games have been played yet!")
             return
         
@@ -293,21 +428,70 @@ class Trivia(commands.Cog):
             color=0xffd700
         )
         
-        sorted_scores = sorted(self.scores.items(), key=lambda x: x[1], reverse=True)
-        
-        for i, (user_id, score) in enumerate(sorted_scores[:10]):
-            user = self.bot.get_user(user_id)
-            name = user.name if user else f"User {user_id}"
+        names = await name_resolver.resolve(ctx.guild, [user_id for user_id, _ in leaderboard], self.bot)
+        for i, (user_id, score) in enumerate(leaderboard):
+            name = names[user_id]
             medal = "🥇" if i == 0 else "🥈" if i == 1 else "🥉" if i == 2 else "🏅"
             embed.add_field(name=f"{medal} {i+1}. {name}", value=f"{score} points", inline=False)
         
         await ctx.send(embed=embed)
 
+    @commands.command(name='triviastats')
+    async def show_trivia_stats(self, ctx, member: Optional[discord.Member] = None):
+        """Show your or someone else's trivia statistics"""
+        if member is None:
+            member = ctx.author
+
+        record = self.stats.get(member.id)
+        if not record.get("games"):
+            await ctx.send(f"**{member.name}** hasn't played any trivia yet!")
+            return
+
+        summary = summarize(record)
+        rank = self.stats.rank(str(member.id))
+        embed = discord.Embed(
+            title="🧠 Trivia Stats",
+            description=f"**{member.name}** • {record['score']:,} points" + (f" • Rank #{rank}" if rank else ""),
+            color=0x0099ff
+        )
+        embed.add_field(name="Games Played", value=f"{record['games']:,}", inline=True)
+        embed.add_field(name="Correct Answers", value=f"{record['correct']:,}/{record['answered']:,} ({summary['accuracy']})", inline=True)
+        embed.add_field(name="Avg. Answer Time", value=summary['latency'], inline=True)
+
+        categories = sorted(record.get("categories", {}).items(), key=lambda x: x[1][0], reverse=True)
+        if categories:
+            embed.add_field(
+                name="By Category",
+                value="\n".join(
+                    f"**{category}**: {correct}/{answered} ({correct / answered:.0%})"
+                    for category, (answered, correct) in categories[:10] if answered
+                ),
+                inline=False
+            )
+        embed.set_thumbnail(url=member.display_avatar.url)
+        await ctx.send(embed=embed)
+
+    @commands.command(name='triviacategories')
+    async def show_trivia_categories(self, ctx):
+        """List trivia categories and question counts"""
+        if not await self.ensure_bank(ctx):
+            return
+        categories = self.bank.categories()
+        embed = discord.Embed(
+            title="📚 Trivia Categories",
+            description="\n".join(
+                f"**{name}** — {count:,} questions" for name, count in sorted(categories.items())
+            ) or "The question bank is empty!",
+            color=0x0099ff
+        )
+        embed.set_footer(text=f"{len(self.bank):,} questions • Use !trivia <category> [easy|medium|hard] [rounds]")
+        await ctx.send(embed=embed)
+
     @commands.command(name='triviareset')
     @commands.has_permissions(administrator=True)
     async def reset_trivia_scores(self, ctx):
         """Reset all trivia scores (Admin only)"""
-        self.scores = {}
+        await self.stats.reset()
         await ctx.send("✅ All trivia scores have been reset!")
 
 async def setup(bot):
@@ -0,0 +1,137 @@
+import asyncio
+import bisect
+from typing import Dict, List, Optional, Tuple
+
+from serialization import Serializer
+from storage import SqliteRecordStore
+
+
+def default_stats() -> dict:
+    return {
+        "score": 0,
+        "games": 0,
+        "answered": 0,
+        "correct": 0,
+        "latency_ms": 0,   # total over correct answers with a measured latency
+        "timed": 0,        # how many correct answers were timed
+        "categories": {}   # {category: [answered, correct]}
+    }
+
+
+class GameResults:
+    """Everything one game adds to the statistics, written once at the end"""
+
+    def __init__(self):
+        self.players = {}  # {user_id: partial stats record}
+
+    def _player(self, user_id: str) -> dict:
+        if user_id not in self.players:
+            self.players[user_id] = default_stats()
+        return self.players[user_id]
+
+    def answer(self, user_id, category: str, correct: bool, latency: Optional[float] = None, points: int = 0):
+        """Record one answer; latency in seconds for correct answers"""
+        player = self._player(str(user_id))
+        player["answered"] += 1
+        player["score"] += points
+        counts = player["categories"].setdefault(category, [0, 0])
+        counts[0] += 1
+        if correct:
+            player["correct"] += 1
+            counts[1] += 1
+            if latency is not None:
+                player["latency_ms"] += int(latency * 1000)
+                player["timed"] += 1
+
+
+def merge_stats(record: dict, game: dict) -> dict:
+    """Add one game's results to a stored record (counts the game as played)"""
+    record = {**default_stats(), **record}
+    for field in ("score", "answered", "correct", "latency_ms", "timed"):
+        record[field] += game[field]
+    record["games"] += 1
+    categories = dict(record["categories"])
+    for category, (answered, correct) in game["categories"].items():
+        stored = categories.get(category, [0, 0])
+        categories[category] = [stored[0] + answered, stored[1] + correct]
+    record["categories"] = categories
+    return record
+
+
+class TriviaStats:
+    """Persistent per-user trivia statistics with a top-k score index
+
+    Records live in a SqliteRecordStore with an indexed ``score`` column.
+    The best ``top_size`` scores are also kept in memory and updated as
+    games finish; scores only grow, so the in-memory list stays exact
+    without re-sorting the table.
+    """
+
+    def __init__(self, db_path: str = 'trivia_stats.db', serializer: Optional[Serializer] = None, top_size: int = 50):
+        self.store = SqliteRecordStore(db_path, table='trivia', indexed=('score',), serializer=serializer)
+        self.top_size = top_size
+        self.top = []  # [(-score, user_id)], best first
+        self._write_lock = asyncio.Lock()
+
+    def open(self):
+        """Open the store and load the top-k index"""
+        self.store.open()
+        self.top = sorted((-record.get('score', 0), key) for key, record in self.store.top('score', self.top_size))
+
+    def close(self):
+        self.store.close()
+
+    def _update_top(self, user_id: str, score: int):
+        for i, (_, key) in enumerate(self.top):
+            if key == user_id:
+                del self.top[i]
+                break
+        entry = (-score, user_id)
+        if len(self.top) < self.top_size or entry < self.top[-1]:
+            bisect.insort(self.top, entry)
+            del self.top[self.top_size:]
+
+    def leaderboard(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """(user_id, score) pairs, highest first"""
+        return [(user_id, -score) for score, user_id in self.top[:limit]]
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """1-based rank within the top-k index, or None"""
+        for i, (_, key) in enumerate(self.top):
+            if key == user_id:
+                return i + 1
+        return None
+
+    def get(self, user_id) -> dict:
+        """Stored statistics for a user (defaults if they never played)"""
+        return self.store.get(str(user_id)) or default_stats()
+
+    async def record_game(self, results: GameResults):
+        """Merge a finished game into the stored records with a single write"""
+        if not results.players:
+            return
+        keys = list(results.players)
+        # Games ending together may share players; merge them one at a time
+        async with self._write_lock:
+            stored = await asyncio.to_thread(self.store.get_many, keys)
+            merged = {key: merge_stats(stored.get(key, {}), results.players[key]) for key in keys}
+            # Encode on the loop, write in a worker thread (one transaction)
+            rows = [self.store.row_for(key, record) for key, record in merged.items()]
+            await asyncio.to_thread(self.store.write_rows, rows)
+            for key, record in merged.items():
+                self._update_top(key, record["score"])
+
+    async def reset(self):
+        """Delete every record"""
+        async with self._write_lock:
+            await asyncio.to_thread(self.store.clear)
+            self.top = []
+
+
+def summarize(record: dict) -> Dict[str, str]:
+    """Display strings for a stats record"""
+    answered = record.get("answered", 0)
+    accuracy = f"{record.get('correct', 0) / answered:.0%}" if answered else "—"
+    timed = record.get("timed", 0)
+    latency = f"{record.get('latency_ms', 0) / timed / 1000:.1f}s" if timed else "—"
+    return {"accuracy": accuracy, "latency": latency}
@@ -4,6 +4,8 @@ import asyncio
 from datetime import datetime, timedelta
 from typing import Optional
 
+from guild_stats import guild_stats
+
 class Utility(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -14,12 +16,12 @@ class Utility(commands.Cog):
         """Display server information"""
         guild = ctx.guild
         
-        # Get server statistics
-        total_members = guild.member_count
-        online_members = len([m for m in guild.members if m.status != discord.Status.offline])
-        text_channels = len(guild.text_channels)
-        voice_channels = len(guild.voice_channels)
-        roles = len(guild.roles)
+        # Get server statistics from the event-maintained counters
+        counters = guild_stats.get(guild, self.bot.intents.presences)
+        total_members, online_members = await guild_stats.member_counts(self.bot, guild, self.bot.intents.presences)
+        text_channels = counters.text_channels
+        voice_channels = counters.voice_channels
+        roles = counters.roles
         emojis = len(guild.emojis)
         
         # Get server boost level
@@ -34,11 +36,11 @@ class Utility(commands.Cog):
         if guild.icon:
             embed.set_thumbnail(url=guild.icon.url)
         
-        embed.add_field(name="👑 Owner", value=guild.owner.mention, inline=True)
+        embed.add_field(name="👑 Owner", value=f"<@{guild.owner_id}>", inline=True)
         embed.add_field(name="🆔 Server ID", value=guild.id, inline=True)
         embed.add_field(name="📅 Created", value=guild.created_at.strftime("%B %d, %Y"), inline=True)
         
-        embed.add_field(name="👥 Members", value=f"Total: {total_members}\nOnline: {online_members}", inline=True)
+        embed.add_field(name="👥 Members", value=f"Total: {total_members}\nOnline: {online_members if online_members is not None else 'Unknown'}", inline=True)
         embed.add_field(name="📝 Channels", value=f"Text: {text_channels}\nVoice: {voice_channels}", inline=True)
         embed.add_field(name="🎭 Roles", value=str(roles), inline=True)
         
@@ -2,6 +2,8 @@ import discord
 from datetime import timedelta
 from typing import Optional
 
+from levels import level_curve
+
 def create_embed(title: str, description: str, color: int, fields: list = None, thumbnail: str = None, footer: str = None) -> discord.Embed:
     """Create a formatted embed"""
     embed = discord.Embed(
@@ -47,17 +49,13 @@ def format_voice_time(minutes: int) -> str:
     else:
         return f"{mins}m"
 
-def get_level_progress(xp: int, level: int) -> tuple:
-    """Get XP progress for current level"""
-    xp_for_current_level = (level - 1) * 200
-    xp_for_next_level = level * 200
-    current_level_xp = xp - xp_for_current_level
-    xp_needed = xp_for_next_level - xp
-    
-    return current_level_xp, xp_needed
+def get_level_progress(xp: int) -> tuple:
+    """Get XP progress for current level: (XP into it, XP to the next, XP it spans)"""
+    _, current_level_xp, level_span, xp_needed = level_curve.progress(xp)
+    return current_level_xp, xp_needed, level_span
 
 def create_progress_bar(current: int, total: int, length: int = 10) -> str:
     """Create a visual progress bar"""
-    filled = int((current / total) * length)
+    filled = min(length, int((current / total) * length)) if total > 0 else 0
     bar = "█" * filled + "░" * (length - filled)
     return f"[{bar}] {current}/{total}" 
\ No newline at end of file
@@ -0,0 +1,101 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+# A checkpoint older than this is not resumed after a restart; the member
+# may have left and rejoined while the bot was offline
+RESUME_WINDOW = 600
+
+
+def monotonic_now() -> int:
+    return int(time.monotonic())
+
+
+class VoiceSession:
+    """One member's time in voice; ``started`` and ``accrued`` are monotonic seconds"""
+    __slots__ = ('guild_id', 'started', 'accrued', 'minutes', 'xp')
+
+    def __init__(self, guild_id: int, started: int, accrued: int):
+        self.guild_id = guild_id
+        self.started = started
+        self.accrued = accrued  # time up to here has been credited
+        self.minutes = 0
+        self.xp = 0
+
+    def seconds(self, now: Optional[int] = None) -> int:
+        return (monotonic_now() if now is None else now) - self.started
+
+
+class VoiceSessions:
+    """Open voice sessions, credited in whole minutes exactly once
+
+    Every session keeps the point up to which its time has been credited.
+    ``accrue`` moves that point forward for everyone at once and returns the
+    minutes to credit, and ``close`` returns whatever is still owed, so no
+    minute is ever counted twice. The credited point is stored with the user
+    record as a wall-clock checkpoint (see ``checkpoint``), written in the
+    same row as the credit, which lets a restart resume the session.
+    """
+
+    def __init__(self):
+        self.sessions = {}  # {user_id: VoiceSession}
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self.sessions
+
+    def get(self, user_id: str) -> Optional[VoiceSession]:
+        return self.sessions.get(user_id)
+
+    def items(self) -> List[Tuple[str, VoiceSession]]:
+        return list(self.sessions.items())
+
+    def open(self, user_id: str, guild_id: int, checkpoint: Optional[list] = None,
+             now: Optional[int] = None) -> VoiceSession:
+        """Start tracking a member, resuming from a saved checkpoint if recent"""
+        session = self.sessions.get(user_id)
+        if session is not None:
+            return session
+        now = monotonic_now() if now is None else now
+        started = accrued = now
+        if checkpoint:
+            age = time.time() - checkpoint[1]
+            if 0 <= age <= RESUME_WINDOW:
+                accrued = now - int(age)
+                started = now - int(time.time() - checkpoint[0])
+        session = VoiceSession(guild_id, started, accrued)
+        self.sessions[user_id] = session
+        return session
+
+    def close(self, user_id: str, now: Optional[int] = None) -> Optional[Tuple[VoiceSession, int]]:
+        """Stop tracking a member; returns the session and the minutes still owed"""
+        session = self.sessions.pop(user_id, None)
+        if session is None:
+            return None
+        return session, self._take_minutes(session, monotonic_now() if now is None else now)
+
+    def accrue(self, now: Optional[int] = None) -> Dict[str, int]:
+        """Whole minutes earned by every open session since the last accrual"""
+        now = monotonic_now() if now is None else now
+        credits = {}
+        for user_id, session in self.sessions.items():
+            minutes = self._take_minutes(session, now)
+            if minutes:
+                credits[user_id] = minutes
+        return credits
+
+    def _take_minutes(self, session: VoiceSession, now: int) -> int:
+        minutes = max(0, now - session.accrued) // 60
+        session.accrued += minutes * 60
+        session.minutes += minutes
+        return minutes
+
+    def checkpoint(self, session: VoiceSession, now: Optional[int] = None) -> List[int]:
+        """Wall-clock ``[started, accrued]`` to store with the user record"""
+        now = monotonic_now() if now is None else now
+        wall = int(time.time())
+        return [wall - (now - session.started), wall - (now - session.accrued)]
+
+    def clear(self):
+        self.sessions.clear()